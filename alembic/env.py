@@ -9,7 +9,7 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from app.core.database import Base
-from app.models import user, post, outfit, notification
+from app.models import user, post, outfit, notification, storage, analytics
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -24,6 +24,22 @@ if config.config_file_name is not None:
 # for 'autogenerate' support
 target_metadata = Base.metadata
 
+# Full-text search storage is created by migrations and DDL hooks rather than
+# mapped columns (see app.services.search_index), so autogenerate skips it
+SEARCH_INDEX_OBJECTS = {"search_vector", "ix_posts_search_vector"}
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if name in SEARCH_INDEX_OBJECTS:
+        return False
+    if type_ == "table" and name.startswith("posts_fts"):
+        return False
+    # Indexes declared with .ddl_if(dialect=...) only exist on that dialect
+    ddl_if = getattr(object, "_ddl_if", None)
+    if ddl_if is not None and ddl_if.dialect and ddl_if.dialect != context.get_context().dialect.name:
+        return False
+    return True
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -49,6 +65,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -64,15 +81,22 @@ def run_migrations_online() -> None:
     and associate a connection with the context.
 
     """
+    # Import settings to get DATABASE_URL from .env
+    from app.core.config import settings
+    
+    configuration = config.get_section(config.config_ini_section, {})
+    configuration["sqlalchemy.url"] = settings.DATABASE_URL
     connectable = engine_from_config(
-        config.get_section(config.config_ini_section, {}),
+        configuration,
         prefix="sqlalchemy.",
         poolclass=pool.NullPool,
     )
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object
         )
 
         with context.begin_transaction():
@@ -0,0 +1,55 @@
+"""add query indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 09:12:44.518203
+
+Indexes backing the feed, comment, like, tag, notification and follower
+queries. On Postgres they are built with CREATE INDEX CONCURRENTLY outside
+the migration transaction so the tables stay writable during the build.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_posts_is_public_created_at', 'posts', ['is_public', 'created_at', 'id']),
+    ('ix_posts_author_id', 'posts', ['author_id']),
+    ('ix_likes_user_id_post_id', 'likes', ['user_id', 'post_id']),
+    ('ix_likes_post_id', 'likes', ['post_id']),
+    ('ix_comments_post_id_created_at', 'comments', ['post_id', 'created_at']),
+    ('ix_notifications_user_id_is_read_created_at', 'notifications', ['user_id', 'is_read', 'created_at']),
+    ('ix_post_tags_tag_id_post_id', 'post_tags', ['tag_id', 'post_id']),
+    ('ix_post_tags_post_id', 'post_tags', ['post_id']),
+    ('ix_user_followers_following_id', 'user_followers', ['following_id']),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            # if_not_exists lets a re-run skip indexes that an interrupted run already built
+            op.create_index(
+                name, table, columns,
+                if_not_exists=True,
+                postgresql_concurrently=True
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(
+                name, table_name=table,
+                if_exists=True,
+                postgresql_concurrently=True
+            )
@@ -0,0 +1,65 @@
+"""add post full-text search
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 11:40:07.906112
+
+Postgres gets a weighted tsvector column on posts with a GIN index (built
+concurrently); SQLite gets the posts_fts FTS5 table. Both are backfilled
+here and kept current by app.services.search_index.PostSearchIndex.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(brand, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(store_name, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'C')"
+)
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.add_column('posts', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+        op.execute(f"UPDATE posts SET search_vector = {SEARCH_VECTOR_SQL}")
+        with op.get_context().autocommit_block():
+            op.create_index(
+                'ix_posts_search_vector', 'posts', ['search_vector'],
+                postgresql_using='gin',
+                postgresql_concurrently=True,
+                if_not_exists=True
+            )
+    else:
+        op.execute(
+            "CREATE VIRTUAL TABLE posts_fts USING fts5("
+            "title, description, brand, store_name, tokenize = 'porter unicode61')"
+        )
+        op.execute(
+            "INSERT INTO posts_fts (rowid, title, description, brand, store_name) "
+            "SELECT id, title, coalesce(description, ''), coalesce(brand, ''), coalesce(store_name, '') "
+            "FROM posts"
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.drop_index(
+                'ix_posts_search_vector', table_name='posts',
+                postgresql_concurrently=True,
+                if_exists=True
+            )
+        op.drop_column('posts', 'search_vector')
+    else:
+        op.execute("DROP TABLE IF EXISTS posts_fts")
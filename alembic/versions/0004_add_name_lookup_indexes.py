@@ -0,0 +1,66 @@
+"""add name lookup indexes
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 14:03:27.905114
+
+Indexes behind the ``match=contains|prefix|similar`` lookups on usernames,
+first/last names, post brands and tag names. Postgres gets pg_trgm GIN
+indexes for substring and similarity matches plus ``lower(column)``
+``text_pattern_ops`` indexes for prefixes; SQLite only gets the ``lower()``
+expression indexes.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+COLUMNS = [
+    ('users', 'username'),
+    ('users', 'first_name'),
+    ('users', 'last_name'),
+    ('posts', 'brand'),
+    ('tags', 'name'),
+]
+
+
+def upgrade() -> None:
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    if postgres:
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        for table, column in COLUMNS:
+            if postgres:
+                op.execute(
+                    f'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{table}_{column}_trgm '
+                    f'ON {table} USING gin ({column} gin_trgm_ops)'
+                )
+                op.execute(
+                    f'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{table}_{column}_lower '
+                    f'ON {table} (lower({column}) text_pattern_ops)'
+                )
+            else:
+                op.execute(
+                    f'CREATE INDEX IF NOT EXISTS ix_{table}_{column}_lower '
+                    f'ON {table} (lower({column}))'
+                )
+
+
+def downgrade() -> None:
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    concurrently = 'CONCURRENTLY ' if postgres else ''
+
+    with op.get_context().autocommit_block():
+        for table, column in reversed(COLUMNS):
+            op.execute(f'DROP INDEX {concurrently}IF EXISTS ix_{table}_{column}_lower')
+            if postgres:
+                op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS ix_{table}_{column}_trgm')
@@ -0,0 +1,38 @@
+"""add post trending scores
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 16:41:09.227560
+
+Precomputed trending scores (see app.services.trending). The table starts
+empty; fill it with ``python -m app.cli refresh-trending --full``.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('post_trending_scores',
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('refreshed_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['post_id'], ['posts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('post_id')
+    )
+    op.create_index('ix_post_trending_scores_score_post_id', 'post_trending_scores', ['score', 'post_id'], unique=False)
+    op.create_index('ix_post_trending_scores_created_at', 'post_trending_scores', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_post_trending_scores_created_at', table_name='post_trending_scores')
+    op.drop_index('ix_post_trending_scores_score_post_id', table_name='post_trending_scores')
+    op.drop_table('post_trending_scores')
@@ -0,0 +1,37 @@
+"""add post neighbors
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 19:22:51.604318
+
+"Also liked" neighbors (see app.services.similar_posts). The table starts
+empty; fill it with ``python -m app.cli compute-similar``.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('post_neighbors',
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.SmallInteger(), autoincrement=False, nullable=False),
+    sa.Column('neighbor_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(precision=24), nullable=False),
+    sa.ForeignKeyConstraint(['neighbor_id'], ['posts.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['post_id'], ['posts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('post_id', 'rank')
+    )
+    op.create_index('ix_post_neighbors_neighbor_id', 'post_neighbors', ['neighbor_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_post_neighbors_neighbor_id', table_name='post_neighbors')
+    op.drop_table('post_neighbors')
@@ -0,0 +1,35 @@
+"""add content-addressed blobs
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 22:40:12.530917
+
+New uploads are stored once per content hash under uploads/blobs/ and
+reference counted here (see app.services.storage). Files uploaded before
+this revision keep their uploads/posts/ paths and are never reclaimed.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('blobs',
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('extension', sa.String(length=16), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('sha256')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('blobs')
@@ -0,0 +1,35 @@
+"""add post colors
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 09:14:37.206551
+
+Color histograms of post main images for search by color (see
+app.services.colors). New uploads get one when their derivatives are
+rendered; backfill existing posts with ``python -m app.cli index-colors``.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('post_colors',
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('image', sa.String(), nullable=False),
+    sa.Column('histogram', sa.LargeBinary(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['post_id'], ['posts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('post_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('post_colors')
@@ -0,0 +1,66 @@
+"""add post image hashes
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 11:02:45.873190
+
+Perceptual hashes of post images and the duplicate_of link between posts
+with near-identical main images (see app.services.duplicates). New posts
+are hashed on upload; hash and link existing posts with
+``python -m app.cli scan-duplicates``.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def restore_expression_indexes() -> None:
+    if op.get_bind().dialect.name == 'sqlite':
+        # The table copy SQLite needs for this skips expression indexes (0004)
+        op.create_index('ix_posts_brand_lower', 'posts', [sa.text('lower(brand)')])
+
+
+def upgrade() -> None:
+    op.create_table('post_image_hashes',
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('image', sa.String(), nullable=False),
+    sa.Column('phash', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['post_id'], ['posts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('post_id', 'image')
+    )
+    op.create_index('ix_post_image_hashes_image', 'post_image_hashes', ['image'])
+    with op.batch_alter_table('posts') as batch_op:
+        batch_op.add_column(sa.Column('duplicate_of', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key(
+            'fk_posts_duplicate_of_posts', 'posts', ['duplicate_of'], ['id'], ondelete='SET NULL'
+        )
+    restore_expression_indexes()
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_posts_duplicate_of', 'posts', ['duplicate_of'],
+            if_not_exists=True,
+            postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_posts_duplicate_of', table_name='posts',
+            if_exists=True,
+            postgresql_concurrently=True
+        )
+    with op.batch_alter_table('posts') as batch_op:
+        batch_op.drop_constraint('fk_posts_duplicate_of_posts', type_='foreignkey')
+        batch_op.drop_column('duplicate_of')
+    restore_expression_indexes()
+    op.drop_index('ix_post_image_hashes_image', table_name='post_image_hashes')
+    op.drop_table('post_image_hashes')
@@ -0,0 +1,36 @@
+"""add post embeddings
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18 14:26:09.518342
+
+Visual embeddings of post main images for visually similar posts (see
+app.services.visual_search). New uploads get one when their derivatives
+are rendered; backfill existing posts with
+``python -m app.cli index-embeddings``.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('post_embeddings',
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('image', sa.String(), nullable=False),
+    sa.Column('vector', sa.LargeBinary(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['post_id'], ['posts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('post_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('post_embeddings')
@@ -0,0 +1,33 @@
+"""add daily unique viewers
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-18 16:48:31.904275
+
+Per-day distinct viewer estimates of posts and outfits, rolled up from
+the HyperLogLog sketches kept in Redis (see app.services.unique_viewers).
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0012'
+down_revision = '0011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('daily_unique_viewers',
+    sa.Column('kind', sa.String(length=16), nullable=False),
+    sa.Column('object_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('viewers', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('kind', 'object_id', 'day')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('daily_unique_viewers')
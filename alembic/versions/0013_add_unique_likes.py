@@ -0,0 +1,85 @@
+"""add unique likes
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-18 18:02:14.530861
+
+A user likes a post or outfit at most once: duplicate likes (left by
+concurrent double-taps) are dropped, keeping the first, like_count is
+recomputed from the remaining likes, and unique (user_id, post_id) and
+(user_id, outfit_id) indexes enforce it from here on. The likes index
+replaces the plain one on the same columns.
+
+On Postgres the unique indexes are built with CREATE INDEX CONCURRENTLY
+outside the migration transaction so the tables stay writable. Each is
+built under a temporary name and swapped in for the old index, so likes
+is never without an index on (user_id, post_id). Duplicates are removed
+again right before each build; if one still slips in, the build fails
+and leaves an invalid index, which a re-run drops and rebuilds.
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0013'
+down_revision = '0012'
+branch_labels = None
+depends_on = None
+
+
+# (index, like table, its key column, liked table)
+INDEXES = [
+    ('ix_likes_user_id_post_id', 'likes', 'post_id', 'posts'),
+    ('ix_outfit_likes_user_id_outfit_id', 'outfit_likes', 'outfit_id', 'outfits'),
+]
+
+
+def dedupe(likes: str, key: str) -> None:
+    op.execute(
+        f"DELETE FROM {likes} WHERE id NOT IN "
+        f"(SELECT MIN(id) FROM {likes} GROUP BY user_id, {key})"
+    )
+
+
+def recount(likes: str, key: str, target: str) -> None:
+    count = f"(SELECT COUNT(*) FROM {likes} WHERE {likes}.{key} = {target}.id)"
+    op.execute(f"UPDATE {target} SET like_count = {count} WHERE COALESCE(like_count, -1) != {count}")
+
+
+def swap_index(name: str, table: str, columns: list, unique: bool) -> None:
+    """Build ``name`` (unique or not) under a temporary name, then replace any existing ``name`` with it"""
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    building = f'{name}_new'
+    # Left behind, invalid, by a build that failed
+    op.drop_index(building, table_name=table, if_exists=True, postgresql_concurrently=True)
+    op.create_index(building, table, columns, unique=unique, postgresql_concurrently=True)
+    op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
+    if postgres:
+        op.execute(f'ALTER INDEX {building} RENAME TO {name}')
+    else:
+        # SQLite cannot rename an index, and its DDL blocks writers anyway
+        op.create_index(name, table, columns, unique=unique)
+        op.drop_index(building, table_name=table)
+
+
+def upgrade() -> None:
+    for _, likes, key, _ in INDEXES:
+        dedupe(likes, key)
+
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        for name, likes, key, target in INDEXES:
+            dedupe(likes, key)
+            swap_index(name, likes, ['user_id', key], unique=True)
+            recount(likes, key, target)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_outfit_likes_user_id_outfit_id', table_name='outfit_likes',
+            if_exists=True,
+            postgresql_concurrently=True
+        )
+        swap_index('ix_likes_user_id_post_id', 'likes', ['user_id', 'post_id'], unique=False)
@@ -1,7 +1,7 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import auth, users, posts
+from app.api.v1.endpoints import auth, users, posts, search, feed, uploads
 # Advanced features - commented out for MVP
-# from app.api.v1.endpoints import outfits, search, notifications
+# from app.api.v1.endpoints import outfits, notifications
 
 api_router = APIRouter()
 
@@ -9,8 +9,10 @@ api_router = APIRouter()
 api_router.include_router(auth.router, prefix="/auth", tags=["authentication"])
 api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(posts.router, prefix="/posts", tags=["posts"])
+api_router.include_router(search.router, prefix="/search", tags=["search"])
+api_router.include_router(feed.router, prefix="/feed", tags=["feed"])
+api_router.include_router(uploads.router, prefix="/uploads", tags=["uploads"])
 
 # Advanced features - disabled for MVP focus
 # api_router.include_router(outfits.router, prefix="/outfits", tags=["outfits"])
-# api_router.include_router(search.router, prefix="/search", tags=["search"])
 # api_router.include_router(notifications.router, prefix="/notifications", tags=["notifications"]) 
\ No newline at end of file
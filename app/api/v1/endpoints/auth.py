@@ -7,6 +7,8 @@ from app.core.database import get_db
 from app.core.security import verify_password, get_password_hash, create_access_token, create_refresh_token, verify_token
 from app.models.user import User
 from app.schemas.user import UserCreate, UserResponse, UserLogin, Token, RefreshTokenRequest
+from app.services.autocomplete import AutocompleteKind, AutocompleteService
+from app.services.counting import CountService
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
@@ -41,6 +43,8 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    CountService.invalidate("users")
+    AutocompleteService.adjust(AutocompleteKind.USERS, db_user.username)
     
     return db_user
 
@@ -133,6 +137,18 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     return user
 
 
+async def get_token_payload(token: str = Depends(oauth2_scheme)) -> dict:
+    """Validate the access token without loading the user, for endpoints that never touch the database"""
+    payload = verify_token(token)
+    if payload is None or payload.get("sub") is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return payload
+
+
 async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
     """Get current active user"""
     if not current_user.is_active:
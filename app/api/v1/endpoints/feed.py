@@ -0,0 +1,57 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.core.database import get_db
+from app.models.user import User
+from app.models.post import Post
+from app.api.v1.endpoints.auth import get_current_active_user
+from app.api.v1.endpoints.posts import get_image_preference
+from app.schemas.post import PostResponse, PostList
+from app.services.images import ImagePreference
+from app.services.post_hydration import PostHydrator
+from app.services.timeline import HomeTimeline
+from app.utils.pagination import encode_cursor, decode_cursor, parse_cursor_int
+
+router = APIRouter()
+
+
+@router.get("/home", response_model=PostList)
+async def get_home_feed(
+    size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_active_user),
+    image_preference: ImagePreference = Depends(get_image_preference),
+    db: Session = Depends(get_db)
+):
+    """Get the newest public posts by the current user and the accounts they follow.
+
+    Served from the user's materialized timeline (see ``HomeTimeline``), so
+    a page costs the same however many accounts the user follows. Always
+    cursor-paginated, keyed on the post id.
+    """
+    before_id = None
+    if cursor:
+        (last_id,) = decode_cursor(cursor, 1)
+        before_id = parse_cursor_int(last_id)
+    
+    post_ids = HomeTimeline.page(db, current_user.id, before_id, size + 1)
+    has_more = len(post_ids) > size
+    post_ids = post_ids[:size]
+    next_cursor = encode_cursor(post_ids[-1]) if has_more else None
+    
+    # Load the posts in timeline order, dropping any deleted or made private since
+    posts_by_id = {
+        post.id: post
+        for post in db.query(Post).filter(Post.id.in_(post_ids), Post.is_public == True)
+    }
+    posts = [posts_by_id[post_id] for post_id in post_ids if post_id in posts_by_id]
+    
+    post_responses = PostHydrator.hydrate(db, posts, current_user, image_preference)
+    
+    return PostList(
+        posts=[PostResponse(**post_dict) for post_dict in post_responses],
+        size=size,
+        next_cursor=next_cursor,
+        has_more=has_more
+    )
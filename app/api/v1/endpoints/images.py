@@ -0,0 +1,44 @@
+from fastapi import APIRouter, HTTPException, status, Query
+from fastapi.responses import FileResponse
+from typing import Optional
+
+from app.core.config import settings
+from app.services.image_resize import ImageResizer, ResizeFormat
+
+router = APIRouter()
+
+
+@router.get("/{path:path}")
+async def get_resized_image(
+    path: str,
+    w: Optional[int] = Query(None, ge=1, le=settings.IMAGE_RESIZE_MAX_DIMENSION, description="Maximum width"),
+    h: Optional[int] = Query(None, ge=1, le=settings.IMAGE_RESIZE_MAX_DIMENSION, description="Maximum height"),
+    fmt: Optional[ResizeFormat] = Query(None, description="Output format (default: follows the source)")
+):
+    """Serve an uploaded image scaled down to fit within ``w`` x ``h``.
+
+    ``path`` is relative to the uploads directory, e.g. ``/img/posts/abc.jpg?w=300``
+    for ``/uploads/posts/abc.jpg``. Variants are cached on disk; see ``ImageResizer``.
+    """
+    if w is None and h is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Pass w, h or both"
+        )
+    
+    source = ImageResizer.source_path(path)
+    if source is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Image not found"
+        )
+    
+    try:
+        variant, media_type = await ImageResizer.resize(source, w, h, fmt)
+    except (OSError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File is not a readable image"
+        )
+    
+    return FileResponse(variant, media_type=media_type, headers={"Cache-Control": "public, max-age=86400"})
@@ -6,16 +6,19 @@ from sqlalchemy import and_
 from app.core.database import get_db
 from app.models.user import User
 from app.models.notification import Notification, NotificationType
+from app.schemas.notification import NotificationList
 from app.api.v1.endpoints.auth import get_current_active_user
+from app.services.counting import CountService, CountStrategy
 
 router = APIRouter()
 
 
-@router.get("/", response_model=List[dict])
+@router.get("/", response_model=NotificationList)
 async def get_notifications(
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=100),
     unread_only: bool = False,
+    count_strategy: Optional[CountStrategy] = None,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
@@ -26,7 +29,13 @@ async def get_notifications(
         query = query.filter(Notification.is_read == False)
     
     # Get total count
-    total = query.count()
+    total, total_strategy = CountService.count(
+        db,
+        query,
+        CountService.resolve("notifications", count_strategy),
+        f"notifications:{current_user.id}",
+        {"unread_only": unread_only}
+    )
     
     # Paginate and order by creation date
     notifications = query.order_by(
@@ -51,6 +60,7 @@ async def get_notifications(
     return {
         "notifications": notification_responses,
         "total": total,
+        "count_strategy": total_strategy,
         "page": page,
         "size": size
     }
@@ -78,6 +88,7 @@ async def mark_notification_read(
     
     notification.is_read = True
     db.commit()
+    CountService.invalidate(f"notifications:{current_user.id}")
     
     return {"message": "Notification marked as read"}
 
@@ -96,6 +107,7 @@ async def mark_all_notifications_read(
     ).update({"is_read": True})
     
     db.commit()
+    CountService.invalidate(f"notifications:{current_user.id}")
     
     return {"message": "All notifications marked as read"}
 
@@ -122,6 +134,7 @@ async def delete_notification(
     
     db.delete(notification)
     db.commit()
+    CountService.invalidate(f"notifications:{current_user.id}")
     
     return {"message": "Notification deleted successfully"}
 
@@ -169,5 +182,6 @@ def create_notification(
     db.add(notification)
     db.commit()
     db.refresh(notification)
+    CountService.invalidate(f"notifications:{user_id}")
     
     return notification 
\ No newline at end of file
@@ -1,17 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from sqlalchemy import and_
 
 from app.core.database import get_db
 from app.models.user import User
-from app.models.outfit import Outfit, OutfitItem, OutfitLike
+from app.models.outfit import Outfit, OutfitItem
 from app.models.post import Post
 from app.api.v1.endpoints.auth import get_current_active_user
+from app.services.likes import LikeService
+from app.services.unique_viewers import UniqueViewers
+from app.services.view_counts import ViewCounter
 
 router = APIRouter()
 
 
+def column_values(row) -> dict:
+    """A row's column values, without the ORM state ``__dict__`` also holds"""
+    return {column.key: getattr(row, column.key) for column in row.__table__.columns}
+
+
 @router.get("/", response_model=List[dict])
 async def get_outfits(
     page: int = Query(1, ge=1),
@@ -24,9 +31,11 @@ async def get_outfits(
         Outfit.created_at.desc()
     ).offset((page - 1) * size).limit(size).all()
     
+    unique_viewers = UniqueViewers.counts("outfits", [outfit.id for outfit in outfits])
     outfit_responses = []
     for outfit in outfits:
-        outfit_dict = outfit.__dict__.copy()
+        outfit_dict = column_values(outfit)
+        outfit_dict['unique_viewers'] = unique_viewers[outfit.id]
         outfit_dict['creator'] = {
             'id': outfit.creator.id,
             'username': outfit.creator.username,
@@ -36,7 +45,7 @@ async def get_outfits(
         # Get outfit items
         items = []
         for item in outfit.items:
-            item_dict = item.__dict__.copy()
+            item_dict = column_values(item)
             item_dict['post'] = {
                 'id': item.post.id,
                 'title': item.post.title,
@@ -130,11 +139,13 @@ async def get_outfit(
             detail="Not authorized to view this outfit"
         )
     
-    # Increment view count
-    outfit.view_count += 1
-    db.commit()
+    # Count the view; it reaches outfits.view_count with the next flush
+    buffered_views = ViewCounter.record("outfits", outfit_id)
+    UniqueViewers.record("outfits", outfit_id, current_user.id)
     
-    outfit_dict = outfit.__dict__.copy()
+    outfit_dict = column_values(outfit)
+    outfit_dict['view_count'] = (outfit.view_count or 0) + buffered_views
+    outfit_dict['unique_viewers'] = UniqueViewers.counts("outfits", [outfit_id])[outfit_id]
     outfit_dict['creator'] = {
         'id': outfit.creator.id,
         'username': outfit.creator.username,
@@ -144,7 +155,7 @@ async def get_outfit(
     # Get outfit items
     items = []
     for item in outfit.items:
-        item_dict = item.__dict__.copy()
+        item_dict = column_values(item)
         item_dict['post'] = {
             'id': item.post.id,
             'title': item.post.title,
@@ -229,41 +240,24 @@ async def delete_outfit(
     return {"message": "Outfit deleted successfully"}
 
 
-@router.post("/{outfit_id}/like")
+@router.put("/{outfit_id}/like")
+@router.post("/{outfit_id}/like", deprecated=True)
 async def like_outfit(
     outfit_id: int,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Like an outfit"""
-    outfit = db.query(Outfit).filter(Outfit.id == outfit_id).first()
-    if not outfit:
+    """Like an outfit; liking it again changes nothing"""
+    result = LikeService.like(db, "outfits", outfit_id, current_user.id)
+    if result is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Outfit not found"
         )
     
-    # Check if already liked
-    existing_like = db.query(OutfitLike).filter(
-        and_(OutfitLike.user_id == current_user.id, OutfitLike.outfit_id == outfit_id)
-    ).first()
-    
-    if existing_like:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Already liked this outfit"
-        )
-    
-    # Create like
-    like = OutfitLike(user_id=current_user.id, outfit_id=outfit_id)
-    db.add(like)
-    
-    # Update outfit like count
-    outfit.like_count += 1
-    
     db.commit()
     
-    return {"message": "Outfit liked successfully"}
+    return {"message": "Outfit liked successfully", "liked": True, "like_count": result.like_count}
 
 
 @router.delete("/{outfit_id}/like")
@@ -272,25 +266,14 @@ async def unlike_outfit(
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Unlike an outfit"""
-    like = db.query(OutfitLike).filter(
-        and_(OutfitLike.user_id == current_user.id, OutfitLike.outfit_id == outfit_id)
-    ).first()
-    
-    if not like:
+    """Unlike an outfit; unliking an outfit that isn't liked changes nothing"""
+    result = LikeService.unlike(db, "outfits", outfit_id, current_user.id)
+    if result is None:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Not liked this outfit"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Outfit not found"
         )
     
-    # Remove like
-    db.delete(like)
-    
-    # Update outfit like count
-    outfit = db.query(Outfit).filter(Outfit.id == outfit_id).first()
-    if outfit:
-        outfit.like_count = max(0, outfit.like_count - 1)
-    
     db.commit()
     
-    return {"message": "Outfit unliked successfully"} 
\ No newline at end of file
+    return {"message": "Outfit unliked successfully", "liked": False, "like_count": result.like_count}
\ No newline at end of file
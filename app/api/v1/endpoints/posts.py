@@ -1,90 +1,155 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Form
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status, Query, UploadFile, File, Form
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from sqlalchemy import and_, or_
+from sqlalchemy import or_
 
+from app.core.config import settings
 from app.core.database import get_db
 from app.models.user import User
-from app.models.post import Post, Comment, Like, Tag, PostTag, ClothingCategory
+from app.models.post import Post, Comment, Tag, PostTag, PostNeighbor, ClothingCategory
 from app.schemas.post import PostCreate, PostUpdate, PostResponse, PostList, CommentCreate, CommentResponse, CommentList
 from app.api.v1.endpoints.auth import get_current_active_user
-from app.utils.file_upload import save_upload_file
+from app.services.autocomplete import AutocompleteService
+from app.services.counting import CountService, CountStrategy
+from app.services.duplicates import DuplicateIndex
+from app.services.images import ImagePipeline, ImagePreference, PENDING, manifest_for, originals
+from app.services.likes import LikeService
+from app.services.post_hydration import PostHydrator
+from app.services.recommendations import RecommendationEngine
+from app.services.search_index import PostSearchIndex
+from app.services.storage import BlobStore
+from app.services.text_lookup import MatchMode, TextLookup
+from app.services.trending import TrendingService
+from app.services.timeline import HomeTimeline
+from app.services.unique_viewers import UniqueViewers
+from app.services.view_counts import ViewCounter
+from app.services.visual_search import VisualIndex
+from app.utils.file_upload import discard_staged, invalid_image, stage_upload_files, stored_path
+from app.utils.image_headers import InvalidImage
+from app.utils.pagination import (
+    encode_cursor, decode_cursor, parse_cursor_datetime, parse_cursor_int,
+    anchored_value, keyset_condition
+)
+import asyncio
 import json
 
 router = APIRouter()
 
 
+def parse_list_field(value: Optional[str]) -> List[str]:
+    """A form field holding a JSON array or a comma-separated list"""
+    if not value:
+        return []
+    try:
+        # Try parsing as JSON first
+        return json.loads(value)
+    except:
+        # If not JSON, treat as comma-separated
+        return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def get_image_preference(
+    request: Request,
+    image_width: Optional[int] = Query(None, ge=1, le=4096, description="Width images will be displayed at")
+) -> ImagePreference:
+    """Point ``display_image`` at the variant for ``image_width``, as WebP when the client accepts it"""
+    return ImagePreference(
+        image_width or settings.IMAGE_DISPLAY_WIDTH,
+        "image/webp" in request.headers.get("accept", "")
+    )
+
+
 @router.get("/", response_model=PostList)
 async def get_posts(
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=100),
     category: Optional[str] = None,
     brand: Optional[str] = None,
+    brand_match: MatchMode = MatchMode.CONTAINS,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
+    pagination: str = Query("page", pattern="^(page|cursor)$"),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    count_strategy: Optional[CountStrategy] = None,
     current_user: User = Depends(get_current_active_user),
+    image_preference: ImagePreference = Depends(get_image_preference),
     db: Session = Depends(get_db)
 ):
-    """Get all posts with filters"""
+    """Get all posts with filters.
+
+    ``pagination=cursor`` (or passing a ``cursor``) switches to keyset
+    pagination on ``(created_at, id)``: the response carries ``next_cursor``
+    and ``has_more`` and skips the total count unless ``include_total`` is set.
+    ``count_strategy`` picks how ``total`` is computed (exact, cached or estimated).
+    """
     query = db.query(Post).filter(Post.is_public == True)
     
     # Apply filters
     if category:
         query = query.filter(Post.category == category)
     if brand:
-        query = query.filter(Post.brand.ilike(f"%{brand}%"))
+        query = query.filter(TextLookup.match(db, Post.brand, brand, brand_match))
     if min_price is not None:
         query = query.filter(Post.price >= min_price)
     if max_price is not None:
         query = query.filter(Post.price <= max_price)
     
+    use_cursor = pagination == "cursor" or cursor is not None
+    
     # Get total count
-    total = query.count()
-    
-    # Paginate
-    posts = query.order_by(Post.created_at.desc()).offset((page - 1) * size).limit(size).all()
-    
-    # Add author info and check if liked
-    post_responses = []
-    for post in posts:
-        post_dict = post.__dict__.copy()
-        post_dict['author'] = {
-            'id': post.author.id,
-            'username': post.author.username,
-            'profile_picture': post.author.profile_picture
-        }
-        
-        # Check if current user liked this post
-        is_liked = db.query(Like).filter(
-            and_(Like.user_id == current_user.id, Like.post_id == post.id)
-        ).first() is not None
-        post_dict['is_liked'] = is_liked
-        
-        # Get tags
-        tags = [tag.tag.name for tag in post.tags]
-        post_dict['tags'] = tags
-        
-        # Parse additional_images JSON string
-        if post.additional_images:
-            try:
-                post_dict['additional_images'] = json.loads(post.additional_images)
-            except:
-                post_dict['additional_images'] = []
-        else:
-            post_dict['additional_images'] = []
+    total, total_strategy = None, None
+    if not use_cursor or include_total:
+        total, total_strategy = CountService.count(
+            db, query, CountService.resolve("posts", count_strategy), "posts",
+            {"category": category, "brand": brand, "brand_match": brand_match.value,
+             "min_price": min_price, "max_price": max_price}
+        )
+    
+    # Paginate, fetching one extra row to tell whether another page exists
+    query = query.order_by(Post.created_at.desc(), Post.id.desc())
+    next_cursor = None
+    if use_cursor:
+        if cursor:
+            created_at, last_id = decode_cursor(cursor, 2)
+            last_id = parse_cursor_int(last_id)
+            query = query.filter(keyset_condition(
+                [Post.created_at, Post.id],
+                [
+                    anchored_value(Post.created_at, Post.id, last_id, parse_cursor_datetime(created_at)),
+                    last_id
+                ]
+            ))
         
-        post_responses.append(PostResponse(**post_dict))
+        posts = query.limit(size + 1).all()
+    else:
+        posts = query.offset((page - 1) * size).limit(size + 1).all()
+    
+    has_more = len(posts) > size
+    posts = posts[:size]
+    if use_cursor and has_more:
+        next_cursor = encode_cursor(posts[-1].created_at, posts[-1].id)
+    
+    # Hydrate authors, tags and likes for the whole page
+    post_responses = [
+        PostResponse(**post_dict)
+        for post_dict in PostHydrator.hydrate(db, posts, current_user, image_preference)
+    ]
     
     return PostList(
         posts=post_responses,
         total=total,
-        page=page,
-        size=size
+        count_strategy=total_strategy,
+        page=None if use_cursor else page,
+        size=size,
+        next_cursor=next_cursor,
+        has_more=has_more
     )
 
 
 @router.post("/", response_model=PostResponse)
 async def create_post(
+    background_tasks: BackgroundTasks,
     title: str = Form(...),
     description: Optional[str] = Form(None),
     category: ClothingCategory = Form(...),
@@ -96,33 +161,52 @@ async def create_post(
     review: Optional[str] = Form(None),
     is_public: bool = Form(True),
     tags: Optional[str] = Form(None),  # JSON string or comma-separated
-    main_image: UploadFile = File(...),
-    additional_images: Optional[List[UploadFile]] = File(None),
+    main_image: Optional[UploadFile] = File(None),
+    additional_images: List[UploadFile] = File([]),  # Optional[List[...]] fails validation on FastAPI 0.104
+    uploaded_images: Optional[str] = Form(None),  # keys from POST /uploads, after the main/additional files
     current_user: User = Depends(get_current_active_user),
+    image_preference: ImagePreference = Depends(get_image_preference),
     db: Session = Depends(get_db)
 ):
-    """Create a new post with image upload"""
-    # Save main image
-    main_image_path = save_upload_file(main_image, folder="posts")
+    """Create a new post with image upload.
+
+    Posts whose main image is a near-duplicate of an earlier post's image
+    (a re-posted product photo) come back with ``duplicate_of`` set to the
+    earliest one; see ``DuplicateIndex``.
+    """
+    # Images uploaded straight to storage beforehand (POST /uploads)
+    uploaded = []
+    for key in parse_list_field(uploaded_images):
+        try:
+            upload = await asyncio.to_thread(BlobStore.uploaded, key)
+        except InvalidImage as e:
+            raise invalid_image(e)
+        if upload is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Upload {key} not found"
+            )
+        uploaded.append(upload)
+    
+    files = [main_image, *additional_images] if main_image else list(additional_images)
+    if not files and not uploaded:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="main_image or uploaded_images is required"
+        )
     
-    # Save additional images if provided
-    additional_image_paths = []
-    if additional_images:
-        for img in additional_images:
-            img_path = save_upload_file(img, folder="posts")
-            additional_image_paths.append(img_path)
+    # Stream main and additional images to disk concurrently; stored with the post below
+    staged = await stage_upload_files(files) + uploaded
     
     # Parse tags
-    tag_list = []
-    if tags:
-        try:
-            # Try parsing as JSON first
-            tag_list = json.loads(tags)
-        except:
-            # If not JSON, treat as comma-separated
-            tag_list = [t.strip() for t in tags.split(",") if t.strip()]
+    tag_list = parse_list_field(tags)
     
     # Create post
+    try:
+        hashes = await asyncio.to_thread(DuplicateIndex.hash_uploads, staged)
+        main_image_path, *additional_image_paths = await asyncio.to_thread(BlobStore.store, db, staged)
+    finally:
+        discard_staged(staged)
     db_post = Post(
         title=title,
         description=description,
@@ -135,7 +219,8 @@ async def create_post(
         review=review,
         is_public=is_public,
         main_image=main_image_path,
-        additional_images=json.dumps(additional_image_paths) if additional_image_paths else None,
+        images=manifest_for([main_image_path, *additional_image_paths]),
+        duplicate_of=DuplicateIndex.original_of(db, hashes[0], current_user.id),
         author_id=current_user.id
     )
     
@@ -158,23 +243,21 @@ async def create_post(
             post_tag = PostTag(post_id=db_post.id, tag_id=tag.id)
             db.add(post_tag)
     
+    PostSearchIndex.index_post(db, db_post.id)
+    stored_hashes = DuplicateIndex.store(db, db_post.id, zip([main_image_path, *additional_image_paths], hashes))
     db.commit()
     db.refresh(db_post)
+    CountService.invalidate("posts")
+    DuplicateIndex.record(db_post.id, stored_hashes.values())
+    AutocompleteService.post_terms_changed((None, []), AutocompleteService.post_terms(db_post, tag_list))
+    TrendingService.mark(db_post.id)
+    # Run after the response is sent, in sessions of their own
+    if db_post.is_public:
+        background_tasks.add_task(HomeTimeline.run, HomeTimeline.publish, db_post.id, db_post.author_id)
+    background_tasks.add_task(ImagePipeline.process_post, db_post.id)
     
     # Return response with author info
-    post_dict = db_post.__dict__.copy()
-    post_dict['author'] = {
-        'id': db_post.author.id,
-        'username': db_post.author.username,
-        'profile_picture': db_post.author.profile_picture
-    }
-    post_dict['tags'] = tag_list
-    post_dict['is_liked'] = False
-    # Parse additional_images JSON string
-    if db_post.additional_images:
-        post_dict['additional_images'] = json.loads(db_post.additional_images)
-    else:
-        post_dict['additional_images'] = []
+    post_dict = PostHydrator.hydrate_one(db, db_post, current_user, image_preference)
     
     return PostResponse(**post_dict)
 
@@ -183,6 +266,7 @@ async def create_post(
 async def get_post(
     post_id: int,
     current_user: User = Depends(get_current_active_user),
+    image_preference: ImagePreference = Depends(get_image_preference),
     db: Session = Depends(get_db)
 ):
     """Get a specific post"""
@@ -193,45 +277,93 @@ async def get_post(
             detail="Post not found"
         )
     
-    # Increment view count
-    post.view_count += 1
-    db.commit()
+    # Count the view; it reaches posts.view_count with the next flush
+    buffered_views = ViewCounter.record("posts", post_id)
+    UniqueViewers.record("posts", post_id, current_user.id)
     
-    # Return response with author info
-    post_dict = post.__dict__.copy()
-    post_dict['author'] = {
-        'id': post.author.id,
-        'username': post.author.username,
-        'profile_picture': post.author.profile_picture
-    }
+    # Return response with author, tag and like info
+    post_dict = PostHydrator.hydrate_one(db, post, current_user, image_preference)
+    post_dict["view_count"] = (post.view_count or 0) + buffered_views
     
-    # Check if current user liked this post
-    is_liked = db.query(Like).filter(
-        and_(Like.user_id == current_user.id, Like.post_id == post.id)
-    ).first() is not None
-    post_dict['is_liked'] = is_liked
+    return PostResponse(**post_dict)
+
+
+@router.get("/{post_id}/similar", response_model=PostList)
+async def get_similar_posts(
+    post_id: int,
+    size: int = Query(10, ge=1, le=settings.SIMILAR_POSTS_TOP_K),
+    current_user: User = Depends(get_current_active_user),
+    image_preference: ImagePreference = Depends(get_image_preference),
+    db: Session = Depends(get_db)
+):
+    """Get posts that people who liked this post also liked.
+
+    Served from the neighbors precomputed by ``python -m app.cli
+    compute-similar``, best match first; empty until the job has run.
+    """
+    posts = db.query(Post).join(
+        PostNeighbor, PostNeighbor.neighbor_id == Post.id
+    ).filter(
+        PostNeighbor.post_id == post_id,
+        Post.is_public == True
+    ).order_by(PostNeighbor.rank).limit(size).all()
+    
+    post_responses = PostHydrator.hydrate(db, posts, current_user, image_preference)
     
-    # Get tags
-    tags = [tag.tag.name for tag in post.tags]
-    post_dict['tags'] = tags
+    return PostList(
+        posts=[PostResponse(**post_dict) for post_dict in post_responses],
+        size=size
+    )
+
+
+@router.get("/{post_id}/visually-similar", response_model=PostList)
+async def get_visually_similar_posts(
+    post_id: int,
+    size: int = Query(10, ge=1, le=50),
+    current_user: User = Depends(get_current_active_user),
+    image_preference: ImagePreference = Depends(get_image_preference),
+    db: Session = Depends(get_db)
+):
+    """Get public posts whose main image looks most like this post's.
+
+    Nearest neighbors of the post's image embedding in the visual index,
+    closest first; empty until the post's images have been processed.
+    """
+    post = db.query(Post.id).filter(
+        Post.id == post_id,
+        or_(Post.is_public == True, Post.author_id == current_user.id)
+    ).first()
+    if not post:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Post not found"
+        )
     
-    # Parse additional_images JSON string
-    if post.additional_images:
-        try:
-            post_dict['additional_images'] = json.loads(post.additional_images)
-        except:
-            post_dict['additional_images'] = []
-    else:
-        post_dict['additional_images'] = []
+    ranks = {
+        neighbor_id: rank
+        for rank, (neighbor_id, _) in enumerate(VisualIndex.similar(db, post_id, settings.VISUAL_SIMILAR_CANDIDATES))
+    }
+    posts = []
+    if ranks:
+        # The index may hold posts made private or deleted since it was loaded; the query drops them
+        posts = db.query(Post).filter(Post.id.in_(list(ranks)), Post.is_public == True).all()
+        posts = sorted(posts, key=lambda post: ranks[post.id])[:size]
     
-    return PostResponse(**post_dict)
+    post_responses = PostHydrator.hydrate(db, posts, current_user, image_preference)
+    
+    return PostList(
+        posts=[PostResponse(**post_dict) for post_dict in post_responses],
+        size=size
+    )
 
 
 @router.put("/{post_id}", response_model=PostResponse)
 async def update_post(
     post_id: int,
     post_update: PostUpdate,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_active_user),
+    image_preference: ImagePreference = Depends(get_image_preference),
     db: Session = Depends(get_db)
 ):
     """Update a post"""
@@ -248,10 +380,26 @@ async def update_post(
             detail="Not authorized to update this post"
         )
     
+    old_tags = PostHydrator.load_tags(db, [post_id]).get(post_id, [])
+    old_terms = AutocompleteService.post_terms(post, old_tags)
+    was_public = post.is_public
+    added_hashes = {}
+    
     # Update fields
     update_data = post_update.dict(exclude_unset=True)
-    if 'additional_images' in update_data:
-        update_data['additional_images'] = json.dumps(update_data['additional_images'])
+    if 'main_image' in update_data or 'additional_images' in update_data:
+        current = post.images or manifest_for([post.main_image])
+        additional = update_data.pop('additional_images', None)
+        if additional is None:
+            additional = [entry['original'] for entry in current[1:]]
+        old_images = originals(post)
+        if update_data.get('main_image'):
+            update_data['main_image'] = stored_path(update_data['main_image'])
+        additional = [stored_path(url) for url in additional]
+        post.images = manifest_for([update_data.get('main_image') or post.main_image, *additional], current)
+        BlobStore.retain(db, originals(post))
+        await asyncio.to_thread(BlobStore.release, db, old_images)
+        added_hashes = DuplicateIndex.images_changed(db, post_id, originals(post))
     
     for field, value in update_data.items():
         if field != 'tags':
@@ -268,33 +416,33 @@ async def update_post(
             if not tag:
                 tag = Tag(name=tag_name)
                 db.add(tag)
-                db.commit()
-                db.refresh(tag)
+                db.flush()
             
             post_tag = PostTag(post_id=post_id, tag_id=tag.id)
             db.add(post_tag)
     
-    db.commit()
+    PostSearchIndex.index_post(db, post_id)
+    if not post.is_public:
+        TrendingService.remove(db, post_id)
+    # Deletes the files of released blobs from storage
+    await asyncio.to_thread(db.commit)
     db.refresh(post)
+    CountService.invalidate("posts")
+    if added_hashes:
+        DuplicateIndex.record(post_id, added_hashes.values())
+    AutocompleteService.post_terms_changed(old_terms, AutocompleteService.post_terms(
+        post, old_tags if post_update.tags is None else post_update.tags
+    ))
+    TrendingService.mark(post_id)
+    if post.is_public and not was_public:
+        background_tasks.add_task(HomeTimeline.run, HomeTimeline.publish, post_id, post.author_id)
+    elif was_public and not post.is_public:
+        HomeTimeline.retract(post_id, post.author_id)
+    if any(entry['status'] == PENDING for entry in post.images or ()):
+        background_tasks.add_task(ImagePipeline.process_post, post_id)
     
     # Return response
-    post_dict = post.__dict__.copy()
-    post_dict['author'] = {
-        'id': post.author.id,
-        'username': post.author.username,
-        'profile_picture': post.author.profile_picture
-    }
-    post_dict['tags'] = post_update.tags or []
-    post_dict['is_liked'] = False
-    
-    # Parse additional_images JSON string
-    if post.additional_images:
-        try:
-            post_dict['additional_images'] = json.loads(post.additional_images)
-        except:
-            post_dict['additional_images'] = []
-    else:
-        post_dict['additional_images'] = []
+    post_dict = PostHydrator.hydrate_one(db, post, current_user, image_preference)
     
     return PostResponse(**post_dict)
 
@@ -319,47 +467,42 @@ async def delete_post(
             detail="Not authorized to delete this post"
         )
     
+    old_terms = AutocompleteService.post_terms(post, PostHydrator.load_tags(db, [post_id]).get(post_id, []))
+    
+    await asyncio.to_thread(BlobStore.release, db, originals(post))
     db.delete(post)
-    db.commit()
+    PostSearchIndex.remove_post(db, post_id)
+    # Deletes the files of released blobs from storage
+    await asyncio.to_thread(db.commit)
+    CountService.invalidate("posts")
+    CountService.invalidate(f"comments:{post_id}")
+    AutocompleteService.post_terms_changed(old_terms, (None, []))
+    HomeTimeline.retract(post_id, current_user.id)
     
     return {"message": "Post deleted successfully"}
 
 
-@router.post("/{post_id}/like")
+@router.put("/{post_id}/like")
+@router.post("/{post_id}/like", deprecated=True)
 async def like_post(
     post_id: int,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Like a post"""
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if not post:
+    """Like a post; liking it again changes nothing"""
+    result = LikeService.like(db, "posts", post_id, current_user.id)
+    if result is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Post not found"
         )
     
-    # Check if already liked
-    existing_like = db.query(Like).filter(
-        and_(Like.user_id == current_user.id, Like.post_id == post_id)
-    ).first()
-    
-    if existing_like:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Already liked this post"
-        )
-    
-    # Create like
-    like = Like(user_id=current_user.id, post_id=post_id)
-    db.add(like)
-    
-    # Update post like count
-    post.like_count += 1
-    
     db.commit()
+    if result.changed:
+        TrendingService.mark(post_id)
+        RecommendationEngine.record_like(current_user.id, post_id)
     
-    return {"message": "Post liked successfully"}
+    return {"message": "Post liked successfully", "liked": True, "like_count": result.like_count}
 
 
 @router.delete("/{post_id}/like")
@@ -368,28 +511,20 @@ async def unlike_post(
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Unlike a post"""
-    like = db.query(Like).filter(
-        and_(Like.user_id == current_user.id, Like.post_id == post_id)
-    ).first()
-    
-    if not like:
+    """Unlike a post; unliking a post that isn't liked changes nothing"""
+    result = LikeService.unlike(db, "posts", post_id, current_user.id)
+    if result is None:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Not liked this post"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Post not found"
         )
     
-    # Remove like
-    db.delete(like)
-    
-    # Update post like count
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if post:
-        post.like_count = max(0, post.like_count - 1)
-    
     db.commit()
+    if result.changed:
+        TrendingService.mark(post_id)
+        RecommendationEngine.record_like(current_user.id, post_id, -1)
     
-    return {"message": "Post unliked successfully"}
+    return {"message": "Post unliked successfully", "liked": False, "like_count": result.like_count}
 
 
 @router.post("/{post_id}/comments", response_model=CommentResponse)
@@ -421,6 +556,8 @@ async def create_comment(
     
     db.commit()
     db.refresh(comment)
+    CountService.invalidate(f"comments:{post_id}")
+    TrendingService.mark(post_id)
     
     # Return response with author info
     comment_dict = comment.__dict__.copy()
@@ -438,6 +575,7 @@ async def get_post_comments(
     post_id: int,
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=100),
+    count_strategy: Optional[CountStrategy] = None,
     db: Session = Depends(get_db)
 ):
     """Get comments for a post"""
@@ -453,22 +591,25 @@ async def get_post_comments(
         Comment.created_at.desc()
     ).offset((page - 1) * size).limit(size).all()
     
-    total = db.query(Comment).filter(Comment.post_id == post_id).count()
+    total, total_strategy = CountService.count(
+        db,
+        db.query(Comment).filter(Comment.post_id == post_id),
+        CountService.resolve("comments", count_strategy),
+        f"comments:{post_id}"
+    )
     
-    # Add author info
+    # Add author info, loading all authors in one query
+    authors = PostHydrator.load_authors(db, (comment.author_id for comment in comments))
     comment_responses = []
     for comment in comments:
         comment_dict = comment.__dict__.copy()
-        comment_dict['author'] = {
-            'id': comment.author.id,
-            'username': comment.author.username,
-            'profile_picture': comment.author.profile_picture
-        }
+        comment_dict['author'] = authors.get(comment.author_id, {'id': comment.author_id})
         comment_responses.append(CommentResponse(**comment_dict))
     
     return CommentList(
         comments=comment_responses,
         total=total,
+        count_strategy=total_strategy,
         page=page,
         size=size
     ) 
\ No newline at end of file
@@ -1,111 +1,196 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from sqlalchemy import and_, or_, func, desc
+from sqlalchemy import or_, desc
 
+from app.core.config import settings
 from app.core.database import get_db
-from app.models.user import User, user_followers
-from app.models.post import Post, Tag, PostTag, Like
+from app.models.user import User
+from app.models.post import Post, Tag, PostTrendingScore
 from app.models.outfit import Outfit
-from app.api.v1.endpoints.auth import get_current_active_user
+from app.api.v1.endpoints.auth import get_current_active_user, get_token_payload
+from app.api.v1.endpoints.posts import get_image_preference
+from app.schemas.post import PostResponse, PostList, TagList
+from app.schemas.search import AutocompleteResponse
+from app.schemas.user import UserList
+from app.services.autocomplete import AutocompleteKind, AutocompleteService
+from app.services.colors import ColorIndex, parse_color
+from app.services.counting import CountService, CountStrategy
+from app.services.images import ImagePreference
+from app.services.post_hydration import PostHydrator
+from app.services.recommendations import RecommendationEngine
+from app.services.search_index import PostSearchIndex
+from app.services.text_lookup import MatchMode, TextLookup
+from app.utils.pagination import encode_cursor, decode_cursor, parse_cursor_int, parse_cursor_number, keyset_condition
 
 router = APIRouter()
 
 
-@router.get("/posts", response_model=List[dict])
+@router.get("/posts", response_model=PostList)
 async def search_posts(
-    q: str = Query(..., description="Search query"),
+    q: Optional[str] = Query(None, description="Search query"),
+    color: Optional[str] = Query(None, description="Color name (e.g. navy) or hex code (e.g. #1a2a5a)"),
     category: Optional[str] = None,
     brand: Optional[str] = None,
+    brand_match: MatchMode = MatchMode.CONTAINS,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=100),
+    pagination: str = Query("page", pattern="^(page|cursor)$"),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    count_strategy: Optional[CountStrategy] = None,
     current_user: User = Depends(get_current_active_user),
+    image_preference: ImagePreference = Depends(get_image_preference),
     db: Session = Depends(get_db)
 ):
-    """Search posts by query and filters"""
+    """Search posts by query, color and filters.
+
+    Matches ``q`` against the full-text index and orders by text relevance.
+    With ``color``, posts whose main image is largely close to that color
+    match instead, ordered by how much of the image it covers (``q`` then
+    only narrows them down); see ``ColorIndex``. Supports the same
+    ``pagination=cursor`` mode as ``GET /posts``, keyed on the relevance or
+    color score and post id.
+    """
+    rgb = None
+    if color is not None:
+        rgb = parse_color(color)
+        if rgb is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid color. Use a color name or a hex code such as #1a2a5a."
+            )
+    elif q is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="q or color is required"
+        )
+    
     query = db.query(Post).filter(Post.is_public == True)
     
     # Apply search query
-    if q:
-        query = query.filter(
-            or_(
-                Post.title.ilike(f"%{q}%"),
-                Post.description.ilike(f"%{q}%"),
-                Post.brand.ilike(f"%{q}%"),
-                Post.store_name.ilike(f"%{q}%")
-            )
-        )
+    if q is not None:
+        query, rank = PostSearchIndex.search(db, query, q)
     
     # Apply filters
     if category:
         query = query.filter(Post.category == category)
     if brand:
-        query = query.filter(Post.brand.ilike(f"%{brand}%"))
+        query = query.filter(TextLookup.match(db, Post.brand, brand, brand_match))
     if min_price is not None:
         query = query.filter(Post.price >= min_price)
     if max_price is not None:
         query = query.filter(Post.price <= max_price)
     
-    # Get total count
-    total = query.count()
+    use_cursor = pagination == "cursor" or cursor is not None
+    total, total_strategy = None, None
+    next_cursor = None
     
-    # Paginate and order by relevance (likes + views)
-    posts = query.order_by(
-        desc(Post.like_count + Post.view_count)
-    ).offset((page - 1) * size).limit(size).all()
-    
-    # Format response
-    post_responses = []
-    for post in posts:
-        post_dict = post.__dict__.copy()
-        post_dict['author'] = {
-            'id': post.author.id,
-            'username': post.author.username,
-            'profile_picture': post.author.profile_picture
+    if rgb is not None:
+        # Score every post's colors at once, then keep the best matches that pass the filters
+        matches = ColorIndex.matches(db, rgb)
+        allowed = {
+            row.id for row in query.with_entities(Post.id).filter(Post.id.in_([post_id for post_id, _ in matches]))
         }
+        ranked = [(post_id, score) for post_id, score in matches if post_id in allowed]
+        if not use_cursor or include_total:
+            total, total_strategy = len(ranked), CountStrategy.EXACT
         
-        # Get tags
-        tags = [tag.tag.name for tag in post.tags]
-        post_dict['tags'] = tags
+        if cursor:
+            last_score, last_id = decode_cursor(cursor, 2)
+            last_score, last_id = parse_cursor_number(last_score), parse_cursor_int(last_id)
+            ranked = [
+                (post_id, score) for post_id, score in ranked
+                if score < last_score or (score == last_score and post_id < last_id)
+            ]
+        offset = 0 if use_cursor else (page - 1) * size
+        ranked = ranked[offset:offset + size + 1]
+        has_more = len(ranked) > size
+        ranked = ranked[:size]
+        if use_cursor and has_more:
+            next_cursor = encode_cursor(ranked[-1][1], ranked[-1][0])
         
-        post_responses.append(post_dict)
+        posts_by_id = {post.id: post for post in db.query(Post).filter(Post.id.in_([post_id for post_id, _ in ranked]))}
+        posts = [posts_by_id[post_id] for post_id, _ in ranked if post_id in posts_by_id]
+    else:
+        # Get total count
+        if not use_cursor or include_total:
+            total, total_strategy = CountService.count(
+                db, query, CountService.resolve("search_posts", count_strategy), "posts",
+                {"q": q, "category": category, "brand": brand, "brand_match": brand_match.value,
+                 "min_price": min_price, "max_price": max_price}
+            )
+        
+        # Paginate and order by relevance
+        query = query.add_columns(rank.label("rank")).order_by(desc(rank), desc(Post.id))
+        if use_cursor:
+            if cursor:
+                last_rank, last_id = decode_cursor(cursor, 2)
+                query = query.filter(keyset_condition(
+                    [rank, Post.id],
+                    [parse_cursor_number(last_rank), parse_cursor_int(last_id)]
+                ))
+            
+            rows = query.limit(size + 1).all()
+        else:
+            rows = query.offset((page - 1) * size).limit(size + 1).all()
+        
+        has_more = len(rows) > size
+        rows = rows[:size]
+        posts = [row.Post for row in rows]
+        if use_cursor and has_more:
+            next_cursor = encode_cursor(rows[-1].rank, rows[-1].Post.id)
     
-    return {
-        "posts": post_responses,
-        "total": total,
-        "page": page,
-        "size": size
-    }
+    # Format response
+    post_responses = PostHydrator.hydrate(db, posts, current_user, image_preference)
+    
+    return PostList(
+        posts=[PostResponse(**post_dict) for post_dict in post_responses],
+        total=total,
+        count_strategy=total_strategy,
+        page=None if use_cursor else page,
+        size=size,
+        next_cursor=next_cursor,
+        has_more=has_more
+    )
 
 
-@router.get("/users", response_model=List[dict])
+@router.get("/users", response_model=UserList)
 async def search_users(
     q: str = Query(..., description="Search query"),
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=100),
+    match: MatchMode = MatchMode.CONTAINS,
+    count_strategy: Optional[CountStrategy] = None,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Search users by username, first name, or last name"""
+    """Search users by username, first name, or last name.
+
+    ``match`` picks the lookup: ``contains`` (substring), ``prefix`` (starts
+    with, for typeahead) or ``similar`` (typo tolerant, closest first).
+    """
     query = db.query(User).filter(User.is_active == True)
+    columns = [User.username, User.first_name, User.last_name]
     
     # Apply search query
     if q:
-        query = query.filter(
-            or_(
-                User.username.ilike(f"%{q}%"),
-                User.first_name.ilike(f"%{q}%"),
-                User.last_name.ilike(f"%{q}%")
-            )
-        )
+        query = query.filter(or_(*[TextLookup.match(db, column, q, match) for column in columns]))
     
     # Get total count
-    total = query.count()
+    total, total_strategy = CountService.count(
+        db, query, CountService.resolve("search_users", count_strategy), "users",
+        {"q": q, "match": match.value}
+    )
     
-    # Paginate and order by username
-    users = query.order_by(User.username).offset((page - 1) * size).limit(size).all()
+    # Paginate and order by closeness for similar matches, otherwise by username
+    if q and match == MatchMode.SIMILAR:
+        query = query.order_by(desc(TextLookup.best_similarity(db, columns, q)), User.username)
+    else:
+        query = query.order_by(User.username)
+    users = query.offset((page - 1) * size).limit(size).all()
     
     # Format response
     user_responses = []
@@ -118,150 +203,143 @@ async def search_users(
     return {
         "users": user_responses,
         "total": total,
+        "count_strategy": total_strategy,
         "page": page,
         "size": size
     }
 
 
-@router.get("/trending", response_model=List[dict])
+@router.get("/trending", response_model=PostList)
 async def get_trending_items(
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=100),
+    pagination: str = Query("page", pattern="^(page|cursor)$"),
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_active_user),
+    image_preference: ImagePreference = Depends(get_image_preference),
     db: Session = Depends(get_db)
 ):
-    """Get trending posts based on likes and views"""
-    # Get trending posts (high engagement in last 7 days)
-    trending_posts = db.query(Post).filter(
-        and_(
-            Post.is_public == True,
-            Post.created_at >= func.date(func.now() - func.interval('7 days'))
-        )
+    """Get trending posts: recent public posts ranked by time-decayed engagement.
+
+    Reads the precomputed scores maintained by ``TrendingService``, highest
+    first. Supports ``pagination=cursor`` keyed on the score and post id.
+    """
+    # Only public posts are scored, so this walks the score index in order
+    query = db.query(Post, PostTrendingScore.score).join(
+        PostTrendingScore, PostTrendingScore.post_id == Post.id
     ).order_by(
-        desc(Post.like_count + Post.view_count)
-    ).offset((page - 1) * size).limit(size).all()
+        desc(PostTrendingScore.score), desc(PostTrendingScore.post_id)
+    )
     
-    # Format response
-    post_responses = []
-    for post in trending_posts:
-        post_dict = post.__dict__.copy()
-        post_dict['author'] = {
-            'id': post.author.id,
-            'username': post.author.username,
-            'profile_picture': post.author.profile_picture
-        }
-        
-        # Get tags
-        tags = [tag.tag.name for tag in post.tags]
-        post_dict['tags'] = tags
+    use_cursor = pagination == "cursor" or cursor is not None
+    next_cursor = None
+    if use_cursor:
+        if cursor:
+            last_score, last_id = decode_cursor(cursor, 2)
+            query = query.filter(keyset_condition(
+                [PostTrendingScore.score, PostTrendingScore.post_id],
+                [parse_cursor_number(last_score), parse_cursor_int(last_id)]
+            ))
         
-        post_responses.append(post_dict)
+        rows = query.limit(size + 1).all()
+    else:
+        rows = query.offset((page - 1) * size).limit(size + 1).all()
     
-    return {
-        "posts": post_responses,
-        "page": page,
-        "size": size
-    }
+    has_more = len(rows) > size
+    rows = rows[:size]
+    if use_cursor and has_more:
+        next_cursor = encode_cursor(rows[-1].score, rows[-1].Post.id)
+    
+    # Format response
+    post_responses = PostHydrator.hydrate(db, [row.Post for row in rows], current_user, image_preference)
+    
+    return PostList(
+        posts=[PostResponse(**post_dict) for post_dict in post_responses],
+        page=None if use_cursor else page,
+        size=size,
+        next_cursor=next_cursor,
+        has_more=has_more
+    )
 
 
-@router.get("/recommendations", response_model=List[dict])
+@router.get("/recommendations", response_model=PostList)
 async def get_recommendations(
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=100),
+    pagination: str = Query("page", pattern="^(page|cursor)$"),
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_active_user),
+    image_preference: ImagePreference = Depends(get_image_preference),
     db: Session = Depends(get_db)
 ):
-    """Get personalized recommendations based on user's likes and follows"""
-    # Get posts from users that the current user follows
-    following_posts = db.query(Post).join(
-        User, Post.author_id == User.id
-    ).join(
-        user_followers, User.id == user_followers.c.following_id
-    ).filter(
-        and_(
-            Post.is_public == True,
-            user_followers.c.follower_id == current_user.id
-        )
-    ).order_by(desc(Post.created_at)).limit(size // 2).all()
-    
-    # Get posts with similar tags to what the user has liked
-    liked_posts = db.query(Post).join(
-        Like, Post.id == Like.post_id
-    ).filter(Like.user_id == current_user.id).all()
-    
-    # Get tags from liked posts
-    liked_tags = set()
-    for post in liked_posts:
-        for tag in post.tags:
-            liked_tags.add(tag.tag.name)
-    
-    # Get posts with similar tags
-    similar_posts = []
-    if liked_tags:
-        similar_posts = db.query(Post).join(
-            PostTag, Post.id == PostTag.post_id
-        ).join(
-            Tag, PostTag.tag_id == Tag.id
-        ).filter(
-            and_(
-                Post.is_public == True,
-                Post.author_id != current_user.id,
-                Tag.name.in_(list(liked_tags))
-            )
-        ).order_by(desc(Post.created_at)).limit(size // 2).all()
+    """Get personalized recommendations based on user's likes and follows.
+
+    Posts are ranked by how well their tags match the tags of posts the user
+    liked, boosted for authors they follow; see ``RecommendationEngine``.
+    Supports ``pagination=cursor`` keyed on the score and post id.
+    """
+    use_cursor = pagination == "cursor" or cursor is not None
+    after = None
+    if cursor:
+        last_score, last_id = decode_cursor(cursor, 2)
+        after = (parse_cursor_number(last_score), parse_cursor_int(last_id))
     
-    # Combine and deduplicate
-    all_posts = list(set(following_posts + similar_posts))
-    all_posts.sort(key=lambda x: x.created_at, reverse=True)
+    ranked = RecommendationEngine.recommend(
+        db, current_user.id, size + 1,
+        offset=0 if use_cursor else (page - 1) * size,
+        after=after
+    )
+    has_more = len(ranked) > size
+    ranked = ranked[:size]
+    next_cursor = encode_cursor(*ranked[-1][::-1]) if use_cursor and has_more else None
     
-    # Paginate
-    start_idx = (page - 1) * size
-    end_idx = start_idx + size
-    paginated_posts = all_posts[start_idx:end_idx]
+    # Load the ranked posts, keeping the ranking and dropping any that went private
+    posts_by_id = {
+        post.id: post
+        for post in db.query(Post).filter(
+            Post.id.in_([post_id for post_id, _ in ranked]),
+            Post.is_public == True
+        )
+    }
+    posts = [posts_by_id[post_id] for post_id, _ in ranked if post_id in posts_by_id]
     
     # Format response
-    post_responses = []
-    for post in paginated_posts:
-        post_dict = post.__dict__.copy()
-        post_dict['author'] = {
-            'id': post.author.id,
-            'username': post.author.username,
-            'profile_picture': post.author.profile_picture
-        }
-        
-        # Get tags
-        tags = [tag.tag.name for tag in post.tags]
-        post_dict['tags'] = tags
-        
-        post_responses.append(post_dict)
+    post_responses = PostHydrator.hydrate(db, posts, current_user, image_preference)
     
-    return {
-        "posts": post_responses,
-        "page": page,
-        "size": size
-    }
+    return PostList(
+        posts=[PostResponse(**post_dict) for post_dict in post_responses],
+        page=None if use_cursor else page,
+        size=size,
+        next_cursor=next_cursor,
+        has_more=has_more
+    )
 
 
-@router.get("/tags", response_model=List[dict])
+@router.get("/tags", response_model=TagList)
 async def search_tags(
     q: str = Query(..., description="Search query"),
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=100),
+    match: MatchMode = MatchMode.CONTAINS,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Search tags"""
+    """Search tags; ``match`` works as in user search"""
     query = db.query(Tag)
     
     # Apply search query
     if q:
-        query = query.filter(Tag.name.ilike(f"%{q}%"))
+        query = query.filter(TextLookup.match(db, Tag.name, q, match))
     
     # Get total count
     total = query.count()
     
-    # Paginate and order by name
-    tags = query.order_by(Tag.name).offset((page - 1) * size).limit(size).all()
+    # Paginate and order by closeness for similar matches, otherwise by name
+    if q and match == MatchMode.SIMILAR:
+        query = query.order_by(desc(TextLookup.similarity(db, Tag.name, q)), Tag.name)
+    else:
+        query = query.order_by(Tag.name)
+    tags = query.offset((page - 1) * size).limit(size).all()
     
     # Format response
     tag_responses = []
@@ -274,4 +352,33 @@ async def search_tags(
         "total": total,
         "page": page,
         "size": size
-    } 
\ No newline at end of file
+    }
+
+
+@router.get("/autocomplete", response_model=AutocompleteResponse)
+async def autocomplete(
+    q: str = Query(..., min_length=1, description="Prefix typed so far"),
+    types: List[AutocompleteKind] = Query(list(AutocompleteKind)),
+    limit: int = Query(settings.AUTOCOMPLETE_TOP_K, ge=1, le=settings.AUTOCOMPLETE_TOP_K),
+    token_payload: dict = Depends(get_token_payload),
+    db: Session = Depends(get_db)
+):
+    """Typeahead suggestions for tags, brands and usernames starting with ``q``.
+
+    Served from the in-process prefix index, most popular first; the
+    database is only read if the index has not been built yet. To keep
+    keystrokes off the database the user is not loaded either: any valid,
+    unexpired access token is accepted, including one of a user deactivated
+    or deleted since it was issued (for at most
+    ``ACCESS_TOKEN_EXPIRE_MINUTES``). Suggestions are public data, the same
+    for every user.
+    """
+    AutocompleteService.ensure_built(db)
+    
+    return {
+        kind.value: [
+            {"value": value, "score": score}
+            for value, score in AutocompleteService.suggest(kind, q, limit)
+        ]
+        for kind in types
+    }
@@ -0,0 +1,199 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+from sqlalchemy.orm import Session
+from starlette.requests import ClientDisconnect
+import asyncio
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.object_storage import LocalStorage, get_storage
+from app.models.user import User
+from app.schemas.upload import (
+    UploadRequest, PresignedUpload, ResumableUploadCreate, ResumableUpload, CompletedUpload
+)
+from app.api.v1.endpoints.auth import get_current_active_user
+from app.services.resumable_uploads import ResumableUploads, UploadConflict
+from app.services.storage import BlobStore, blob_key
+from app.utils.file_upload import (
+    discard_staged, file_too_large, get_file_extension, invalid_image, stage_upload_stream
+)
+from app.utils.image_headers import InvalidImage, canonical_extension
+
+router = APIRouter()
+
+
+@router.post("/", response_model=PresignedUpload)
+async def presign_upload(
+    upload: UploadRequest,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Get a URL to upload an image straight to storage, bypassing the API.
+
+    The URL only accepts the announced size and SHA-256, which also names
+    the file, so identical content is never uploaded twice. Pass the returned
+    ``key`` to ``POST /posts`` in ``uploaded_images``.
+    """
+    extension = canonical_extension(get_file_extension(upload.filename))
+    if extension is None:
+        raise HTTPException(status_code=400, detail="Invalid file type. Only images are allowed.")
+    if upload.size > settings.MAX_FILE_SIZE:
+        raise file_too_large()
+    
+    storage = get_storage()
+    key = blob_key(upload.sha256, extension)
+    # Swept with its file unless a post takes a reference within UNREFERENCED_BLOB_HOURS
+    BlobStore.register(db, upload.sha256, extension, upload.size)
+    db.commit()
+    if await asyncio.to_thread(storage.size, key) is not None:
+        return PresignedUpload(key=key, exists=True)
+    
+    presigned = storage.presign_put(key, upload.sha256, upload.size, upload.content_type)
+    return PresignedUpload(key=key, exists=False, expires_in=settings.STORAGE_PRESIGN_EXPIRES, **presigned)
+
+
+@router.put("/direct/{token}")
+async def direct_upload(token: str, request: Request):
+    """Upload target of presigned URLs when files are stored on this server's disk"""
+    storage = get_storage()
+    claims = LocalStorage.verify_upload_token(token)
+    if not isinstance(storage, LocalStorage) or claims is None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid or expired upload URL"
+        )
+    
+    staged = await stage_upload_stream(request.stream())
+    try:
+        if staged.sha256 != claims["sha256"] or staged.size != claims["size"]:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Uploaded content does not match the announced size and SHA-256"
+            )
+        if staged.extension != get_file_extension(claims["key"]):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Uploaded content is not a {get_file_extension(claims['key'])} image"
+            )
+        await asyncio.to_thread(storage.put_file, claims["key"], staged.temp_path)
+    finally:
+        discard_staged([staged])
+    
+    return {"message": "Upload stored"}
+
+
+def resumable_upload_response(upload: dict) -> ResumableUpload:
+    return ResumableUpload(
+        id=upload["id"],
+        url=f"/api/v1/uploads/resumable/{upload['id']}",
+        offset=upload["offset"],
+        length=upload["length"]
+    )
+
+
+def get_resumable_upload(upload_id: str, current_user: User = Depends(get_current_active_user)) -> dict:
+    upload = ResumableUploads.get(upload_id, current_user.id)
+    if upload is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload not found"
+        )
+    return upload
+
+
+def offset_conflict(offset: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"Upload is at offset {offset}",
+        headers={"Upload-Offset": str(offset)}
+    )
+
+
+@router.post("/resumable", response_model=ResumableUpload, status_code=status.HTTP_201_CREATED)
+async def create_resumable_upload(
+    upload: ResumableUploadCreate,
+    response: Response,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Start a resumable upload (in the style of tus).
+
+    Send the file with ``PATCH {url}`` in as many pieces as needed, each
+    with ``Upload-Offset`` set to the bytes already received; after a
+    dropped connection ``HEAD {url}`` tells where to resume. Then
+    ``POST {url}/complete`` and pass the returned ``key`` to ``POST /posts``
+    in ``uploaded_images``. Unfinished uploads are removed after
+    ``RESUMABLE_UPLOAD_EXPIRE_HOURS``.
+    """
+    extension = canonical_extension(get_file_extension(upload.filename))
+    if extension is None:
+        raise HTTPException(status_code=400, detail="Invalid file type. Only images are allowed.")
+    if upload.size > settings.MAX_FILE_SIZE:
+        raise file_too_large()
+    
+    created = await asyncio.to_thread(ResumableUploads.create, current_user.id, extension, upload.size)
+    result = resumable_upload_response(created)
+    response.headers["Location"] = result.url
+    return result
+
+
+@router.head("/resumable/{upload_id}")
+async def get_resumable_upload_offset(upload: dict = Depends(get_resumable_upload)):
+    """How many bytes of the upload have been received"""
+    return Response(headers={
+        "Upload-Offset": str(upload["offset"]),
+        "Upload-Length": str(upload["length"]),
+        "Cache-Control": "no-store"
+    })
+
+
+@router.patch("/resumable/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def append_resumable_upload(
+    request: Request,
+    upload_offset: int = Header(..., ge=0),
+    content_type: str = Header(...),
+    upload: dict = Depends(get_resumable_upload)
+):
+    """Append the request body at ``Upload-Offset``"""
+    if content_type != "application/offset+octet-stream":
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Content-Type must be application/offset+octet-stream"
+        )
+    
+    try:
+        offset = await ResumableUploads.append(upload, upload_offset, request.stream())
+    except UploadConflict as e:
+        raise offset_conflict(e.offset)
+    except InvalidImage as e:
+        raise invalid_image(e)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except ClientDisconnect:
+        # The bytes that made it are on disk; the client resumes from HEAD
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    
+    return Response(status_code=status.HTTP_204_NO_CONTENT, headers={"Upload-Offset": str(offset)})
+
+
+@router.post("/resumable/{upload_id}/complete", response_model=CompletedUpload)
+async def complete_resumable_upload(
+    upload: dict = Depends(get_resumable_upload),
+    db: Session = Depends(get_db)
+):
+    """Store a fully received upload; returns the key to create a post with"""
+    try:
+        key = await asyncio.to_thread(ResumableUploads.finalize, db, upload)
+    except UploadConflict as e:
+        raise offset_conflict(e.offset)
+    except InvalidImage as e:
+        raise invalid_image(e)
+    return CompletedUpload(key=key)
+
+
+@router.delete("/resumable/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_resumable_upload(upload: dict = Depends(get_resumable_upload)):
+    """Abandon an upload and remove what was received"""
+    await asyncio.to_thread(ResumableUploads.discard, upload["id"])
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
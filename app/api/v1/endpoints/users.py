@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from sqlalchemy import and_
@@ -7,6 +7,9 @@ from app.core.database import get_db
 from app.models.user import User, user_followers
 from app.schemas.user import UserResponse, UserUpdate, UserProfile, UserList
 from app.api.v1.endpoints.auth import get_current_active_user
+from app.services.autocomplete import AutocompleteKind, AutocompleteService
+from app.services.counting import CountService, CountStrategy
+from app.services.timeline import HomeTimeline
 
 router = APIRouter()
 
@@ -29,6 +32,7 @@ async def update_current_user_profile(
     
     db.commit()
     db.refresh(current_user)
+    CountService.invalidate("users")
     return current_user
 
 
@@ -77,6 +81,7 @@ async def get_user_profile(
 @router.post("/{user_id}/follow")
 async def follow_user(
     user_id: int,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
@@ -116,6 +121,10 @@ async def follow_user(
         )
     )
     db.commit()
+    CountService.invalidate(f"followers:{user_id}")
+    CountService.invalidate(f"following:{current_user.id}")
+    AutocompleteService.adjust(AutocompleteKind.USERS, user_to_follow.username, 1)
+    background_tasks.add_task(HomeTimeline.run, HomeTimeline.follow, current_user.id, user_id)
     
     return {"message": "Successfully followed user"}
 
@@ -123,6 +132,7 @@ async def follow_user(
 @router.delete("/{user_id}/follow")
 async def unfollow_user(
     user_id: int,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
@@ -151,6 +161,12 @@ async def unfollow_user(
         )
     )
     db.commit()
+    CountService.invalidate(f"followers:{user_id}")
+    CountService.invalidate(f"following:{current_user.id}")
+    AutocompleteService.adjust(
+        AutocompleteKind.USERS, db.query(User.username).filter(User.id == user_id).scalar(), -1
+    )
+    background_tasks.add_task(HomeTimeline.run, HomeTimeline.unfollow, current_user.id, user_id)
     
     return {"message": "Successfully unfollowed user"}
 
@@ -160,6 +176,7 @@ async def get_user_followers(
     user_id: int,
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=100),
+    count_strategy: Optional[CountStrategy] = None,
     db: Session = Depends(get_db)
 ):
     """Get a user's followers"""
@@ -177,13 +194,17 @@ async def get_user_followers(
         user_followers.c.following_id == user_id
     ).offset((page - 1) * size).limit(size).all()
     
-    total = db.query(user_followers).filter(
-        user_followers.c.following_id == user_id
-    ).count()
+    total, total_strategy = CountService.count(
+        db,
+        db.query(user_followers).filter(user_followers.c.following_id == user_id),
+        CountService.resolve("followers", count_strategy),
+        f"followers:{user_id}"
+    )
     
     return UserList(
         users=followers,
         total=total,
+        count_strategy=total_strategy,
         page=page,
         size=size
     )
@@ -194,6 +215,7 @@ async def get_user_following(
     user_id: int,
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=100),
+    count_strategy: Optional[CountStrategy] = None,
     db: Session = Depends(get_db)
 ):
     """Get users that a user is following"""
@@ -211,13 +233,17 @@ async def get_user_following(
         user_followers.c.follower_id == user_id
     ).offset((page - 1) * size).limit(size).all()
     
-    total = db.query(user_followers).filter(
-        user_followers.c.follower_id == user_id
-    ).count()
+    total, total_strategy = CountService.count(
+        db,
+        db.query(user_followers).filter(user_followers.c.follower_id == user_id),
+        CountService.resolve("following", count_strategy),
+        f"following:{user_id}"
+    )
     
     return UserList(
         users=following,
         total=total,
+        count_strategy=total_strategy,
         page=page,
         size=size
     ) 
\ No newline at end of file
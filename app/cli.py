@@ -0,0 +1,202 @@
+"""Maintenance commands.
+
+Usage:
+    python -m app.cli reindex-search [--batch-size N]
+    python -m app.cli refresh-trending [--full] [--batch-size N]
+    python -m app.cli rollup-viewers [--batch-size N]
+    python -m app.cli compute-similar [--top-k K] [--chunk-size N] [--workers N]
+    python -m app.cli process-images [--retry-failed]
+    python -m app.cli index-colors [--batch-size N]
+    python -m app.cli scan-duplicates [--batch-size N]
+    python -m app.cli index-embeddings [--batch-size N]
+    python -m app.cli benchmark-visual-index [--posts N] [--queries N] [--k K] [--probes P ...]
+"""
+import argparse
+
+from app.core.database import SessionLocal
+from app.models import user, post, outfit, notification, storage, analytics  # register every mapper
+
+
+def reindex_search(args) -> None:
+    """Rebuild the post full-text search index"""
+    from app.services.search_index import PostSearchIndex
+
+    db = SessionLocal()
+    try:
+        count = PostSearchIndex.reindex(db, batch_size=args.batch_size)
+        print(f"Reindexed {count} posts")
+    finally:
+        db.close()
+
+
+def refresh_trending(args) -> None:
+    """Rescore trending posts"""
+    from app.services.trending import TrendingService
+
+    db = SessionLocal()
+    try:
+        count = TrendingService.refresh(db, full=args.full, batch_size=args.batch_size)
+        print(f"Rescored {count} posts")
+    finally:
+        db.close()
+
+
+def rollup_viewers(args) -> None:
+    """Roll up finished days of unique viewer sketches"""
+    from app.services.unique_viewers import UniqueViewers
+
+    db = SessionLocal()
+    try:
+        count = UniqueViewers.rollup(db, batch_size=args.batch_size)
+        print(f"Rolled up {count} daily sketches")
+    finally:
+        db.close()
+
+
+def compute_similar(args) -> None:
+    """Recompute the "also liked" neighbors of every post"""
+    from app.services.similar_posts import SimilarPostsJob
+
+    db = SessionLocal()
+    try:
+        count = SimilarPostsJob.run(db, top_k=args.top_k, chunk_size=args.chunk_size, workers=args.workers)
+        print(f"Wrote {count} neighbors")
+    finally:
+        db.close()
+
+
+def process_images(args) -> None:
+    """Render derivatives for posts whose images are still pending"""
+    from app.services.images import ImagePipeline
+
+    db = SessionLocal()
+    try:
+        count = ImagePipeline.process_pending(db, retry_failed=args.retry_failed)
+        print(f"Rendered {count} images")
+    finally:
+        db.close()
+        ImagePipeline.shutdown()
+
+
+def index_colors(args) -> None:
+    """Compute color histograms of post main images that have none yet"""
+    from app.services.colors import ColorIndex
+    from app.services.images import ImagePipeline
+
+    db = SessionLocal()
+    try:
+        count = ColorIndex.backfill(db, ImagePipeline.executor(), batch_size=args.batch_size)
+        print(f"Indexed colors of {count} posts")
+    finally:
+        db.close()
+        ImagePipeline.shutdown()
+
+
+def scan_duplicates(args) -> None:
+    """Hash post images that have no perceptual hash yet and link near-duplicate posts"""
+    from app.services.duplicates import DuplicateIndex
+    from app.services.images import ImagePipeline
+
+    db = SessionLocal()
+    try:
+        hashed, linked = DuplicateIndex.scan(db, ImagePipeline.executor(), batch_size=args.batch_size)
+        print(f"Hashed {hashed} images; {linked} posts are near-duplicates of an earlier post")
+    finally:
+        db.close()
+        ImagePipeline.shutdown()
+
+
+def index_embeddings(args) -> None:
+    """Compute visual embeddings of post main images that have none yet"""
+    from app.services.images import ImagePipeline
+    from app.services.visual_search import VisualIndex
+
+    db = SessionLocal()
+    try:
+        count = VisualIndex.backfill(db, ImagePipeline.executor(), batch_size=args.batch_size)
+        print(f"Embedded {count} posts")
+    finally:
+        db.close()
+        ImagePipeline.shutdown()
+
+
+def benchmark_visual_index(args) -> None:
+    """Measure recall and latency of the visual similarity index per probe count"""
+    import numpy as np
+
+    from app.models.post import PostEmbedding
+    from app.services.visual_search import DIMENSIONS, benchmark, synthetic_embeddings
+
+    vectors = None
+    if not args.synthetic:
+        db = SessionLocal()
+        try:
+            rows = db.query(PostEmbedding.vector).limit(args.posts).all()
+        finally:
+            db.close()
+        if rows:
+            vectors = np.frombuffer(b"".join(row.vector for row in rows), dtype=np.float32).reshape(-1, DIMENSIONS)
+            print(f"{len(vectors)} stored embeddings")
+    if vectors is None:
+        vectors = synthetic_embeddings(args.posts)
+        print(f"{len(vectors)} synthetic embeddings")
+
+    print(f"{'probes':>6} {'recall@' + str(args.k):>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for result in benchmark(vectors, queries=args.queries, k=args.k, probes=args.probes):
+        print(f"{result['probes']:>6} {result['recall']:>9.3f} {result['p50_ms']:>8.3f} {result['p99_ms']:>8.3f}")
+    print(f"Index built in {result['build_seconds']:.2f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Fashion Platform maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    reindex = commands.add_parser("reindex-search", help="Rebuild the post full-text search index")
+    reindex.add_argument("--batch-size", type=int, default=1000)
+    reindex.set_defaults(func=reindex_search)
+
+    trending = commands.add_parser("refresh-trending", help="Rescore trending posts")
+    trending.add_argument("--full", action="store_true", help="Rescore every post in the trending window, not just changed ones")
+    trending.add_argument("--batch-size", type=int, default=500)
+    trending.set_defaults(func=refresh_trending)
+
+    viewers = commands.add_parser("rollup-viewers", help="Roll up finished days of unique viewer sketches")
+    viewers.add_argument("--batch-size", type=int, default=500)
+    viewers.set_defaults(func=rollup_viewers)
+
+    similar = commands.add_parser("compute-similar", help="Recompute \"also liked\" post neighbors")
+    similar.add_argument("--top-k", type=int, default=None, help="Neighbors per post (default: SIMILAR_POSTS_TOP_K)")
+    similar.add_argument("--chunk-size", type=int, default=2000, help="Posts scored per task")
+    similar.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    similar.set_defaults(func=compute_similar)
+
+    images = commands.add_parser("process-images", help="Render derivatives of pending post images")
+    images.add_argument("--retry-failed", action="store_true", help="Also retry images that failed to render")
+    images.set_defaults(func=process_images)
+
+    colors = commands.add_parser("index-colors", help="Compute color histograms for search by color")
+    colors.add_argument("--batch-size", type=int, default=100)
+    colors.set_defaults(func=index_colors)
+
+    duplicates = commands.add_parser("scan-duplicates", help="Find and link posts with near-duplicate images")
+    duplicates.add_argument("--batch-size", type=int, default=100)
+    duplicates.set_defaults(func=scan_duplicates)
+
+    embeddings = commands.add_parser("index-embeddings", help="Compute visual embeddings for visually similar posts")
+    embeddings.add_argument("--batch-size", type=int, default=100)
+    embeddings.set_defaults(func=index_embeddings)
+
+    bench = commands.add_parser("benchmark-visual-index", help="Measure recall and latency of the visual similarity index")
+    bench.add_argument("--posts", type=int, default=100000, help="Embeddings to index (stored ones first)")
+    bench.add_argument("--queries", type=int, default=200)
+    bench.add_argument("--k", type=int, default=10, help="Neighbors per query")
+    bench.add_argument("--probes", type=int, nargs="+", default=[1, 4, 8, 16, 32], help="Probe counts to compare")
+    bench.add_argument("--synthetic", action="store_true", help="Use generated embeddings even if some are stored")
+    bench.set_defaults(func=benchmark_visual_index)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,7 @@ class Settings(BaseSettings):
     
     # Redis
     REDIS_URL: str = "redis://localhost:6379"
+    REDIS_ENABLED: bool = False  # Falls back to an in-process stand-in when off
     
     # Security - Use environment variable, fallback to safe placeholder
     SECRET_KEY: str = "CHANGE_THIS_IN_ENV_FILE_USE_RANDOM_STRING"
@@ -24,7 +25,38 @@ class Settings(BaseSettings):
     # File Upload
     UPLOAD_DIR: str = "uploads"
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # bytes copied per read when saving uploads
+    UPLOADS_IO_THREADS: int = 4  # threads reading files for /uploads, apart from the API's
+    RESUMABLE_UPLOAD_EXPIRE_HOURS: int = 24  # unfinished resumable uploads are removed after this
+    RESUMABLE_UPLOAD_CLEANUP_SECONDS: int = 3600  # expiry sweep interval; 0 disables it
+    
+    # Upload storage: "local" (UPLOAD_DIR, served at /uploads) or "s3" (any S3-compatible bucket)
+    STORAGE_BACKEND: str = "local"
+    STORAGE_PUBLIC_BASE_URL: str = ""  # e.g. https://cdn.example.com; default /uploads or the bucket URL
+    STORAGE_PRESIGN_EXPIRES: int = 900  # seconds a presigned upload URL stays valid
+    UNREFERENCED_BLOB_HOURS: int = 24  # uploads no post uses within this are deleted
+    BLOB_SWEEP_SECONDS: int = 3600  # interval of that sweep; 0 disables it
+    S3_ENDPOINT_URL: str = "https://s3.amazonaws.com"  # or a MinIO URL, e.g. http://localhost:9000
+    S3_BUCKET: str = "fashion-uploads"
+    S3_REGION: str = "us-east-1"
+    S3_ACCESS_KEY_ID: str = ""
+    S3_SECRET_ACCESS_KEY: str = ""
+    S3_MULTIPART_THRESHOLD: int = 8 * 1024 * 1024  # larger files are uploaded in parts
+    S3_MULTIPART_CHUNK_SIZE: int = 8 * 1024 * 1024  # S3 requires at least 5MB per part but the last
+    
+    # Image derivatives
+    IMAGE_DERIVATIVE_WIDTHS: list = [320, 640, 1080]  # never upscaled past the original
+    IMAGE_DISPLAY_WIDTH: int = 640  # variant width served when a request doesn't ask for one
+    IMAGE_JPEG_QUALITY: int = 82
+    IMAGE_WEBP_QUALITY: int = 80
+    IMAGE_WORKERS: int = 2  # rendering processes; 0 renders in the background task's thread
+    IMAGE_RESIZE_MAX_DIMENSION: int = 2048  # largest w/h accepted by /img
+    IMAGE_CACHE_DIR: str = "image_cache"  # /img variants; keep outside UPLOAD_DIR
+    IMAGE_CACHE_MAX_BYTES: int = 512 * 1024 * 1024  # least recently used variants are evicted past this
     ALLOWED_EXTENSIONS: set = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+    IMAGE_MAX_PIXELS: int = 50_000_000  # width x height; larger images are rejected from their header
+    IMAGE_SNIFF_BYTES: int = 16 * 1024  # leading bytes read to validate an upload before storing it
+    IMAGE_SNIFF_MAX_BYTES: int = 256 * 1024  # headers longer than this (e.g. huge EXIF) are rejected
     
     # Email (optional)
     SMTP_HOST: Optional[str] = None
@@ -36,6 +68,49 @@ class Settings(BaseSettings):
     DEFAULT_PAGE_SIZE: int = 20
     MAX_PAGE_SIZE: int = 100
     
+    # List totals: "exact", "cached" or "estimated"
+    COUNT_STRATEGY: str = "exact"
+    COUNT_STRATEGY_OVERRIDES: dict = {}  # e.g. {"posts": "cached"}
+    COUNT_CACHE_TTL: int = 60  # seconds
+    
+    # Autocomplete
+    AUTOCOMPLETE_TOP_K: int = 10  # suggestions kept per prefix
+    AUTOCOMPLETE_REFRESH_SECONDS: int = 300  # periodic rebuild; 0 disables it
+    
+    # Trending
+    TRENDING_HALF_LIFE_HOURS: float = 24  # engagement weight halves every this many hours
+    TRENDING_WINDOW_DAYS: int = 7  # older posts are not trending
+    TRENDING_REFRESH_SECONDS: int = 60  # rescoring interval; 0 disables it
+    
+    # Recommendations
+    RECOMMENDATIONS_REFRESH_SECONDS: int = 600  # matrix rebuild interval; 0 disables it
+    SIMILAR_POSTS_TOP_K: int = 20  # "also liked" neighbors stored per post
+    
+    # Search by color
+    COLOR_MATCH_RADIUS: float = 20.0  # Lab distance over which a color stops matching (falloff sigma)
+    COLOR_MATCH_MIN_SCORE: float = 0.15  # share of an image near the color for a post to match
+    COLOR_SEARCH_CANDIDATES: int = 5000  # best color matches checked against the other filters
+    COLOR_INDEX_REFRESH_SECONDS: int = 600  # histogram matrix reload interval; 0 disables it
+    
+    # Near-duplicate images
+    DUPLICATE_MAX_DISTANCE: int = 6  # differing bits (of 64) for two image hashes to count as the same photo
+    DUPLICATE_INDEX_REFRESH_SECONDS: int = 600  # hash table reload interval; 0 disables it
+    
+    # Visually similar posts
+    EMBEDDING_DIR: str = "embeddings"  # scratch files backing the in-process embedding matrix; local disk
+    VISUAL_INDEX_PROBES: int = 8  # IVF lists scanned per query; more finds more true neighbors, slower
+    VISUAL_SIMILAR_CANDIDATES: int = 200  # nearest neighbors fetched before filtering to visible posts
+    VISUAL_INDEX_REFRESH_SECONDS: int = 3600  # index rebuild (and retraining) interval; 0 disables it
+    
+    # View counts
+    VIEW_COUNT_FLUSH_SECONDS: int = 10  # buffered views are written to the database this often
+    UNIQUE_VIEWERS_ROLLUP_SECONDS: int = 3600  # finished days' viewer sketches are rolled up this often; 0 disables it
+    
+    # Home timeline
+    TIMELINE_MAX_LENGTH: int = 800  # post ids kept per materialized timeline
+    TIMELINE_FANOUT_MAX_FOLLOWERS: int = 10000  # authors at or above this are merged at read time
+    TIMELINE_CELEBRITY_REFRESH_SECONDS: int = 3600  # follower-count recheck; 0 disables it
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
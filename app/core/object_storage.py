@@ -0,0 +1,500 @@
+import base64
+import contextlib
+import hashlib
+import hmac
+import os
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl, quote, unquote
+from xml.etree import ElementTree
+
+import httpx
+from jose import JWTError, jwt
+
+from app.core.config import settings
+
+
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+S3_NAMESPACE = "{http://s3.amazonaws.com/doc/2006-03-01/}"
+
+
+class StorageError(Exception):
+    """A storage backend refused or failed an operation"""
+
+
+class StorageBackend:
+    """Where uploaded files live, addressed by key (``blobs/ab/cd/<sha256>.jpg``).
+
+    Files are written from local paths (uploads are always staged on local
+    disk first) and read back through ``local_copy``. Stored ``/uploads/<key>``
+    paths are turned into public URLs by ``url``.
+    """
+
+    def put_file(self, key: str, path: str, content_type: Optional[str] = None) -> None:
+        """Store the local file at ``path`` under ``key``; the local file is consumed"""
+        raise NotImplementedError
+
+    def size(self, key: str) -> Optional[int]:
+        """Size of the object, or ``None`` if there is none"""
+        raise NotImplementedError
+
+    def read(self, key: str, length: int) -> Optional[bytes]:
+        """The first ``length`` bytes of the object (all of it if shorter), or ``None`` if there is none"""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def rename(self, key: str, new_key: str) -> None:
+        raise NotImplementedError
+
+    def list(self, prefix: str) -> List[str]:
+        """Keys starting with ``prefix``"""
+        raise NotImplementedError
+
+    def local_copy(self, key: str) -> "contextlib.AbstractContextManager[str]":
+        """Context manager yielding a local path holding the object's content"""
+        raise NotImplementedError
+
+    def presign_put(self, key: str, sha256: str, size: int, content_type: Optional[str] = None) -> dict:
+        """``{"url", "method", "headers"}`` letting a client upload exactly this content to ``key`` itself"""
+        raise NotImplementedError
+
+    def default_base_url(self) -> str:
+        raise NotImplementedError
+
+    def url(self, key: str) -> str:
+        base = settings.STORAGE_PUBLIC_BASE_URL or self.default_base_url()
+        return f"{base.rstrip('/')}/{key}"
+
+
+class LocalStorage(StorageBackend):
+    """Files under ``UPLOAD_DIR``, served by this app at ``/uploads``.
+
+    Presigned uploads point at ``PUT /api/v1/uploads/direct/{token}`` on the
+    API itself, with the token carrying the signed key, size and hash.
+    """
+
+    def path(self, key: str) -> str:
+        return os.path.join(settings.UPLOAD_DIR, key)
+
+    def put_file(self, key: str, path: str, content_type: Optional[str] = None) -> None:
+        target = self.path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.move(path, target)  # a rename when staged under UPLOAD_DIR
+
+    def size(self, key: str) -> Optional[int]:
+        try:
+            return os.path.getsize(self.path(key))
+        except FileNotFoundError:
+            return None
+
+    def read(self, key: str, length: int) -> Optional[bytes]:
+        try:
+            with open(self.path(key), "rb") as file:
+                return file.read(length)
+        except FileNotFoundError:
+            return None
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def rename(self, key: str, new_key: str) -> None:
+        os.replace(self.path(key), self.path(new_key))
+
+    def list(self, prefix: str) -> List[str]:
+        directory, name_prefix = os.path.split(prefix)
+        try:
+            names = os.listdir(self.path(directory))
+        except FileNotFoundError:
+            return []
+        return sorted(f"{directory}/{name}" for name in names if name.startswith(name_prefix))
+
+    @contextlib.contextmanager
+    def local_copy(self, key: str) -> Iterator[str]:
+        yield self.path(key)
+
+    def presign_put(self, key: str, sha256: str, size: int, content_type: Optional[str] = None) -> dict:
+        expires = datetime.now(timezone.utc) + timedelta(seconds=settings.STORAGE_PRESIGN_EXPIRES)
+        token = jwt.encode(
+            {"type": "upload", "key": key, "sha256": sha256, "size": size, "exp": expires},
+            settings.SECRET_KEY, algorithm=settings.ALGORITHM
+        )
+        return {"url": f"/api/v1/uploads/direct/{token}", "method": "PUT", "headers": {}}
+
+    @staticmethod
+    def verify_upload_token(token: str) -> Optional[dict]:
+        """Claims of a token issued by ``presign_put``, or ``None`` if it is invalid or expired"""
+        try:
+            claims = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        except JWTError:
+            return None
+        return claims if claims.get("type") == "upload" else None
+
+    def default_base_url(self) -> str:
+        return "/uploads"
+
+
+def _hmac(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode(), hashlib.sha256).digest()
+
+
+def _uri_encode(value: str, safe: str = "-_.~") -> str:
+    return quote(value, safe=safe)
+
+
+def canonical_query(params: List[Tuple[str, str]]) -> str:
+    return "&".join(f"{_uri_encode(name)}={_uri_encode(value)}" for name, value in sorted(params))
+
+
+def signature_v4(
+    secret_key: str, region: str, method: str, path: str, params: List[Tuple[str, str]],
+    headers: Dict[str, str], payload_hash: str, amz_date: str
+) -> Tuple[str, str]:
+    """AWS Signature Version 4 for S3: ``(signed header names, signature)``"""
+    names = sorted(headers)
+    canonical_headers = "".join(f"{name}:{' '.join(str(headers[name]).split())}\n" for name in names)
+    signed_headers = ";".join(names)
+    canonical_request = "\n".join([
+        method, path, canonical_query(params), canonical_headers, signed_headers, payload_hash
+    ])
+    scope = f"{amz_date[:8]}/{region}/s3/aws4_request"
+    string_to_sign = "\n".join([
+        "AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical_request.encode()).hexdigest()
+    ])
+    key = ("AWS4" + secret_key).encode()
+    for part in (amz_date[:8], region, "s3", "aws4_request"):
+        key = _hmac(key, part)
+    return signed_headers, hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+
+def _amz_date() -> str:
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+class S3Storage(StorageBackend):
+    """An S3-compatible bucket (AWS S3, MinIO, R2, ...) over plain HTTP with SigV4.
+
+    Uses path-style URLs (``{endpoint}/{bucket}/{key}``), which every
+    S3-compatible server accepts. Files above ``S3_MULTIPART_THRESHOLD`` are
+    sent as a multipart upload, ``S3_MULTIPART_CHUNK_SIZE`` bytes per part
+    read straight from disk, so memory use stays flat however large the file.
+    Presigned uploads sign the content length and SHA-256 checksum, so the
+    bucket itself rejects anything but the announced bytes.
+    """
+
+    def __init__(
+        self, endpoint_url: str, bucket: str, access_key: str, secret_key: str,
+        region: str = "us-east-1", transport: Optional[httpx.BaseTransport] = None
+    ):
+        self.endpoint_url = endpoint_url.rstrip("/")
+        self.host = httpx.URL(self.endpoint_url).netloc.decode()
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.client = httpx.Client(transport=transport, timeout=60)
+
+    def _path(self, key: str = "") -> str:
+        return f"/{self.bucket}/{_uri_encode(key, safe='/-_.~')}" if key else f"/{self.bucket}"
+
+    def _request(
+        self, method: str, key: str = "", params: Optional[List[Tuple[str, str]]] = None,
+        content=b"", headers: Optional[Dict[str, str]] = None, expect=(200,)
+    ) -> httpx.Response:
+        params = params or []
+        path = self._path(key)
+        amz_date = _amz_date()
+        signed = {
+            "host": self.host,
+            "x-amz-date": amz_date,
+            "x-amz-content-sha256": UNSIGNED_PAYLOAD,
+            **{name.lower(): value for name, value in (headers or {}).items()},
+        }
+        signed_headers, signature = signature_v4(
+            self.secret_key, self.region, method, path, params, signed, UNSIGNED_PAYLOAD, amz_date
+        )
+        scope = f"{amz_date[:8]}/{self.region}/s3/aws4_request"
+        signed.pop("host")
+        signed["authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+            f"SignedHeaders={signed_headers}, Signature={signature}"
+        )
+        query = f"?{canonical_query(params)}" if params else ""
+        response = self.client.request(method, f"{self.endpoint_url}{path}{query}", content=content, headers=signed)
+        if response.status_code not in expect:
+            raise StorageError(f"{method} {key or self.bucket}: {response.status_code} {response.text[:200]}")
+        return response
+
+    def put_file(self, key: str, path: str, content_type: Optional[str] = None) -> None:
+        headers = {"content-type": content_type} if content_type else {}
+        size = os.path.getsize(path)
+        with open(path, "rb") as file:
+            if size <= settings.S3_MULTIPART_THRESHOLD:
+                self._request("PUT", key, content=file.read(), headers=headers)
+            else:
+                self._put_multipart(key, file, headers)
+        os.remove(path)
+
+    def _put_multipart(self, key: str, file, headers: Dict[str, str]) -> None:
+        response = self._request("POST", key, [("uploads", "")], headers=headers)
+        upload_id = ElementTree.fromstring(response.content).findtext(f"{S3_NAMESPACE}UploadId")
+        try:
+            etags = []
+            while True:
+                chunk = file.read(settings.S3_MULTIPART_CHUNK_SIZE)
+                if not chunk:
+                    break
+                part = self._request("PUT", key, [
+                    ("partNumber", str(len(etags) + 1)), ("uploadId", upload_id)
+                ], content=chunk)
+                etags.append(part.headers["etag"])
+            body = "".join(
+                f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+                for number, etag in enumerate(etags, start=1)
+            )
+            self._request("POST", key, [("uploadId", upload_id)], content=(
+                f"<CompleteMultipartUpload>{body}</CompleteMultipartUpload>"
+            ).encode())
+        except BaseException:
+            self._request("DELETE", key, [("uploadId", upload_id)], expect=(204, 404))
+            raise
+
+    def size(self, key: str) -> Optional[int]:
+        response = self._request("HEAD", key, expect=(200, 404))
+        return int(response.headers["content-length"]) if response.status_code == 200 else None
+
+    def read(self, key: str, length: int) -> Optional[bytes]:
+        response = self._request("GET", key, headers={"range": f"bytes=0-{length - 1}"}, expect=(200, 206, 404, 416))
+        if response.status_code == 404:
+            return None
+        # 416: the object is empty
+        return response.content[:length] if response.status_code != 416 else b""
+
+    def delete(self, key: str) -> None:
+        self._request("DELETE", key, expect=(204, 404))
+
+    def rename(self, key: str, new_key: str) -> None:
+        # No rename in S3: server-side copy, then delete
+        self._request("PUT", new_key, headers={"x-amz-copy-source": self._path(key)})
+        self.delete(key)
+
+    def list(self, prefix: str) -> List[str]:
+        keys: List[str] = []
+        token = None
+        while True:
+            params = [("list-type", "2"), ("prefix", prefix)]
+            if token:
+                params.append(("continuation-token", token))
+            root = ElementTree.fromstring(self._request("GET", params=params).content)
+            keys.extend(element.text for element in root.iter(f"{S3_NAMESPACE}Key"))
+            token = root.findtext(f"{S3_NAMESPACE}NextContinuationToken")
+            if root.findtext(f"{S3_NAMESPACE}IsTruncated") != "true" or not token:
+                return keys
+
+    @contextlib.contextmanager
+    def local_copy(self, key: str) -> Iterator[str]:
+        fd, path = tempfile.mkstemp(suffix=os.path.splitext(key)[1])
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(self._request("GET", key).content)
+            yield path
+        finally:
+            os.remove(path)
+
+    def presign_put(self, key: str, sha256: str, size: int, content_type: Optional[str] = None) -> dict:
+        amz_date = _amz_date()
+        checksum = base64.b64encode(bytes.fromhex(sha256)).decode()
+        headers = {"content-length": str(size), "host": self.host, "x-amz-checksum-sha256": checksum}
+        if content_type:
+            headers["content-type"] = content_type
+        params = [
+            ("X-Amz-Algorithm", "AWS4-HMAC-SHA256"),
+            ("X-Amz-Credential", f"{self.access_key}/{amz_date[:8]}/{self.region}/s3/aws4_request"),
+            ("X-Amz-Date", amz_date),
+            ("X-Amz-Expires", str(settings.STORAGE_PRESIGN_EXPIRES)),
+            ("X-Amz-SignedHeaders", ";".join(sorted(headers))),
+        ]
+        path = self._path(key)
+        _, signature = signature_v4(
+            self.secret_key, self.region, "PUT", path, params, headers, UNSIGNED_PAYLOAD, amz_date
+        )
+        params.append(("X-Amz-Signature", signature))
+        return {
+            "url": f"{self.endpoint_url}{path}?{canonical_query(params)}",
+            "method": "PUT",
+            # content-length and host are set by the HTTP client itself
+            "headers": {name: value for name, value in headers.items() if name not in ("content-length", "host")},
+        }
+
+    def default_base_url(self) -> str:
+        return f"{self.endpoint_url}/{self.bucket}"
+
+
+class S3StandIn:
+    """In-process stand-in for the subset of the S3 API that ``S3Storage`` uses.
+
+    An ``httpx`` handler (``httpx.MockTransport(S3StandIn(...))``) holding
+    objects in memory, the way MinIO would on disk. It checks SigV4 header
+    and presigned-URL signatures, expiry and SHA-256 checksums like S3 does,
+    so tests exercise the real client code. State lives in this process only.
+    """
+
+    def __init__(self, access_key: str, secret_key: str, region: str = "us-east-1"):
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.buckets: Dict[str, Dict[str, Tuple[bytes, str]]] = {}
+        self._uploads: Dict[str, Dict[int, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def create_bucket(self, bucket: str) -> None:
+        self.buckets.setdefault(bucket, {})
+
+    @staticmethod
+    def _error(status: int, code: str) -> httpx.Response:
+        return httpx.Response(status, content=f"<Error><Code>{code}</Code></Error>".encode())
+
+    @staticmethod
+    def _xml(element: str, inner: str = "") -> httpx.Response:
+        return httpx.Response(200, content=(
+            f'<{element} xmlns="http://s3.amazonaws.com/doc/2006-03-01/">{inner}</{element}>'
+        ).encode())
+
+    def _authenticate(self, request: httpx.Request, path: str, params: List[Tuple[str, str]]) -> Optional[str]:
+        """Error code if the request is not signed with our credentials, else ``None``"""
+        query = dict(params)
+        if "X-Amz-Signature" in query:
+            amz_date = query["X-Amz-Date"]
+            expires = datetime.strptime(amz_date, "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
+            if datetime.now(timezone.utc) > expires + timedelta(seconds=int(query["X-Amz-Expires"])):
+                return "AccessDenied"
+            credential, names, given = query["X-Amz-Credential"], query["X-Amz-SignedHeaders"], query["X-Amz-Signature"]
+            params = [(name, value) for name, value in params if name != "X-Amz-Signature"]
+            payload_hash = UNSIGNED_PAYLOAD
+        else:
+            match = re.match(
+                r"AWS4-HMAC-SHA256 Credential=([^,]+), SignedHeaders=([^,]+), Signature=(\w+)",
+                request.headers.get("authorization", "")
+            )
+            if not match:
+                return "AccessDenied"
+            credential, names, given = match.groups()
+            amz_date = request.headers["x-amz-date"]
+            payload_hash = request.headers["x-amz-content-sha256"]
+        if not credential.startswith(f"{self.access_key}/"):
+            return "InvalidAccessKeyId"
+        headers = {name: request.headers.get(name, "") for name in names.split(";")}
+        _, expected = signature_v4(
+            self.secret_key, self.region, request.method, path, params, headers, payload_hash, amz_date
+        )
+        if not hmac.compare_digest(expected, given):
+            return "SignatureDoesNotMatch"
+        return None
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        raw_path, _, raw_query = request.url.raw_path.decode().partition("?")
+        params = parse_qsl(raw_query, keep_blank_values=True)
+        error = self._authenticate(request, raw_path, params)
+        if error:
+            return self._error(403, error)
+
+        bucket_name, _, key = unquote(raw_path).lstrip("/").partition("/")
+        bucket = self.buckets.get(bucket_name)
+        if bucket is None:
+            return self._error(404, "NoSuchBucket")
+        query = dict(params)
+        body = request.read()
+
+        checksum = request.headers.get("x-amz-checksum-sha256")
+        if checksum and base64.b64encode(hashlib.sha256(body).digest()).decode() != checksum:
+            return self._error(400, "BadDigest")
+        content_hash = request.headers.get("x-amz-content-sha256", UNSIGNED_PAYLOAD)
+        if content_hash != UNSIGNED_PAYLOAD and hashlib.sha256(body).hexdigest() != content_hash:
+            return self._error(400, "XAmzContentSHA256Mismatch")
+
+        with self._lock:
+            if not key:
+                return self._list(bucket, query) if request.method == "GET" else self._error(405, "MethodNotAllowed")
+            if request.method == "POST" and "uploads" in query:
+                upload_id = uuid.uuid4().hex
+                self._uploads[upload_id] = {}
+                return self._xml("InitiateMultipartUploadResult", f"<UploadId>{upload_id}</UploadId>")
+            if "uploadId" in query:
+                return self._multipart(request, bucket, key, query, body)
+            if request.method == "PUT":
+                source = request.headers.get("x-amz-copy-source")
+                if source:
+                    source_bucket, _, source_key = unquote(source).lstrip("/").partition("/")
+                    if source_key not in self.buckets.get(source_bucket, {}):
+                        return self._error(404, "NoSuchKey")
+                    bucket[key] = self.buckets[source_bucket][source_key]
+                    return self._xml("CopyObjectResult")
+                bucket[key] = (body, request.headers.get("content-type", "binary/octet-stream"))
+                return httpx.Response(200, headers={"etag": f'"{hashlib.md5(body).hexdigest()}"'})
+            if key not in bucket:
+                return httpx.Response(204) if request.method == "DELETE" else self._error(404, "NoSuchKey")
+            content, content_type = bucket[key]
+            if request.method == "DELETE":
+                del bucket[key]
+                return httpx.Response(204)
+            headers = {"content-type": content_type, "content-length": str(len(content))}
+            match = re.match(r"^bytes=(\d+)-(\d*)$", request.headers.get("range", ""))
+            if request.method == "GET" and match:
+                start = int(match.group(1))
+                end = min(int(match.group(2) or len(content) - 1), len(content) - 1)
+                if start > end:
+                    return self._error(416, "InvalidRange")
+                headers.update({
+                    "content-length": str(end - start + 1),
+                    "content-range": f"bytes {start}-{end}/{len(content)}",
+                })
+                return httpx.Response(206, headers=headers, content=content[start:end + 1])
+            return httpx.Response(200, headers=headers, content=b"" if request.method == "HEAD" else content)
+
+    def _multipart(self, request: httpx.Request, bucket: dict, key: str, query: dict, body: bytes) -> httpx.Response:
+        parts = self._uploads.get(query["uploadId"])
+        if parts is None:
+            return self._error(404, "NoSuchUpload")
+        if request.method == "PUT":
+            parts[int(query["partNumber"])] = body
+            return httpx.Response(200, headers={"etag": f'"{hashlib.md5(body).hexdigest()}"'})
+        del self._uploads[query["uploadId"]]
+        if request.method == "DELETE":
+            return httpx.Response(204)
+        numbers = [int(element.text) for element in ElementTree.fromstring(body).iter("PartNumber")]
+        bucket[key] = (b"".join(parts[number] for number in numbers), "binary/octet-stream")
+        return self._xml("CompleteMultipartUploadResult")
+
+    def _list(self, bucket: dict, query: dict) -> httpx.Response:
+        keys = sorted(key for key in bucket if key.startswith(query.get("prefix", "")))
+        contents = "".join(f"<Contents><Key>{key}</Key></Contents>" for key in keys)
+        return self._xml("ListBucketResult", f"<IsTruncated>false</IsTruncated>{contents}")
+
+
+_backend: Optional[StorageBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_storage() -> StorageBackend:
+    """Return the configured storage backend"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if settings.STORAGE_BACKEND == "s3":
+                    _backend = S3Storage(
+                        settings.S3_ENDPOINT_URL, settings.S3_BUCKET,
+                        settings.S3_ACCESS_KEY_ID, settings.S3_SECRET_ACCESS_KEY, settings.S3_REGION
+                    )
+                else:
+                    _backend = LocalStorage()
+    return _backend
@@ -0,0 +1,279 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+from app.core.config import settings
+from app.utils.hyperloglog import HyperLogLog
+
+
+class InMemoryRedis:
+    """In-process stand-in for the subset of the redis-py API we use.
+
+    Used when ``REDIS_ENABLED`` is off (tests, single-worker local dev). State
+    lives in this process only, so it is not shared between workers.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[Any, Optional[float]]] = {}
+        self._lock = threading.RLock()
+
+    def _get_live(self, key: str) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._get_live(key)
+            return None if value is None else str(value).encode()
+
+    def set(self, key: str, value: Any, ex: Optional[int] = None, nx: bool = False) -> Optional[bool]:
+        with self._lock:
+            if nx and self._get_live(key) is not None:
+                return None
+            expires_at = time.monotonic() + ex if ex else None
+            self._data[key] = (value, expires_at)
+            return True
+
+    def expire(self, key: str, seconds: int) -> bool:
+        with self._lock:
+            value = self._get_live(key)
+            if value is None:
+                return False
+            self._data[key] = (value, time.monotonic() + seconds)
+            return True
+
+    def exists(self, *keys: str) -> int:
+        with self._lock:
+            return sum(1 for key in keys if self._get_live(key) is not None)
+
+    def rename(self, src: str, dst: str) -> bool:
+        with self._lock:
+            if self._get_live(src) is None:
+                raise KeyError("no such key")  # redis-py raises ResponseError
+            self._data[dst] = self._data.pop(src)
+            return True
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        with self._lock:
+            value = int(self._get_live(key) or 0) + amount
+            entry = self._data.get(key)
+            self._data[key] = (value, entry[1] if entry else None)
+            return value
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            removed = 0
+            for key in keys:
+                if self._data.pop(key, None) is not None:
+                    removed += 1
+            return removed
+
+    def _hash(self, key: str, create: bool = False) -> Dict[str, Any]:
+        hash_ = self._get_live(key)
+        if hash_ is None:
+            hash_ = {}
+            if create:
+                self._data[key] = (hash_, None)
+        return hash_
+
+    def hincrby(self, key: str, field: Any, amount: int = 1) -> int:
+        with self._lock:
+            hash_ = self._hash(key, create=True)
+            value = int(hash_.get(str(field), 0)) + amount
+            hash_[str(field)] = value
+            return value
+
+    def hgetall(self, key: str) -> Dict[bytes, bytes]:
+        with self._lock:
+            return {field.encode(): str(value).encode() for field, value in self._hash(key).items()}
+
+    def hlen(self, key: str) -> int:
+        with self._lock:
+            return len(self._hash(key))
+
+    def pfadd(self, key: str, *elements: Any) -> int:
+        with self._lock:
+            sketch = self._get_live(key)
+            created = sketch is None
+            if created:
+                sketch = HyperLogLog()
+                self._data[key] = (sketch, None)
+            return int(sketch.add(*elements) or created)
+
+    def pfcount(self, *keys: str) -> int:
+        with self._lock:
+            sketches = [sketch for sketch in map(self._get_live, keys) if sketch is not None]
+        return sketches[0].merge(*sketches[1:]).count() if sketches else 0
+
+    def pfmerge(self, dest: str, *sources: str) -> bool:
+        with self._lock:
+            sketches = [sketch for sketch in map(self._get_live, (dest, *sources)) if sketch is not None]
+            merged = sketches[0].merge(*sketches[1:]) if sketches else HyperLogLog()
+            entry = self._data.get(dest)
+            self._data[dest] = (merged, entry[1] if entry else None)
+            return True
+
+    def sadd(self, key: str, *members: Any) -> int:
+        with self._lock:
+            members_set = self._get_live(key)
+            if members_set is None:
+                members_set = set()
+                self._data[key] = (members_set, None)
+            before = len(members_set)
+            members_set.update(str(member) for member in members)
+            return len(members_set) - before
+
+    def spop(self, key: str, count: Optional[int] = None) -> Union[Optional[bytes], List[bytes]]:
+        with self._lock:
+            members_set = self._get_live(key) or set()
+            popped = [members_set.pop() for _ in range(min(count or 1, len(members_set)))]
+            if not members_set:
+                self._data.pop(key, None)
+            if count is None:
+                return popped[0].encode() if popped else None
+            return [member.encode() for member in popped]
+
+    def scard(self, key: str) -> int:
+        with self._lock:
+            return len(self._get_live(key) or ())
+
+    def srem(self, key: str, *members: Any) -> int:
+        with self._lock:
+            members_set = self._get_live(key) or set()
+            removed = 0
+            for member in members:
+                if str(member) in members_set:
+                    members_set.discard(str(member))
+                    removed += 1
+            return removed
+
+    def smembers(self, key: str) -> Set[bytes]:
+        with self._lock:
+            return {member.encode() for member in self._get_live(key) or ()}
+
+    def _zset(self, key: str, create: bool = False) -> Dict[str, float]:
+        zset = self._get_live(key)
+        if zset is None:
+            zset = {}
+            if create:
+                self._data[key] = (zset, None)
+        return zset
+
+    def zadd(self, key: str, mapping: Dict[Any, float]) -> int:
+        with self._lock:
+            zset = self._zset(key, create=True)
+            added = sum(1 for member in mapping if str(member) not in zset)
+            zset.update({str(member): float(score) for member, score in mapping.items()})
+            return added
+
+    def zrem(self, key: str, *members: Any) -> int:
+        with self._lock:
+            zset = self._zset(key)
+            return sum(1 for member in members if zset.pop(str(member), None) is not None)
+
+    def zscore(self, key: str, member: Any) -> Optional[float]:
+        with self._lock:
+            return self._zset(key).get(str(member))
+
+    def zcard(self, key: str) -> int:
+        with self._lock:
+            return len(self._zset(key))
+
+    def zrevrangebyscore(
+        self, key: str, max: Any, min: Any, start: Optional[int] = None, num: Optional[int] = None
+    ) -> List[bytes]:
+        with self._lock:
+            in_range = [
+                (score, member) for member, score in self._zset(key).items()
+                if _score_at_most(score, max) and _score_at_least(score, min)
+            ]
+        in_range.sort(reverse=True)
+        members = [member.encode() for _, member in in_range]
+        if start is not None:
+            members = members[start:] if num is None or num < 0 else members[start:start + num]
+        return members
+
+    def zremrangebyrank(self, key: str, start: int, stop: int) -> int:
+        with self._lock:
+            zset = self._zset(key)
+            ranked = sorted(zset, key=lambda member: (zset[member], member))
+            stop = len(ranked) + stop if stop < 0 else stop
+            doomed = ranked[start:stop + 1] if stop >= start else []
+            for member in doomed:
+                del zset[member]
+            return len(doomed)
+
+    def pipeline(self, transaction: bool = True) -> "InMemoryPipeline":
+        return InMemoryPipeline(self)
+
+    def flushall(self) -> bool:
+        with self._lock:
+            self._data.clear()
+            return True
+
+
+def _parse_bound(bound: Any) -> Tuple[float, bool]:
+    """Parse a Redis score bound like ``5``, ``"(5"`` or ``"+inf"`` into (value, exclusive)"""
+    if isinstance(bound, str) and bound.startswith("("):
+        return float(bound[1:]), True
+    return float(bound), False
+
+
+def _score_at_most(score: float, bound: Any) -> bool:
+    value, exclusive = _parse_bound(bound)
+    return score < value if exclusive else score <= value
+
+
+def _score_at_least(score: float, bound: Any) -> bool:
+    value, exclusive = _parse_bound(bound)
+    return score > value if exclusive else score >= value
+
+
+class InMemoryPipeline:
+    """Queues commands and runs them on ``execute()``, like a redis-py pipeline"""
+
+    def __init__(self, client: InMemoryRedis):
+        self._client = client
+        self._commands: List[Tuple[str, tuple, dict]] = []
+
+    def __getattr__(self, name: str):
+        def queue(*args, **kwargs):
+            self._commands.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self) -> List[Any]:
+        with self._client._lock:
+            results = [getattr(self._client, name)(*args, **kwargs) for name, args, kwargs in self._commands]
+        self._commands = []
+        return results
+
+    def __enter__(self) -> "InMemoryPipeline":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._commands = []
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_redis():
+    """Return the shared Redis client, or the in-process stand-in"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if settings.REDIS_ENABLED:
+                    import redis
+                    _client = redis.Redis.from_url(settings.REDIS_URL)
+                else:
+                    _client = InMemoryRedis()
+    return _client
@@ -1,11 +1,30 @@
 from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from sqlalchemy.orm import Session
+from typing import Callable
+import asyncio
+import logging
 import os
 
 from app.core.config import settings
 from app.api.v1.api import api_router
-from app.core.database import engine, Base
+from app.api.v1.endpoints import images
+from app.core.database import engine, Base, SessionLocal
+from app.models import user, post, outfit, notification, storage, analytics  # register every mapper
+from app.services.autocomplete import AutocompleteService
+from app.services.colors import ColorIndex
+from app.services.duplicates import DuplicateIndex
+from app.services.images import ImagePipeline
+from app.services.recommendations import RecommendationEngine
+from app.services.resumable_uploads import RESUMABLE_FOLDER, ResumableUploads
+from app.services.storage import BlobStore
+from app.services.timeline import HomeTimeline
+from app.services.trending import TrendingService
+from app.services.unique_viewers import UniqueViewers
+from app.services.view_counts import ViewCounter
+from app.services.visual_search import VisualIndex
+from app.utils.static_files import UploadFiles
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
@@ -30,13 +49,80 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount static files for uploaded images
-app.mount("/uploads", StaticFiles(directory=settings.UPLOAD_DIR), name="uploads")
+# Uploaded images are served from here only when they are stored on this server's disk;
+# with object storage clients fetch them from STORAGE_PUBLIC_BASE_URL instead
+if settings.STORAGE_BACKEND == "local":
+    # Mount static files for uploaded images
+    app.mount(
+        "/uploads",
+        UploadFiles(settings.UPLOAD_DIR, io_threads=settings.UPLOADS_IO_THREADS, private=[RESUMABLE_FOLDER]),
+        name="uploads"
+    )
+    
+    # Resized variants of uploaded images, e.g. /img/posts/abc.jpg?w=300
+    app.include_router(images.router, prefix="/img", tags=["images"])
 
 # Include API router
 app.include_router(api_router, prefix="/api/v1")
 
 
+def run_with_session(job: Callable[[Session], object]) -> None:
+    db = SessionLocal()
+    try:
+        job(db)
+    finally:
+        db.close()
+
+
+async def run_periodically(job: Callable[[Session], object], seconds: int) -> None:
+    """Run ``job`` every ``seconds`` off the event loop; a failure is logged and retried next cycle"""
+    while True:
+        await asyncio.sleep(seconds)
+        try:
+            await asyncio.to_thread(run_with_session, job)
+        except Exception:
+            logging.getLogger(__name__).exception("Background job %s failed", job.__qualname__)
+
+
+# (job, interval in seconds, run once at startup). Every worker runs its own
+# copy: the in-memory indexes are per process and the trending queue drains
+# atomically, so concurrent workers simply share the work.
+BACKGROUND_JOBS = [
+    (AutocompleteService.build, settings.AUTOCOMPLETE_REFRESH_SECONDS, True),
+    (RecommendationEngine.build, settings.RECOMMENDATIONS_REFRESH_SECONDS, True),
+    (ColorIndex.build, settings.COLOR_INDEX_REFRESH_SECONDS, True),
+    (DuplicateIndex.build, settings.DUPLICATE_INDEX_REFRESH_SECONDS, True),
+    (VisualIndex.build, settings.VISUAL_INDEX_REFRESH_SECONDS, True),
+    (ViewCounter.flush, settings.VIEW_COUNT_FLUSH_SECONDS, False),
+    (UniqueViewers.rollup, settings.UNIQUE_VIEWERS_ROLLUP_SECONDS, False),
+    (TrendingService.refresh, settings.TRENDING_REFRESH_SECONDS, False),
+    (HomeTimeline.refresh_celebrities, settings.TIMELINE_CELEBRITY_REFRESH_SECONDS, True),
+    (ResumableUploads.expire, settings.RESUMABLE_UPLOAD_CLEANUP_SECONDS, False),
+    (BlobStore.sweep, settings.BLOB_SWEEP_SECONDS, False),
+]
+
+
+@app.on_event("startup")
+async def start_background_jobs():
+    app.state.background_tasks = []
+    for job, seconds, warm in BACKGROUND_JOBS:
+        if warm:
+            await asyncio.to_thread(run_with_session, job)
+        if seconds > 0:
+            app.state.background_tasks.append(asyncio.create_task(run_periodically(job, seconds)))
+
+
+@app.on_event("shutdown")
+async def stop_image_workers():
+    await asyncio.to_thread(ImagePipeline.shutdown)
+
+
+@app.on_event("shutdown")
+async def flush_view_counts():
+    # Without Redis the buffered views live in this process; with it this just keeps the lag short
+    await asyncio.to_thread(run_with_session, ViewCounter.flush)
+
+
 @app.get("/")
 async def root():
     return {
@@ -46,6 +132,23 @@ async def root():
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Operational gauges in the Prometheus text format"""
+    views = ViewCounter.stats()
+    lines = [
+        "# HELP view_counts_pending Ids with views buffered but not yet written to the database",
+        "# TYPE view_counts_pending gauge",
+    ] + [f'view_counts_pending{{table="{table}"}} {count}' for table, count in views["pending"].items()]
+    if views["flush_lag_seconds"] is not None:
+        lines += [
+            "# HELP view_counts_flush_lag_seconds Seconds since buffered views were last written to the database",
+            "# TYPE view_counts_flush_lag_seconds gauge",
+            f'view_counts_flush_lag_seconds {views["flush_lag_seconds"]:.3f}',
+        ]
+    return "\n".join(lines) + "\n"
+
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "timestamp": "2024-01-01T00:00:00Z"}
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Date, Integer, String
+from app.core.database import Base
+
+
+class DailyUniqueViewers(Base):
+    """Distinct viewers of a post or outfit on one day, rolled up from HyperLogLog sketches (see app.services.unique_viewers).
+
+    Estimates, within about 1%. Rows are not removed with their post or
+    outfit; join to filter.
+    """
+    __tablename__ = "daily_unique_viewers"
+
+    kind = Column(String(16), primary_key=True)  # "posts" or "outfits"
+    object_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)  # UTC
+    viewers = Column(Integer, nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -49,6 +49,9 @@ class OutfitItem(Base):
 
 class OutfitLike(Base):
     __tablename__ = "outfit_likes"
+    __table_args__ = (
+        Index("ix_outfit_likes_user_id_outfit_id", "user_id", "outfit_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
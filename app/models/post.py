@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Float, ForeignKey, Enum
+from sqlalchemy import Column, Integer, SmallInteger, String, DateTime, Boolean, Text, Float, BigInteger, ForeignKey, Enum, Index, DDL, JSON, LargeBinary, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -25,6 +25,13 @@ class ClothingCategory(enum.Enum):
 
 class Post(Base):
     __tablename__ = "posts"
+    __table_args__ = (
+        # Public feed: WHERE is_public ORDER BY created_at DESC, id DESC
+        Index("ix_posts_is_public_created_at", "is_public", "created_at", "id"),
+        Index("ix_posts_author_id", "author_id"),
+        # ON DELETE SET NULL when the original is deleted
+        Index("ix_posts_duplicate_of", "duplicate_of"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
@@ -39,7 +46,9 @@ class Post(Base):
     
     # Images
     main_image = Column(String, nullable=False)  # Main image URL
-    additional_images = Column(Text, nullable=True)  # JSON array of additional image URLs
+    # Every image, main first, with its rendered derivatives (see app.services.images):
+    # [{"original", "status", "width", "height", "variants": [{"url", "width", "height", "format"}]}]
+    images = Column(JSON, nullable=True)
     
     # Metadata
     is_public = Column(Boolean, default=True)
@@ -47,6 +56,8 @@ class Post(Base):
     view_count = Column(Integer, default=0)
     like_count = Column(Integer, default=0)
     comment_count = Column(Integer, default=0)
+    # Earliest post with a near-identical main image (see app.services.duplicates)
+    duplicate_of = Column(Integer, ForeignKey("posts.id", ondelete="SET NULL"), nullable=True)
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -65,8 +76,104 @@ class Post(Base):
     tags = relationship("PostTag", back_populates="post", cascade="all, delete-orphan")
 
 
+# Full-text search storage is kept out of the mapped columns and maintained by
+# app.services.search_index: a weighted tsvector column with a GIN index on
+# Postgres, and an FTS5 table keyed by post id on SQLite.
+event.listen(Post.__table__, "after_create", DDL(
+    "ALTER TABLE posts ADD COLUMN search_vector tsvector"
+).execute_if(dialect="postgresql"))
+event.listen(Post.__table__, "after_create", DDL(
+    "CREATE INDEX ix_posts_search_vector ON posts USING GIN (search_vector)"
+).execute_if(dialect="postgresql"))
+event.listen(Post.__table__, "after_create", DDL(
+    "CREATE VIRTUAL TABLE posts_fts USING fts5("
+    "title, description, brand, store_name, tokenize = 'porter unicode61')"
+).execute_if(dialect="sqlite"))
+event.listen(Post.__table__, "before_drop", DDL(
+    "DROP TABLE IF EXISTS posts_fts"
+).execute_if(dialect="sqlite"))
+
+
+# Brand lookups (see app.services.text_lookup)
+Index(
+    "ix_posts_brand_trgm", Post.brand,
+    postgresql_using="gin",
+    postgresql_ops={"brand": "gin_trgm_ops"}
+).ddl_if(dialect="postgresql")
+Index(
+    "ix_posts_brand_lower", func.lower(Post.brand).label("brand_lower"),
+    postgresql_ops={"brand_lower": "text_pattern_ops"}
+)
+
+
+class PostTrendingScore(Base):
+    """Decayed engagement score per recent public post, maintained by app.services.trending"""
+    __tablename__ = "post_trending_scores"
+    __table_args__ = (
+        # Trending list: ORDER BY score DESC, post_id DESC
+        Index("ix_post_trending_scores_score_post_id", "score", "post_id"),
+        Index("ix_post_trending_scores_created_at", "created_at"),
+    )
+
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
+    score = Column(Float, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)  # copied from the post for pruning
+    refreshed_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class PostNeighbor(Base):
+    """Precomputed "also liked" neighbors, written by app.services.similar_posts"""
+    __tablename__ = "post_neighbors"
+    __table_args__ = (
+        Index("ix_post_neighbors_neighbor_id", "neighbor_id"),  # ON DELETE CASCADE when a post is deleted
+    )
+
+    # The primary key is the lookup: WHERE post_id = ? ORDER BY rank
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
+    rank = Column(SmallInteger, primary_key=True, autoincrement=False)
+    neighbor_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=False)
+    score = Column(Float(precision=24), nullable=False)
+
+
+
+class PostColor(Base):
+    """Color histogram of a post's main image, written by the image pipeline (see app.services.colors)"""
+    __tablename__ = "post_colors"
+
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
+    image = Column(String, nullable=False)  # the main image it was computed from
+    histogram = Column(LargeBinary, nullable=False)  # float32 share of the image per color bin
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class PostEmbedding(Base):
+    """Visual embedding of a post's main image, written by the image pipeline (see app.services.visual_search)"""
+    __tablename__ = "post_embeddings"
+
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
+    image = Column(String, nullable=False)  # the main image it was computed from
+    vector = Column(LargeBinary, nullable=False)  # unit-length float32 feature vector
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class PostImageHash(Base):
+    """Perceptual hash of each image of a post, for near-duplicate lookups (see app.services.duplicates)"""
+    __tablename__ = "post_image_hashes"
+    __table_args__ = (
+        # Hashes of an image already stored for another post (images_changed)
+        Index("ix_post_image_hashes_image", "image"),
+    )
+
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
+    image = Column(String, primary_key=True)
+    phash = Column(BigInteger, nullable=False)  # 64-bit difference hash, stored signed
+
+
 class Comment(Base):
     __tablename__ = "comments"
+    __table_args__ = (
+        Index("ix_comments_post_id_created_at", "post_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     content = Column(Text, nullable=False)
@@ -84,6 +191,10 @@ class Comment(Base):
 
 class Like(Base):
     __tablename__ = "likes"
+    __table_args__ = (
+        Index("ix_likes_user_id_post_id", "user_id", "post_id", unique=True),
+        Index("ix_likes_post_id", "post_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -109,8 +220,24 @@ class Tag(Base):
     post_tags = relationship("PostTag", back_populates="tag", cascade="all, delete-orphan")
 
 
+# Tag name lookups (see app.services.text_lookup)
+Index(
+    "ix_tags_name_trgm", Tag.name,
+    postgresql_using="gin",
+    postgresql_ops={"name": "gin_trgm_ops"}
+).ddl_if(dialect="postgresql")
+Index(
+    "ix_tags_name_lower", func.lower(Tag.name).label("name_lower"),
+    postgresql_ops={"name_lower": "text_pattern_ops"}
+)
+
+
 class PostTag(Base):
     __tablename__ = "post_tags"
+    __table_args__ = (
+        Index("ix_post_tags_tag_id_post_id", "tag_id", "post_id"),
+        Index("ix_post_tags_post_id", "post_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
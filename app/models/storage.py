@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class Blob(Base):
+    """One stored upload, shared by every image with the same content (see app.services.storage)"""
+    __tablename__ = "blobs"
+
+    sha256 = Column(String(64), primary_key=True)  # hex digest of the content
+    extension = Column(String(16), nullable=False)  # of the first upload, e.g. ".jpg"
+    size = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)  # post images pointing at it
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
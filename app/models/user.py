@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Float
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Float, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -36,11 +36,30 @@ class User(Base):
     )
     
     # Notifications
-    notifications = relationship("Notification", back_populates="user", cascade="all, delete-orphan")
+    notifications = relationship(
+        "Notification",
+        back_populates="user",
+        foreign_keys="Notification.user_id",
+        cascade="all, delete-orphan"
+    )
+
+
+# Name lookups (see app.services.text_lookup): trigram GIN indexes serve
+# substring and similarity matches on Postgres, lower() indexes serve prefixes
+for _column in (User.username, User.first_name, User.last_name):
+    Index(
+        f"ix_users_{_column.key}_trgm", _column,
+        postgresql_using="gin",
+        postgresql_ops={_column.key: "gin_trgm_ops"}
+    ).ddl_if(dialect="postgresql")
+    Index(
+        f"ix_users_{_column.key}_lower", func.lower(_column).label(f"{_column.key}_lower"),
+        postgresql_ops={f"{_column.key}_lower": "text_pattern_ops"}
+    )
 
 
 # User followers association table
-from sqlalchemy import Table, ForeignKey
+from sqlalchemy import Table, ForeignKey, Index
 from app.core.database import Base
 
 user_followers = Table(
@@ -48,5 +67,7 @@ user_followers = Table(
     Base.metadata,
     Column("follower_id", Integer, ForeignKey("users.id"), primary_key=True),
     Column("following_id", Integer, ForeignKey("users.id"), primary_key=True),
-    Column("created_at", DateTime(timezone=True), server_default=func.now())
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    # The primary key covers follower_id lookups; followers lists filter on following_id
+    Index("ix_user_followers_following_id", "following_id")
 ) 
\ No newline at end of file
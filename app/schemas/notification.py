@@ -2,6 +2,7 @@ from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime
 from app.models.notification import NotificationType
+from app.services.counting import CountStrategy
 
 
 class NotificationBase(BaseModel):
@@ -28,6 +29,7 @@ class NotificationResponse(NotificationBase):
 class NotificationList(BaseModel):
     notifications: List[NotificationResponse]
     total: int
+    count_strategy: Optional[CountStrategy] = None
     page: int
     size: int
 
@@ -2,6 +2,7 @@ from pydantic import BaseModel, validator
 from typing import Optional, List
 from datetime import datetime
 from app.models.post import ClothingCategory
+from app.services.counting import CountStrategy
 
 
 class PostBase(BaseModel):
@@ -39,13 +40,31 @@ class PostUpdate(BaseModel):
     tags: Optional[List[str]] = None
 
 
+class ImageVariant(BaseModel):
+    url: str
+    width: int
+    height: int
+    format: str  # "jpeg" or "webp"
+
+
+class PostImage(BaseModel):
+    original: str
+    status: str  # "pending", "ready" or "failed"
+    width: Optional[int] = None
+    height: Optional[int] = None
+    variants: List[ImageVariant] = []
+
+
 class PostResponse(PostBase):
     id: int
     author_id: int
     main_image: str
     additional_images: Optional[List[str]] = None
+    images: List[PostImage] = []  # main image first
+    display_image: Optional[str] = None  # variant picked for the request's width and formats
     is_featured: bool
     view_count: int
+    unique_viewers: int = 0  # estimated distinct viewers (HyperLogLog, about 1% error)
     like_count: int
     comment_count: int
     created_at: datetime
@@ -53,6 +72,7 @@ class PostResponse(PostBase):
     author: dict  # Will be populated with user info
     tags: List[str] = []
     is_liked: bool = False
+    duplicate_of: Optional[int] = None  # earlier post with a near-identical main image
     
     class Config:
         from_attributes = True
@@ -60,9 +80,12 @@ class PostResponse(PostBase):
 
 class PostList(BaseModel):
     posts: List[PostResponse]
-    total: int
-    page: int
+    total: Optional[int] = None  # Skipped in cursor mode unless requested
+    count_strategy: Optional[CountStrategy] = None  # How total was produced
+    page: Optional[int] = None  # Only set in page mode
     size: int
+    next_cursor: Optional[str] = None
+    has_more: bool = False
 
 
 class CommentBase(BaseModel):
@@ -88,6 +111,7 @@ class CommentResponse(CommentBase):
 class CommentList(BaseModel):
     comments: List[CommentResponse]
     total: int
+    count_strategy: Optional[CountStrategy] = None
     page: int
     size: int
 
@@ -109,4 +133,11 @@ class TagResponse(BaseModel):
     created_at: datetime
     
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True
+
+
+class TagList(BaseModel):
+    tags: List[TagResponse]
+    total: int
+    page: int
+    size: int 
\ No newline at end of file
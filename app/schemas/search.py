@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+from typing import List
+
+
+class Suggestion(BaseModel):
+    value: str
+    score: int
+
+
+class AutocompleteResponse(BaseModel):
+    tags: List[Suggestion] = []
+    brands: List[Suggestion] = []
+    users: List[Suggestion] = []
@@ -0,0 +1,34 @@
+from pydantic import BaseModel, Field
+from typing import Dict, Optional
+
+
+class UploadRequest(BaseModel):
+    filename: str
+    size: int = Field(..., gt=0)
+    sha256: str = Field(..., pattern="^[0-9a-f]{64}$")  # hex digest of the file
+    content_type: Optional[str] = None
+
+
+class PresignedUpload(BaseModel):
+    key: str  # pass to create_post as uploaded_images once uploaded
+    exists: bool  # already stored: skip the upload
+    url: Optional[str] = None
+    method: Optional[str] = None
+    headers: Dict[str, str] = {}  # send these with the upload
+    expires_in: Optional[int] = None  # seconds
+
+
+class ResumableUploadCreate(BaseModel):
+    filename: str
+    size: int = Field(..., gt=0)
+
+
+class ResumableUpload(BaseModel):
+    id: str
+    url: str  # HEAD for the offset, PATCH chunks, POST {url}/complete when done
+    offset: int
+    length: int
+
+
+class CompletedUpload(BaseModel):
+    key: str  # pass to create_post as uploaded_images
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, EmailStr, validator
 from typing import Optional, List
 from datetime import datetime
+from app.services.counting import CountStrategy
 
 
 class UserBase(BaseModel):
@@ -70,5 +71,6 @@ class TokenData(BaseModel):
 class UserList(BaseModel):
     users: List[UserResponse]
     total: int
+    count_strategy: Optional[CountStrategy] = None
     page: int
     size: int 
\ No newline at end of file
@@ -0,0 +1,227 @@
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import enum
+import heapq
+import threading
+
+from app.core.config import settings
+from app.models.user import User, user_followers
+from app.models.post import Post, Tag, PostTag
+
+
+class AutocompleteKind(str, enum.Enum):
+    TAGS = "tags"
+    BRANDS = "brands"
+    USERS = "users"
+
+
+_EMPTY: List[str] = []
+
+
+class _Node:
+    __slots__ = ("children", "values", "top")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.values: Optional[Set[str]] = None  # values whose normalized form ends here
+        self.top: List[str] = _EMPTY  # best ``top_k`` values in this subtree
+
+    def add(self, value: str) -> None:
+        if self.values is None:
+            self.values = set()
+        self.values.add(value)
+
+
+class PrefixIndex:
+    """Case-insensitive trie that keeps the top-K values by score at every node.
+
+    A lookup walks ``len(prefix)`` nodes and returns the precomputed list, so
+    its cost does not depend on how many values share the prefix. Score
+    changes recompute the lists along one root-to-leaf path only.
+    """
+
+    def __init__(self, top_k: int = 10):
+        self.top_k = top_k
+        self.scores: Dict[str, int] = {}
+        self._root = _Node()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, items: Iterable[Tuple[str, int]], top_k: int = 10) -> "PrefixIndex":
+        """Bulk-load ``(value, score)`` pairs, computing each node's list once"""
+        index = cls(top_k)
+        for value, score in items:
+            if value:
+                index.scores[value] = index.scores.get(value, 0) + score
+                index._path(value)[-1].add(value)
+
+        # Children before parents, so each node merges finished child lists
+        order = [index._root]
+        for node in order:
+            order.extend(node.children.values())
+        for node in reversed(order):
+            index._refresh(node)
+        return index
+
+    def search(self, prefix: str, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Return up to ``limit`` ``(value, score)`` pairs starting with ``prefix``, best first"""
+        node = self._root
+        for char in prefix.lower():
+            node = node.children.get(char)
+            if node is None:
+                return []
+        top = node.top[:limit or self.top_k]
+        return [(value, self.scores.get(value, 0)) for value in top]
+
+    def adjust(self, value: str, delta: int = 0) -> int:
+        """Add ``value`` if missing and change its score by ``delta``; return the new score"""
+        if not value:
+            return 0
+        with self._lock:
+            score = self.scores.get(value, 0) + delta
+            self.scores[value] = score
+            path = self._path(value)
+            path[-1].add(value)
+            if delta >= 0:
+                # A value can only climb, so splice it into each list on the path
+                for node in path:
+                    self._promote(node, value)
+            else:
+                for node in reversed(path):
+                    self._refresh(node)
+            return score
+
+    def discard(self, value: str) -> None:
+        """Remove ``value`` from the index"""
+        with self._lock:
+            if self.scores.pop(value, None) is None:
+                return
+            path = self._path(value)
+            if path[-1].values:
+                path[-1].values.discard(value)
+            for node in reversed(path):
+                self._refresh(node)
+
+    def _path(self, value: str) -> List[_Node]:
+        """Nodes from the root to the node for ``value``, creating missing ones"""
+        node = self._root
+        path = [node]
+        for char in value.lower():
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = _Node()
+            node = child
+            path.append(node)
+        return path
+
+    def _rank(self, value: str) -> Tuple[int, str]:
+        return -self.scores.get(value, 0), value
+
+    def _promote(self, node: _Node, value: str) -> None:
+        top = [other for other in node.top if other != value]
+        if len(top) < self.top_k or self._rank(value) < self._rank(top[-1]):
+            top.append(value)
+            top.sort(key=self._rank)
+            del top[self.top_k:]
+        node.top = top
+
+    def _refresh(self, node: _Node) -> None:
+        if not node.children:
+            node.top = sorted(node.values or (), key=self._rank)[:self.top_k]
+            return
+        if not node.values and len(node.children) == 1:
+            # Inside a single-branch run the lists are identical; lists are never mutated in place
+            node.top = next(iter(node.children.values())).top
+            return
+        candidates = set(node.values or ())
+        for child in node.children.values():
+            candidates.update(child.top)
+        node.top = heapq.nsmallest(self.top_k, candidates, key=self._rank)
+
+
+class AutocompleteService:
+    """In-process typeahead over tag names, post brands and usernames.
+
+    Popularity is the number of posts using a tag, the number of public posts
+    with a brand, and a user's follower count. The indexes are built from the
+    database at startup (or on first use) and then updated by the write
+    endpoints after they commit; lookups never touch the database. Every
+    worker process keeps its own copy, so ``AUTOCOMPLETE_REFRESH_SECONDS``
+    rebuilds it periodically to pick up writes served by other workers.
+    """
+
+    _indexes: Dict[AutocompleteKind, PrefixIndex] = {}
+    _build_lock = threading.Lock()
+
+    @classmethod
+    def build(cls, db: Session) -> None:
+        """(Re)build every index from the database and swap it in"""
+        tag_rows = db.query(Tag.name, func.count(PostTag.id)).outerjoin(
+            PostTag, PostTag.tag_id == Tag.id
+        ).group_by(Tag.id, Tag.name).all()
+
+        brand_rows = db.query(Post.brand, func.count(Post.id)).filter(
+            Post.brand.isnot(None),
+            Post.is_public == True
+        ).group_by(Post.brand).all()
+
+        follower_counts = db.query(
+            user_followers.c.following_id.label("user_id"),
+            func.count().label("followers")
+        ).group_by(user_followers.c.following_id).subquery()
+        user_rows = db.query(User.username, func.coalesce(follower_counts.c.followers, 0)).outerjoin(
+            follower_counts, follower_counts.c.user_id == User.id
+        ).filter(User.is_active == True).all()
+
+        top_k = settings.AUTOCOMPLETE_TOP_K
+        cls._indexes = {
+            AutocompleteKind.TAGS: PrefixIndex.build(tag_rows, top_k),
+            AutocompleteKind.BRANDS: PrefixIndex.build(brand_rows, top_k),
+            AutocompleteKind.USERS: PrefixIndex.build(user_rows, top_k),
+        }
+
+    @classmethod
+    def ensure_built(cls, db: Session) -> None:
+        if not cls._indexes:
+            with cls._build_lock:
+                if not cls._indexes:
+                    cls.build(db)
+
+    @classmethod
+    def reset(cls) -> None:
+        """Drop the indexes; the next lookup rebuilds them"""
+        cls._indexes = {}
+
+    @classmethod
+    def suggest(cls, kind: AutocompleteKind, prefix: str, limit: int) -> List[Tuple[str, int]]:
+        index = cls._indexes.get(kind)
+        return index.search(prefix, limit) if index else []
+
+    @classmethod
+    def adjust(cls, kind: AutocompleteKind, value: Optional[str], delta: int = 0) -> None:
+        """Record a committed write; ignored until the indexes are built"""
+        index = cls._indexes.get(kind)
+        if index is None or not value:
+            return
+        score = index.adjust(value, delta)
+        # Brands only exist through posts, so drop them with their last post
+        if kind == AutocompleteKind.BRANDS and score <= 0:
+            index.discard(value)
+
+    @classmethod
+    def post_terms_changed(cls, before: Tuple[Optional[str], List[str]], after: Tuple[Optional[str], List[str]]) -> None:
+        """Apply a post's ``(public brand, tags)`` change, as returned by ``post_terms``"""
+        (old_brand, old_tags), (new_brand, new_tags) = before, after
+        if old_brand != new_brand:
+            cls.adjust(AutocompleteKind.BRANDS, old_brand, -1)
+            cls.adjust(AutocompleteKind.BRANDS, new_brand, 1)
+        for tag in set(old_tags) - set(new_tags):
+            cls.adjust(AutocompleteKind.TAGS, tag, -1)
+        for tag in set(new_tags) - set(old_tags):
+            cls.adjust(AutocompleteKind.TAGS, tag, 1)
+
+    @staticmethod
+    def post_terms(post: Post, tags: Iterable[str]) -> Tuple[Optional[str], List[str]]:
+        """The autocomplete terms a post contributes: its brand if public, and its tags"""
+        return (post.brand if post.is_public else None), list(tags)
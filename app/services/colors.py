@@ -0,0 +1,237 @@
+from concurrent.futures import Executor
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional, Tuple
+import logging
+import re
+import threading
+
+import numpy as np
+from PIL import Image
+
+from app.core.config import settings
+from app.core.object_storage import get_storage
+from app.models.post import Post, PostColor
+from app.utils.file_upload import storage_key
+
+
+# Each RGB channel is cut into LEVELS ranges, giving LEVELS ** 3 color bins
+LEVELS = 4
+BINS = LEVELS ** 3
+
+# Histograms are taken from a copy at most this many pixels across
+THUMBNAIL_SIZE = 64
+
+# Colors accepted by name in ``?color=``; anything else must be hex
+NAMED_COLORS = {
+    "black": "#000000",
+    "white": "#ffffff",
+    "gray": "#808080",
+    "grey": "#808080",
+    "silver": "#c0c0c0",
+    "red": "#c62828",
+    "burgundy": "#800020",
+    "pink": "#f48fb1",
+    "orange": "#f57c00",
+    "yellow": "#fdd835",
+    "beige": "#e8d8b8",
+    "brown": "#6d4c41",
+    "khaki": "#bdb76b",
+    "olive": "#708238",
+    "green": "#2e7d32",
+    "teal": "#00897b",
+    "blue": "#1e63c8",
+    "navy": "#1a2a5a",
+    "purple": "#6a1b9a",
+}
+
+HEX_COLOR_PATTERN = re.compile(r"^#?([0-9a-f]{3}|[0-9a-f]{6})$")
+
+logger = logging.getLogger(__name__)
+
+
+def srgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """CIE L*a*b* (D65) of ``(..., 3)`` sRGB values in 0-255, where distances track perceived difference"""
+    linear = np.asarray(rgb, dtype=np.float64) / 255
+    linear = np.where(linear <= 0.04045, linear / 12.92, ((linear + 0.055) / 1.055) ** 2.4)
+    xyz = linear @ np.array([
+        [0.4124, 0.2126, 0.0193],
+        [0.3576, 0.7152, 0.1192],
+        [0.1805, 0.0722, 0.9505],
+    ]) / np.array([0.95047, 1.0, 1.08883])
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.stack([116 * f[..., 1] - 16, 500 * (f[..., 0] - f[..., 1]), 200 * (f[..., 1] - f[..., 2])], axis=-1)
+
+
+# Lab color at the center of every bin, in bin order
+_centers = (np.arange(LEVELS) + 0.5) * 256 / LEVELS
+BIN_LAB = srgb_to_lab(np.stack(np.meshgrid(_centers, _centers, _centers, indexing="ij"), axis=-1).reshape(-1, 3))
+
+
+def color_histogram(image: Image.Image) -> np.ndarray:
+    """Share of ``image`` in each color bin, as ``BINS`` float32s summing to 1.
+
+    Pixels are weighted towards the center of the frame, so the backdrop of
+    a product shot counts for less than the garment; transparent pixels are
+    left out.
+    """
+    small = image.convert("RGBA")
+    small.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    pixels = np.asarray(small, dtype=np.int64)
+    height, width = pixels.shape[:2]
+    weights = np.outer(np.hanning(height + 2)[1:-1], np.hanning(width + 2)[1:-1])
+    weights = weights * (pixels[..., 3] >= 128)
+
+    levels = pixels[..., :3] * LEVELS // 256
+    bins = (levels[..., 0] * LEVELS + levels[..., 1]) * LEVELS + levels[..., 2]
+    histogram = np.bincount(bins.ravel(), weights=weights.ravel(), minlength=BINS)
+    total = histogram.sum()
+    return (histogram / total if total > 0 else histogram).astype(np.float32)
+
+
+def histogram_of(original: str) -> np.ndarray:
+    """``color_histogram`` of a stored ``/uploads/...`` image; runs in a worker process"""
+    with get_storage().local_copy(storage_key(original)) as source, Image.open(source) as image:
+        image.draft("RGB", (THUMBNAIL_SIZE, THUMBNAIL_SIZE))  # JPEGs decode at a fraction of their size
+        return color_histogram(image)
+
+
+def parse_color(value: str) -> Optional[Tuple[int, int, int]]:
+    """RGB of a color name from ``NAMED_COLORS`` or a ``#rgb``/``#rrggbb`` hex code; ``None`` if neither"""
+    value = NAMED_COLORS.get(value.strip().lower(), value.strip().lower())
+    match = HEX_COLOR_PATTERN.match(value)
+    if not match:
+        return None
+    digits = match.group(1)
+    if len(digits) == 3:
+        digits = "".join(digit * 2 for digit in digits)
+    return tuple(int(digits[i:i + 2], 16) for i in (0, 2, 4))
+
+
+def color_weights(rgb: Tuple[int, int, int]) -> np.ndarray:
+    """How close each bin is to ``rgb``: 1 at the color, falling off over ``COLOR_MATCH_RADIUS`` in Lab"""
+    distance = np.linalg.norm(BIN_LAB - srgb_to_lab(np.array(rgb)), axis=1)
+    return np.exp(-0.5 * (distance / settings.COLOR_MATCH_RADIUS) ** 2).astype(np.float32)
+
+
+class ColorMatrix:
+    """Snapshot of every post's histogram as one posts x bins matrix, plus histograms stored since"""
+
+    def __init__(self, post_ids: np.ndarray, histograms: np.ndarray):
+        self.post_ids = post_ids  # sorted
+        self.histograms = histograms
+        self.updates: Dict[int, np.ndarray] = {}
+        self.lock = threading.Lock()
+
+    def scores(self, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """``(post_ids, scores)`` of every post for bin ``weights``"""
+        post_ids, scores = self.post_ids, self.histograms @ weights
+        with self.lock:
+            updates = dict(self.updates)
+        if updates:
+            updated_ids = np.fromiter(updates, dtype=np.int64, count=len(updates))
+            keep = ~np.isin(post_ids, updated_ids)
+            post_ids = np.concatenate([post_ids[keep], updated_ids])
+            scores = np.concatenate([scores[keep], np.stack(list(updates.values())) @ weights])
+        return post_ids, scores
+
+
+class ColorIndex:
+    """Search by color over histograms of post main images.
+
+    The image pipeline stores a ``BINS``-color histogram per post in
+    ``post_colors`` as it renders the main image's derivatives. Searches
+    score every post at once against an in-process posts x bins matrix: a
+    post's score for a color is the share of its image within
+    ``COLOR_MATCH_RADIUS`` of it (one matrix-vector product with the
+    per-bin closeness from ``color_weights``). The matrix is loaded on first
+    use and rebuilt every ``COLOR_INDEX_REFRESH_SECONDS``; histograms stored
+    by this process are applied in between.
+    """
+
+    _model: Optional[ColorMatrix] = None
+    _build_lock = threading.Lock()
+
+    @classmethod
+    def build(cls, db: Session) -> None:
+        """(Re)load the matrix from ``post_colors`` and swap it in"""
+        rows = db.query(PostColor.post_id, PostColor.histogram).order_by(PostColor.post_id).all()
+        post_ids = np.array([row.post_id for row in rows], dtype=np.int64)
+        histograms = np.frombuffer(b"".join(row.histogram for row in rows), dtype=np.float32).reshape(-1, BINS)
+        cls._model = ColorMatrix(post_ids, histograms)
+
+    @classmethod
+    def ensure_built(cls, db: Session) -> ColorMatrix:
+        if cls._model is None:
+            with cls._build_lock:
+                if cls._model is None:
+                    cls.build(db)
+        return cls._model
+
+    @classmethod
+    def reset(cls) -> None:
+        cls._model = None
+
+    @staticmethod
+    def store(db: Session, post_id: int, image: str, histogram: np.ndarray) -> None:
+        """Save a post's histogram in the caller's transaction; ``record`` it once committed"""
+        db.merge(PostColor(post_id=post_id, image=image, histogram=histogram.astype(np.float32).tobytes()))
+
+    @classmethod
+    def record(cls, post_id: int, histogram: np.ndarray) -> None:
+        """Apply a committed histogram to the matrix; ignored until it is built"""
+        model = cls._model
+        if model is not None:
+            with model.lock:
+                model.updates[post_id] = histogram.astype(np.float32)
+
+    @classmethod
+    def matches(cls, db: Session, rgb: Tuple[int, int, int]) -> List[Tuple[int, float]]:
+        """Posts scoring at least ``COLOR_MATCH_MIN_SCORE`` for ``rgb`` as ``(post_id, score)``.
+
+        Ordered by score then post id, both descending, and cut to the best
+        ``COLOR_SEARCH_CANDIDATES``.
+        """
+        post_ids, scores = cls.ensure_built(db).scores(color_weights(rgb))
+        rows = np.flatnonzero(scores >= settings.COLOR_MATCH_MIN_SCORE)
+        limit = settings.COLOR_SEARCH_CANDIDATES
+        if len(rows) > limit:
+            # Partition down to the top candidates, keeping every row tied with the last one
+            threshold = np.partition(scores[rows], len(rows) - limit)[len(rows) - limit]
+            rows = rows[scores[rows] >= threshold]
+        rows = rows[np.lexsort((-post_ids[rows], -scores[rows]))][:limit]
+        return [(int(post_ids[row]), float(scores[row])) for row in rows]
+
+    @classmethod
+    def backfill(cls, db: Session, executor: Optional[Executor] = None, batch_size: int = 100) -> int:
+        """Compute histograms for posts without one for their current main image; return how many"""
+        stored = 0
+        last_id = 0
+        while True:
+            posts = db.query(Post.id, Post.main_image).outerjoin(
+                PostColor, PostColor.post_id == Post.id
+            ).filter(
+                Post.id > last_id,
+                or_(PostColor.post_id.is_(None), PostColor.image != Post.main_image)
+            ).order_by(Post.id).limit(batch_size).all()
+            if not posts:
+                return stored
+            last_id = posts[-1].id
+
+            originals = [post.main_image for post in posts]
+            if executor is None:
+                jobs = [(original, None) for original in originals]
+            else:
+                jobs = [(original, executor.submit(histogram_of, original)) for original in originals]
+            histograms = {}
+            for post, (original, future) in zip(posts, jobs):
+                try:
+                    histograms[post.id] = future.result() if future else histogram_of(original)
+                except Exception:
+                    logger.exception("Color histogram of %s failed", original)
+                    continue
+                cls.store(db, post.id, original, histograms[post.id])
+            db.commit()
+            for post_id, histogram in histograms.items():
+                cls.record(post_id, histogram)
+            stored += len(histograms)
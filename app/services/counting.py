@@ -0,0 +1,90 @@
+from sqlalchemy.exc import CompileError
+from sqlalchemy.orm import Query, Session
+from typing import Optional, Tuple
+import enum
+import json
+
+from app.core.config import settings
+from app.core.redis import get_redis
+
+
+class CountStrategy(str, enum.Enum):
+    EXACT = "exact"
+    CACHED = "cached"
+    ESTIMATED = "estimated"
+
+
+class CountService:
+    """Produce list totals using an exact, cached or planner-estimated count.
+
+    Cached totals live under a per-namespace version number. Writes call
+    ``invalidate(namespace)``, which bumps the version so every cached total
+    for that namespace is dropped at once, and the TTL bounds staleness for
+    writes that do not invalidate.
+    """
+
+    @staticmethod
+    def resolve(name: str, requested: Optional[CountStrategy] = None) -> CountStrategy:
+        """Pick the strategy for an endpoint: request, then per-endpoint setting, then default"""
+        if requested is not None:
+            return requested
+        configured = settings.COUNT_STRATEGY_OVERRIDES.get(name, settings.COUNT_STRATEGY)
+        return CountStrategy(configured)
+
+    @staticmethod
+    def count(
+        db: Session,
+        query: Query,
+        strategy: CountStrategy,
+        namespace: str,
+        params: Optional[dict] = None
+    ) -> Tuple[int, CountStrategy]:
+        """Count rows matched by ``query``, returning the total and the strategy that produced it"""
+        if strategy == CountStrategy.CACHED:
+            return CountService._cached_count(query, namespace, params or {}), CountStrategy.CACHED
+
+        if strategy == CountStrategy.ESTIMATED:
+            estimate = CountService._estimated_count(db, query)
+            if estimate is not None:
+                return estimate, CountStrategy.ESTIMATED
+
+        return query.order_by(None).count(), CountStrategy.EXACT
+
+    @staticmethod
+    def invalidate(namespace: str) -> None:
+        """Drop every cached total in ``namespace``"""
+        get_redis().incr(f"count-version:{namespace}")
+
+    @staticmethod
+    def _cached_count(query: Query, namespace: str, params: dict) -> int:
+        redis = get_redis()
+        version = int(redis.get(f"count-version:{namespace}") or 0)
+        key = f"count:{namespace}:{version}:{json.dumps(params, sort_keys=True, default=str)}"
+
+        cached = redis.get(key)
+        if cached is not None:
+            return int(cached)
+
+        total = query.order_by(None).count()
+        redis.set(key, total, ex=settings.COUNT_CACHE_TTL)
+        return total
+
+    @staticmethod
+    def _estimated_count(db: Session, query: Query) -> Optional[int]:
+        """Read the planner's row estimate; only Postgres exposes a usable one"""
+        if db.get_bind().dialect.name != "postgresql":
+            return None
+
+        try:
+            sql = str(query.order_by(None).statement.compile(
+                dialect=db.get_bind().dialect,
+                compile_kwargs={"literal_binds": True}
+            ))
+        except (CompileError, NotImplementedError):
+            return None
+
+        # Pass empty params so the driver un-doubles the "%%" the compiler emits
+        plan = db.connection().exec_driver_sql("EXPLAIN (FORMAT JSON) " + sql, {}).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
@@ -0,0 +1,301 @@
+from concurrent.futures import Executor
+from itertools import combinations
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import logging
+import threading
+
+from PIL import Image, ImageOps
+
+from app.core.config import settings
+from app.core.object_storage import get_storage
+from app.models.post import Post, PostImageHash
+from app.services.storage import blob_key
+from app.utils.file_upload import StagedUpload, storage_key
+
+
+HASH_BITS = 64
+
+# Multi-index hashing: hashes are split into CHUNKS substrings, each with its own table
+CHUNKS = 4
+CHUNK_BITS = HASH_BITS // CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+logger = logging.getLogger(__name__)
+
+
+def dhash(image: Image.Image) -> int:
+    """64-bit difference hash: whether each pixel of a 9x8 grayscale copy is brighter than its right neighbor.
+
+    Robust to rescaling, recompression and small color or brightness
+    changes, so re-posts of the same photo land within a few bits.
+    """
+    small = ImageOps.exif_transpose(image).convert("L").resize((9, 8), Image.Resampling.BOX)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+
+def image_hash(path: str) -> Optional[int]:
+    """``dhash`` of the image file at ``path``, or ``None`` if it cannot be read"""
+    try:
+        with Image.open(path) as image:
+            image.draft("L", (64, 64))  # JPEGs decode at a fraction of their size
+            return dhash(image)
+    except Exception:
+        logger.exception("Could not hash image %s", path)
+        return None
+
+
+def stored_image_hash(original: str) -> Optional[int]:
+    """``image_hash`` of a stored ``/uploads/...`` image; runs in a worker process"""
+    with get_storage().local_copy(storage_key(original)) as path:
+        return image_hash(path)
+
+
+def to_signed(value: int) -> int:
+    """Hashes are unsigned; BIGINT columns are signed"""
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def to_unsigned(value: int) -> int:
+    return value & ((1 << HASH_BITS) - 1)
+
+
+def _chunks(value: int) -> List[int]:
+    return [(value >> (CHUNK_BITS * index)) & CHUNK_MASK for index in range(CHUNKS)]
+
+
+def _flips(chunk: int, radius: int) -> Iterable[int]:
+    """Every chunk value within ``radius`` bits of ``chunk``"""
+    yield chunk
+    for bits in range(1, radius + 1):
+        for positions in combinations(range(CHUNK_BITS), bits):
+            flipped = chunk
+            for position in positions:
+                flipped ^= 1 << position
+            yield flipped
+
+
+class MultiIndexHashTable:
+    """Hamming-distance lookups over 64-bit hashes by multi-index hashing.
+
+    Each hash is filed under each of its ``CHUNKS`` 16-bit substrings. Two
+    hashes within ``k`` bits must agree to within ``k // CHUNKS`` bits on at
+    least one substring (pigeonhole), so a lookup only probes the substring
+    values that close to the query's and checks the few hashes filed there,
+    instead of comparing against every hash (or walking a BK-tree, which
+    degrades to most of the tree at useful radii). Identical hashes share
+    one entry listing every key that has them.
+    """
+
+    def __init__(self):
+        self.keys: Dict[int, Set[int]] = {}  # hash -> keys (post ids)
+        self._tables: List[Dict[int, Set[int]]] = [{} for _ in range(CHUNKS)]
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, value: int, key: int) -> None:
+        with self._lock:
+            keys = self.keys.get(value)
+            if keys is None:
+                keys = self.keys[value] = set()
+                for table, chunk in zip(self._tables, _chunks(value)):
+                    table.setdefault(chunk, set()).add(value)
+            keys.add(key)
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, int]]:
+        """``(key, distance)`` of every key with a hash within ``max_distance`` bits, closest first"""
+        radius = max_distance // CHUNKS
+        checked: Set[int] = set()
+        found = []
+        for table, chunk in zip(self._tables, _chunks(value)):
+            for probe in _flips(chunk, radius):
+                for candidate in table.get(probe, ()):
+                    if candidate in checked:
+                        continue
+                    checked.add(candidate)
+                    distance = bin(candidate ^ value).count("1")
+                    if distance <= max_distance:
+                        found.extend((key, distance) for key in self.keys.get(candidate, ()))
+        found.sort(key=lambda item: (item[1], item[0]))
+        return found
+
+
+class DuplicateIndex:
+    """Near-duplicate detection for post images by perceptual hash.
+
+    ``create_post`` hashes every upload (``dhash``), links the post to the
+    earliest visible post whose images include a near-duplicate of its main
+    image (``posts.duplicate_of``) and stores the hashes in
+    ``post_image_hashes``. Lookups go to an in-process
+    ``MultiIndexHashTable`` loaded on first use, rebuilt every
+    ``DUPLICATE_INDEX_REFRESH_SECONDS`` and fed hashes stored by this process
+    in between. ``scan`` is the offline pass over every post
+    (``python -m app.cli scan-duplicates``).
+    """
+
+    _table: Optional[MultiIndexHashTable] = None
+    _build_lock = threading.Lock()
+
+    @classmethod
+    def build(cls, db: Session) -> None:
+        """(Re)load every stored hash and swap the table in"""
+        table = MultiIndexHashTable()
+        for row in db.query(PostImageHash.post_id, PostImageHash.phash).yield_per(10000):
+            table.add(to_unsigned(row.phash), row.post_id)
+        cls._table = table
+
+    @classmethod
+    def ensure_built(cls, db: Session) -> MultiIndexHashTable:
+        if cls._table is None:
+            with cls._build_lock:
+                if cls._table is None:
+                    cls.build(db)
+        return cls._table
+
+    @classmethod
+    def reset(cls) -> None:
+        cls._table = None
+
+    @staticmethod
+    def hash_uploads(staged: List[StagedUpload]) -> List[Optional[int]]:
+        """Hash each staged upload, from its temporary file or, for direct uploads, from storage"""
+        hashes = []
+        for upload in staged:
+            if upload.temp_path is not None:
+                hashes.append(image_hash(upload.temp_path))
+            else:
+                with get_storage().local_copy(blob_key(upload.sha256, upload.extension)) as path:
+                    hashes.append(image_hash(path))
+        return hashes
+
+    @classmethod
+    def near(cls, db: Session, value: int, max_distance: Optional[int] = None) -> List[Tuple[int, int]]:
+        """``(post_id, distance)`` of posts with an image within ``max_distance`` bits of ``value``"""
+        if max_distance is None:
+            max_distance = settings.DUPLICATE_MAX_DISTANCE
+        return cls.ensure_built(db).search(value, max_distance)
+
+    @classmethod
+    def original_of(cls, db: Session, value: Optional[int], user_id: int, before: Optional[int] = None) -> Optional[int]:
+        """Earliest post (public, or by ``user_id``) with a near-duplicate of the image hashed ``value``"""
+        if value is None:
+            return None
+        post_ids = {post_id for post_id, _ in cls.near(db, value) if before is None or post_id < before}
+        if not post_ids:
+            return None
+        # The table may still hold posts deleted since it was loaded; the query drops them
+        return db.query(Post.id).filter(
+            Post.id.in_(post_ids),
+            or_(Post.is_public == True, Post.author_id == user_id)
+        ).order_by(Post.id).limit(1).scalar()
+
+    @staticmethod
+    def store(db: Session, post_id: int, images: Iterable[Tuple[str, Optional[int]]]) -> Dict[str, int]:
+        """Save ``(image URL, hash)`` pairs of a post in the caller's transaction; ``record`` them once committed"""
+        hashes = {image: value for image, value in images if value is not None}
+        for image, value in hashes.items():
+            db.merge(PostImageHash(post_id=post_id, image=image, phash=to_signed(value)))
+        return hashes
+
+    @classmethod
+    def record(cls, post_id: int, hashes: Iterable[int]) -> None:
+        """Add a post's committed hashes to the table; ignored until it is built"""
+        table = cls._table
+        if table is not None:
+            for value in hashes:
+                table.add(value, post_id)
+
+    @classmethod
+    def images_changed(cls, db: Session, post_id: int, images: List[str]) -> Dict[str, int]:
+        """Keep a post's stored hashes in step with its images after an edit.
+
+        Images the post no longer has are dropped. Hashes of added images are
+        copied from any post that already uses the same stored file (uploads
+        are content addressed); the rest are left to ``scan``.
+        """
+        db.query(PostImageHash).filter(
+            PostImageHash.post_id == post_id,
+            PostImageHash.image.notin_(images)
+        ).delete(synchronize_session=False)
+        known = {row.image for row in db.query(PostImageHash.image).filter(PostImageHash.post_id == post_id)}
+        added = [image for image in images if image not in known]
+        if not added:
+            return {}
+        rows = db.query(PostImageHash.image, PostImageHash.phash).filter(PostImageHash.image.in_(added)).all()
+        return cls.store(db, post_id, ((row.image, to_unsigned(row.phash)) for row in rows))
+
+    @classmethod
+    def scan(cls, db: Session, executor: Optional[Executor] = None, batch_size: int = 100) -> Tuple[int, int]:
+        """Hash post images that have no hash yet, then link every post to its earliest near-duplicate.
+
+        Returns how many images were hashed and how many posts were linked.
+        """
+        hashed = 0
+        last_id = 0
+        while True:
+            posts = db.query(Post).filter(Post.id > last_id).order_by(Post.id).limit(batch_size).all()
+            if not posts:
+                break
+            last_id = posts[-1].id
+            known = {
+                (row.post_id, row.image)
+                for row in db.query(PostImageHash.post_id, PostImageHash.image).filter(
+                    PostImageHash.post_id.in_([post.id for post in posts])
+                )
+            }
+            missing = [
+                (post.id, entry["original"])
+                for post in posts
+                for entry in post.images or [{"original": post.main_image}]
+                if (post.id, entry["original"]) not in known
+            ]
+            if executor is None:
+                jobs = [(post_id, original, None) for post_id, original in missing]
+            else:
+                jobs = [
+                    (post_id, original, executor.submit(stored_image_hash, original))
+                    for post_id, original in missing
+                ]
+            stored: Dict[int, List[int]] = {}
+            for post_id, original, future in jobs:
+                try:
+                    value = future.result() if future else stored_image_hash(original)
+                except Exception:
+                    logger.exception("Hashing %s failed", original)
+                    continue
+                hashes = cls.store(db, post_id, [(original, value)])
+                stored.setdefault(post_id, []).extend(hashes.values())
+            db.commit()
+            for post_id, hashes in stored.items():
+                cls.record(post_id, hashes)
+                hashed += len(hashes)
+
+        cls.build(db)
+        linked = 0
+        last_id = 0
+        while True:
+            rows = db.query(Post.id, Post.main_image, Post.author_id, Post.duplicate_of, PostImageHash.phash).outerjoin(
+                PostImageHash, (PostImageHash.post_id == Post.id) & (PostImageHash.image == Post.main_image)
+            ).filter(Post.id > last_id).order_by(Post.id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            for row in rows:
+                value = None if row.phash is None else to_unsigned(row.phash)
+                original = cls.original_of(db, value, row.author_id, before=row.id)
+                if original != row.duplicate_of:
+                    db.query(Post).filter(Post.id == row.id).update(
+                        {Post.duplicate_of: original}, synchronize_session=False
+                    )
+                if original is not None:
+                    linked += 1
+            db.commit()
+        return hashed, linked
@@ -0,0 +1,207 @@
+from collections import OrderedDict
+from enum import Enum
+from typing import Dict, Optional, Tuple
+import asyncio
+import hashlib
+import os
+import threading
+
+from PIL import Image, ImageOps
+
+from app.core.config import settings
+from app.services.images import ImagePipeline, save_atomically
+from app.services.resumable_uploads import RESUMABLE_FOLDER
+
+
+class ResizeFormat(str, Enum):
+    JPEG = "jpeg"
+    WEBP = "webp"
+    PNG = "png"
+
+
+# Pillow format name, file extension and media type of each output format
+OUTPUTS = {
+    ResizeFormat.JPEG: ("JPEG", ".jpg", "image/jpeg"),
+    ResizeFormat.WEBP: ("WEBP", ".webp", "image/webp"),
+    ResizeFormat.PNG: ("PNG", ".png", "image/png"),
+}
+
+# EXIF orientations that swap width and height
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def render_resized(source: str, target: str, width: Optional[int], height: Optional[int], fmt: ResizeFormat) -> None:
+    """Resize ``source`` to fit within ``width`` x ``height`` (never upscaling) and save it at ``target``.
+
+    JPEGs are decoded with ``Image.draft``, which lets libjpeg scale by 1/2,
+    1/4 or 1/8 while decoding, so a small thumbnail of a large photo never
+    decodes the full-resolution pixels. Runs in a worker process.
+    """
+    with Image.open(source) as image:
+        # Target size from the header alone, in display orientation
+        transposed = image.getexif().get(0x0112) in TRANSPOSED_ORIENTATIONS
+        source_width, source_height = (image.height, image.width) if transposed else image.size
+        scale = min((width or source_width) / source_width, (height or source_height) / source_height, 1)
+        size = (max(1, round(source_width * scale)), max(1, round(source_height * scale)))
+        if image.format == "JPEG":
+            image.draft("RGB", size[::-1] if transposed else size)
+        image = ImageOps.exif_transpose(image)
+
+    image_format, _, _ = OUTPUTS[fmt]
+
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    image = image.convert("RGBA" if has_alpha and image_format != "JPEG" else "RGB")
+    if image.size != size:
+        image = image.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+    params = {
+        "JPEG": {"quality": settings.IMAGE_JPEG_QUALITY, "optimize": True, "progressive": True},
+        "WEBP": {"quality": settings.IMAGE_WEBP_QUALITY, "method": 4},
+        "PNG": {"optimize": True},
+    }[image_format]
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    save_atomically(image, target, image_format, **params)
+
+
+class ResizeCache:
+    """Rendered variants on disk, evicted least recently used past ``IMAGE_CACHE_MAX_BYTES``.
+
+    Recency lives in an in-memory ``OrderedDict`` (oldest first), seeded from
+    file modification times on first use; hits touch the file so the order
+    survives a restart. Each process keeps its own view, so a file evicted
+    by another worker is simply a miss here.
+    """
+
+    _entries: Optional["OrderedDict[str, int]"] = None
+    _total = 0
+    _lock = threading.Lock()
+
+    @classmethod
+    def _load(cls) -> "OrderedDict[str, int]":
+        if cls._entries is None:
+            files = []
+            for directory, _, names in os.walk(settings.IMAGE_CACHE_DIR):
+                for name in names:
+                    if name.startswith("."):
+                        continue  # half-written temp files
+                    path = os.path.join(directory, name)
+                    stat = os.stat(path)
+                    files.append((stat.st_mtime, path, stat.st_size))
+            files.sort()
+            cls._entries = OrderedDict((path, size) for _, path, size in files)
+            cls._total = sum(size for _, _, size in files)
+            cls._evict()
+        return cls._entries
+
+    @classmethod
+    def _evict(cls) -> None:
+        while cls._total > settings.IMAGE_CACHE_MAX_BYTES and cls._entries:
+            path, size = cls._entries.popitem(last=False)
+            cls._total -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @classmethod
+    def lookup(cls, path: str) -> bool:
+        """Whether ``path`` is cached; marks it most recently used"""
+        with cls._lock:
+            entries = cls._load()
+            if path not in entries:
+                return False
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                cls._total -= entries.pop(path)
+                return False
+            entries.move_to_end(path)
+            return True
+
+    @classmethod
+    def add(cls, path: str) -> None:
+        with cls._lock:
+            entries = cls._load()
+            cls._total -= entries.pop(path, 0)
+            entries[path] = os.path.getsize(path)
+            cls._total += entries[path]
+            cls._evict()
+
+    @classmethod
+    def reset(cls) -> None:
+        with cls._lock:
+            cls._entries = None
+            cls._total = 0
+
+
+class ImageResizer:
+    """On-demand resizing of uploaded images for ``GET /img/{path}``.
+
+    A variant is identified by the source path, its size and modification
+    time, and the requested box and format, so replacing a file never serves
+    a stale variant. Misses render on the image worker pool; concurrent
+    requests for the same variant in this process wait on a single render
+    instead of each starting their own.
+    """
+
+    _inflight: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def source_path(path: str) -> Optional[str]:
+        """Absolute path of an uploaded file, or ``None`` if it is missing, outside ``UPLOAD_DIR`` or private"""
+        root = os.path.realpath(settings.UPLOAD_DIR)
+        source = os.path.realpath(os.path.join(root, path))
+        if not source.startswith(root + os.sep) or not os.path.isfile(source):
+            return None
+        parts = os.path.relpath(source, root).split(os.sep)
+        if parts[0] == RESUMABLE_FOLDER or any(part.startswith(".") for part in parts):
+            return None  # unfinished resumable uploads and files set aside for deletion
+        return source
+
+    @staticmethod
+    def cache_path(source: str, width: Optional[int], height: Optional[int], fmt: ResizeFormat) -> str:
+        stat = os.stat(source)
+        key = f"{source}|{stat.st_size}|{stat.st_mtime_ns}|{width}|{height}|{fmt.value}"
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        _, extension, _ = OUTPUTS[fmt]
+        return os.path.join(settings.IMAGE_CACHE_DIR, digest[:2], digest[2:] + extension)
+
+    @staticmethod
+    def default_format(source: str) -> ResizeFormat:
+        """Keep PNG/GIF/WebP sources lossless-capable, everything else becomes JPEG"""
+        extension = os.path.splitext(source)[1].lower()
+        if extension == ".webp":
+            return ResizeFormat.WEBP
+        if extension in (".png", ".gif"):
+            return ResizeFormat.PNG
+        return ResizeFormat.JPEG
+
+    @classmethod
+    async def resize(
+        cls, source: str, width: Optional[int], height: Optional[int], fmt: Optional[ResizeFormat]
+    ) -> Tuple[str, str]:
+        """Return ``(file path, media type)`` of the variant, rendering it if needed"""
+        fmt = fmt or cls.default_format(source)
+        target = cls.cache_path(source, width, height, fmt)
+        _, _, media_type = OUTPUTS[fmt]
+
+        if await asyncio.to_thread(ResizeCache.lookup, target):
+            return target, media_type
+
+        future = cls._inflight.get(target)
+        if future is None:
+            future = asyncio.ensure_future(cls._render(source, target, width, height, fmt))
+            cls._inflight[target] = future
+            future.add_done_callback(lambda _: cls._inflight.pop(target, None))
+        # shield: one client disconnecting must not cancel the render others are waiting on
+        await asyncio.shield(future)
+        return target, media_type
+
+    @staticmethod
+    async def _render(source: str, target: str, width: Optional[int], height: Optional[int], fmt: ResizeFormat) -> None:
+        executor = ImagePipeline.executor()
+        if executor is None:
+            await asyncio.to_thread(render_resized, source, target, width, height, fmt)
+        else:
+            await asyncio.wrap_future(executor.submit(render_resized, source, target, width, height, fmt))
+        await asyncio.to_thread(ResizeCache.add, target)
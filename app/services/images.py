@@ -0,0 +1,269 @@
+from concurrent.futures import Executor, ProcessPoolExecutor
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, List, NamedTuple, Optional
+import logging
+import os
+import tempfile
+import threading
+
+from PIL import Image, ImageOps
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.object_storage import get_storage
+from app.models.post import Post
+from app.services.colors import ColorIndex, color_histogram
+from app.services.visual_search import VisualIndex, image_embedding
+from app.utils.file_upload import get_file_url, storage_key
+
+
+PENDING = "pending"
+READY = "ready"
+FAILED = "failed"
+
+# Pillow format name and file extension of each derivative format
+FORMATS = {"jpeg": ("JPEG", ".jpg"), "webp": ("WEBP", ".webp")}
+
+logger = logging.getLogger(__name__)
+
+# Uploads are already checked against this from their header (app.utils.image_headers);
+# Pillow enforces it again on anything it decodes
+Image.MAX_IMAGE_PIXELS = settings.IMAGE_MAX_PIXELS
+
+
+class ImagePreference(NamedTuple):
+    """Which derivative a response should point at"""
+    width: int
+    webp: bool = False
+
+
+def new_entry(original: str) -> dict:
+    """Manifest entry for an image whose derivatives have not been rendered yet"""
+    return {"original": original, "status": PENDING, "width": None, "height": None, "variants": []}
+
+
+def manifest_for(urls: Iterable[str], current: Optional[List[dict]] = None) -> List[dict]:
+    """Manifest for ``urls`` in order, keeping the entries of images already in ``current``"""
+    existing = {entry["original"]: entry for entry in current or []}
+    return [existing.get(url) or new_entry(url) for url in urls]
+
+
+def originals(post: Post) -> List[str]:
+    """URLs of every uploaded image of a post, main first"""
+    return [entry["original"] for entry in post.images or ()] or [post.main_image]
+
+
+def public_entry(entry: dict) -> dict:
+    """Copy of a manifest entry with public file URLs (see ``get_file_url``)"""
+    return {
+        **entry,
+        "original": get_file_url(entry["original"]),
+        "variants": [{**variant, "url": get_file_url(variant["url"])} for variant in entry.get("variants", ())],
+    }
+
+
+def choose_variant(entry: dict, width: int, webp: bool) -> str:
+    """URL of the narrowest variant at least ``width`` wide, else the widest; the original until rendered"""
+    candidates = [variant for variant in entry.get("variants", ()) if variant["format"] == ("webp" if webp else "jpeg")]
+    if not candidates:
+        return entry["original"]
+    wide_enough = [variant for variant in candidates if variant["width"] >= width]
+    if wide_enough:
+        return min(wide_enough, key=lambda variant: variant["width"])["url"]
+    return max(candidates, key=lambda variant: variant["width"])["url"]
+
+
+def save_atomically(image: Image.Image, path: str, image_format: str, **params) -> None:
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".derivative-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            image.save(buffer, format=image_format, **params)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def store_rendered(image: Image.Image, key: str, image_format: str, **params) -> None:
+    """Encode ``image`` to a scratch file under ``UPLOAD_DIR`` and hand it to the storage backend"""
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=settings.UPLOAD_DIR, prefix=".derivative-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            image.save(buffer, format=image_format, **params)
+        get_storage().put_file(key, temp_path, Image.MIME[image_format])
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def render_derivatives(original: str, widths: List[int], formats: List[str]) -> dict:
+    """Render width-bounded JPEG/WebP copies of one uploaded image next to it.
+
+    Images are never upscaled: widths above the original collapse to the
+    original width. Each width is resized from the previous, larger one so
+    the full-size image is only resampled once. The color histogram for
+    search by color and the embedding for visually similar posts are taken
+    from the smallest one. Runs in a worker process.
+    """
+    key_stem, _ = os.path.splitext(storage_key(original))
+    url_stem, _ = os.path.splitext(original)
+
+    with get_storage().local_copy(storage_key(original)) as source, Image.open(source) as opened:
+        image = ImageOps.exif_transpose(opened)
+        image.load()
+    width, height = image.size
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    image = image.convert("RGBA" if has_alpha else "RGB")
+
+    variants = []
+    for target in sorted({min(w, width) for w in widths}, reverse=True):
+        target_height = max(1, round(height * target / width))
+        if image.width != target:
+            image = image.resize((target, target_height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        for name in formats:
+            image_format, extension = FORMATS[name]
+            if image_format == "JPEG":
+                output = image
+                if has_alpha:
+                    output = Image.new("RGB", image.size, (255, 255, 255))
+                    output.paste(image, mask=image.getchannel("A"))
+                params = {"quality": settings.IMAGE_JPEG_QUALITY, "optimize": True, "progressive": True}
+            else:
+                output = image
+                params = {"quality": settings.IMAGE_WEBP_QUALITY, "method": 4}
+            store_rendered(output, f"{key_stem}-{target}w{extension}", image_format, **params)
+            variants.append({
+                "url": f"{url_stem}-{target}w{extension}",
+                "width": target,
+                "height": target_height,
+                "format": name
+            })
+
+    variants.sort(key=lambda variant: (variant["format"], variant["width"]))
+    return {
+        "status": READY, "width": width, "height": height, "variants": variants,
+        "histogram": color_histogram(image), "embedding": image_embedding(image)
+    }
+
+
+class ImagePipeline:
+    """Renders image derivatives off the request path.
+
+    ``create_post`` and ``update_post`` record every image in the post's
+    ``images`` manifest as pending and hand the post to ``process_post`` as a
+    background task, so the upload returns before anything is resized. The
+    rendering itself runs in a process pool of ``IMAGE_WORKERS`` processes
+    (``0`` renders in the calling thread). Posts left pending by a restart
+    are picked up by ``python -m app.cli process-images``. The main image's
+    color histogram and embedding are stored for ``ColorIndex`` and
+    ``VisualIndex`` along the way.
+    """
+
+    _executor: Optional[Executor] = None
+    _executor_lock = threading.Lock()
+
+    @classmethod
+    def executor(cls) -> Optional[Executor]:
+        if settings.IMAGE_WORKERS <= 0:
+            return None
+        if cls._executor is None:
+            with cls._executor_lock:
+                if cls._executor is None:
+                    cls._executor = ProcessPoolExecutor(settings.IMAGE_WORKERS)
+        return cls._executor
+
+    @classmethod
+    def shutdown(cls) -> None:
+        if cls._executor is not None:
+            cls._executor.shutdown()
+            cls._executor = None
+
+    @classmethod
+    def render(cls, originals: List[str]) -> Dict[str, dict]:
+        """Render ``originals`` on the pool; an image that fails to render is marked failed"""
+        widths, formats = list(settings.IMAGE_DERIVATIVE_WIDTHS), list(FORMATS)
+        executor = cls.executor()
+        if executor is None:
+            jobs = [(original, None) for original in originals]
+        else:
+            jobs = [(original, executor.submit(render_derivatives, original, widths, formats)) for original in originals]
+
+        rendered = {}
+        for original, future in jobs:
+            try:
+                rendered[original] = future.result() if future else render_derivatives(original, widths, formats)
+            except Exception:
+                logger.exception("Rendering derivatives of %s failed", original)
+                rendered[original] = {"status": FAILED}
+        return rendered
+
+    @classmethod
+    def process_posts(cls, db: Session, post_ids: List[int]) -> int:
+        """Render every pending image of the given posts and store the results; return how many were rendered"""
+        posts = db.query(Post).filter(Post.id.in_(post_ids)).all()
+        pending = [entry["original"] for post in posts for entry in post.images or () if entry["status"] == PENDING]
+        if not pending:
+            return 0
+
+        rendered = cls.render(pending)
+        histograms = {original: result.pop("histogram", None) for original, result in rendered.items()}
+        embeddings = {original: result.pop("embedding", None) for original, result in rendered.items()}
+
+        # Posts may have been edited or deleted while rendering; only fill in images they still have
+        colors = {}
+        vectors = {}
+        for post in db.query(Post).filter(Post.id.in_(post_ids)).populate_existing():
+            if post.images:
+                post.images = [
+                    {**entry, **rendered[entry["original"]]} if entry["original"] in rendered else entry
+                    for entry in post.images
+                ]
+                main = post.images[0]["original"]
+                if histograms.get(main) is not None:
+                    colors[post.id] = histograms[main]
+                    ColorIndex.store(db, post.id, main, histograms[main])
+                if embeddings.get(main) is not None:
+                    vectors[post.id] = embeddings[main]
+                    VisualIndex.store(db, post.id, main, embeddings[main])
+        db.commit()
+        for post_id, histogram in colors.items():
+            ColorIndex.record(post_id, histogram)
+        for post_id, vector in vectors.items():
+            VisualIndex.record(post_id, vector)
+        return len(rendered)
+
+    @classmethod
+    def process_post(cls, post_id: int) -> int:
+        """Render one post's images in a session of its own, as a background task outlives the request's"""
+        db = SessionLocal()
+        try:
+            return cls.process_posts(db, [post_id])
+        finally:
+            db.close()
+
+    @classmethod
+    def process_pending(cls, db: Session, retry_failed: bool = False, batch_size: int = 100) -> int:
+        """Render the pending images of every post, ``batch_size`` posts at a time; return how many were rendered"""
+        statuses = {PENDING, FAILED} if retry_failed else {PENDING}
+        rendered = 0
+        last_id = 0
+        while True:
+            posts = db.query(Post).filter(Post.id > last_id).order_by(Post.id).limit(batch_size).all()
+            if not posts:
+                break
+            last_id = posts[-1].id
+            batch = []
+            for post in posts:
+                if any(entry["status"] in statuses for entry in post.images or ()):
+                    batch.append(post.id)
+                    if retry_failed:
+                        post.images = [
+                            new_entry(entry["original"]) if entry["status"] == FAILED else entry
+                            for entry in post.images
+                        ]
+            db.commit()
+            if batch:
+                rendered += cls.process_posts(db, batch)
+        return rendered
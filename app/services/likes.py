@@ -0,0 +1,90 @@
+from sqlalchemy import func, literal, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from typing import NamedTuple, Optional
+
+from app.models.outfit import Outfit, OutfitLike
+from app.models.post import Like, Post
+
+
+# Liked table, its like table and the like table's column pointing back at it, by kind
+LIKED = {
+    "posts": (Post.__table__, Like.__table__, "post_id"),
+    "outfits": (Outfit.__table__, OutfitLike.__table__, "outfit_id"),
+}
+
+
+class LikeResult(NamedTuple):
+    changed: bool  # False when the like already was (or was not) there
+    like_count: int
+
+
+def _insert(db: Session, table):
+    return (postgresql if db.get_bind().dialect.name == "postgresql" else sqlite).insert(table)
+
+
+class LikeService:
+    """Idempotent likes of posts and outfits, kept in step with ``like_count``.
+
+    The unique ``(user_id, post_id)`` / ``(user_id, outfit_id)`` indexes make
+    the database the judge of whether a like exists: ``like`` is an
+    ``INSERT ... ON CONFLICT DO NOTHING RETURNING`` and ``unlike`` a
+    ``DELETE ... RETURNING``, and the counter is only moved (atomically, by
+    ``like_count = like_count + 1``) when a row came back. On PostgreSQL
+    both steps and the read of the new count are one statement, using
+    data-modifying CTEs, so liking takes one round trip and concurrent
+    double-taps can neither duplicate a like nor drift the counter. SQLite
+    cannot modify data inside a CTE, so there the same statements run one
+    after another in the caller's transaction.
+
+    Both return ``None`` when the post or outfit does not exist. Neither
+    commits.
+    """
+
+    @staticmethod
+    def like(db: Session, kind: str, object_id: int, user_id: int) -> Optional[LikeResult]:
+        target, likes, key = LIKED[kind]
+        change = _insert(db, likes).from_select(
+            ["user_id", key],
+            select(literal(user_id), target.c.id).where(target.c.id == object_id)
+        ).on_conflict_do_nothing(index_elements=["user_id", key]).returning(likes.c[key])
+        return LikeService._apply(db, kind, object_id, change, 1)
+
+    @staticmethod
+    def unlike(db: Session, kind: str, object_id: int, user_id: int) -> Optional[LikeResult]:
+        _, likes, key = LIKED[kind]
+        change = likes.delete().where(
+            likes.c.user_id == user_id,
+            likes.c[key] == object_id
+        ).returning(likes.c[key])
+        return LikeService._apply(db, kind, object_id, change, -1)
+
+    @staticmethod
+    def _apply(db: Session, kind: str, object_id: int, change, step: int) -> Optional[LikeResult]:
+        target, _, key = LIKED[kind]
+        like_count = func.coalesce(target.c.like_count, 0)
+
+        if db.get_bind().dialect.name == "postgresql":
+            changed = change.cte("changed")
+            updated = target.update().where(
+                target.c.id.in_(select(changed.c[key]))
+            ).values(like_count=like_count + step).returning(target.c.like_count).cte("updated")
+            # The outer SELECT sees the table as it was before the statement, hence the COALESCE
+            row = db.execute(
+                select(
+                    select(func.count()).select_from(changed).scalar_subquery(),
+                    func.coalesce(select(updated.c.like_count).scalar_subquery(), like_count)
+                ).where(target.c.id == object_id)
+            ).first()
+            return None if row is None else LikeResult(bool(row[0]), row[1])
+
+        changed = db.execute(change).first() is not None
+        if changed:
+            count = db.execute(
+                target.update().where(target.c.id == object_id).values(
+                    like_count=like_count + step
+                ).returning(target.c.like_count)
+            ).scalar()
+        else:
+            count = db.execute(select(like_count).where(target.c.id == object_id)).scalar()
+        return None if count is None else LikeResult(changed, count)
@@ -4,6 +4,7 @@ from app.models.notification import Notification, NotificationType
 from app.models.user import User
 from app.models.post import Post, Like, Comment
 from app.models.outfit import Outfit
+from app.services.counting import CountService
 
 
 class NotificationService:
@@ -29,6 +30,7 @@ class NotificationService:
         db.add(notification)
         db.commit()
         db.refresh(notification)
+        CountService.invalidate(f"notifications:{notification.user_id}")
         
         return notification
     
@@ -58,6 +60,7 @@ class NotificationService:
         db.add(notification)
         db.commit()
         db.refresh(notification)
+        CountService.invalidate(f"notifications:{notification.user_id}")
         
         return notification
     
@@ -79,6 +82,7 @@ class NotificationService:
         db.add(notification)
         db.commit()
         db.refresh(notification)
+        CountService.invalidate(f"notifications:{notification.user_id}")
         
         return notification
     
@@ -103,6 +107,7 @@ class NotificationService:
         db.add(notification)
         db.commit()
         db.refresh(notification)
+        CountService.invalidate(f"notifications:{notification.user_id}")
         
         return notification
     
@@ -127,6 +132,7 @@ class NotificationService:
         db.add(notification)
         db.commit()
         db.refresh(notification)
+        CountService.invalidate(f"notifications:{notification.user_id}")
         
         return notification
     
@@ -145,6 +151,7 @@ class NotificationService:
         if notification:
             notification.is_read = True
             db.commit()
+            CountService.invalidate(f"notifications:{user_id}")
             return True
         
         return False
@@ -161,6 +168,7 @@ class NotificationService:
         ).update({"is_read": True})
         
         db.commit()
+        CountService.invalidate(f"notifications:{user_id}")
         return result
     
     @staticmethod
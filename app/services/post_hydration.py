@@ -0,0 +1,120 @@
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, List, Optional, Set
+
+from app.core.config import settings
+from app.models.user import User
+from app.models.post import Post, Like, Tag, PostTag
+from app.services.images import ImagePreference, choose_variant, new_entry, public_entry
+from app.services.unique_viewers import UniqueViewers
+from app.utils.file_upload import get_file_url
+
+
+POST_COLUMNS = [column.key for column in Post.__table__.columns]
+
+
+class PostHydrator:
+    """Build post response dicts for a whole page in a fixed number of queries.
+
+    Instead of lazily loading ``post.author``, ``post.tags`` -> ``tag.tag`` and
+    running one ``Like`` lookup per post, every page costs at most three
+    batched queries (authors, tag names, liked post ids) no matter how many
+    posts it holds, plus one Redis round trip for unique viewer counts.
+    """
+
+    @staticmethod
+    def load_authors(db: Session, author_ids: Iterable[int]) -> Dict[int, dict]:
+        """Fetch author summaries for a set of user ids"""
+        author_ids = set(author_ids)
+        if not author_ids:
+            return {}
+
+        rows = db.query(User.id, User.username, User.profile_picture).filter(
+            User.id.in_(author_ids)
+        ).all()
+
+        return {
+            row.id: {
+                'id': row.id,
+                'username': row.username,
+                'profile_picture': row.profile_picture
+            }
+            for row in rows
+        }
+
+    @staticmethod
+    def load_tags(db: Session, post_ids: Iterable[int]) -> Dict[int, List[str]]:
+        """Fetch tag names for a set of posts, keyed by post id"""
+        post_ids = set(post_ids)
+        if not post_ids:
+            return {}
+
+        rows = db.query(PostTag.post_id, Tag.name).join(
+            Tag, PostTag.tag_id == Tag.id
+        ).filter(
+            PostTag.post_id.in_(post_ids)
+        ).order_by(PostTag.id).all()
+
+        tags: Dict[int, List[str]] = {}
+        for post_id, name in rows:
+            tags.setdefault(post_id, []).append(name)
+        return tags
+
+    @staticmethod
+    def load_liked(db: Session, user_id: Optional[int], post_ids: Iterable[int]) -> Set[int]:
+        """Fetch the subset of post ids the user has liked"""
+        post_ids = set(post_ids)
+        if user_id is None or not post_ids:
+            return set()
+
+        rows = db.query(Like.post_id).filter(
+            Like.user_id == user_id,
+            Like.post_id.in_(post_ids)
+        ).all()
+
+        return {row.post_id for row in rows}
+
+    @staticmethod
+    def hydrate(
+        db: Session,
+        posts: List[Post],
+        current_user: Optional[User] = None,
+        image_preference: Optional[ImagePreference] = None
+    ) -> List[dict]:
+        """Return response dicts for ``posts`` in their original order"""
+        if not posts:
+            return []
+        image_preference = image_preference or ImagePreference(settings.IMAGE_DISPLAY_WIDTH)
+
+        post_ids = [post.id for post in posts]
+        authors = PostHydrator.load_authors(db, (post.author_id for post in posts))
+        tags = PostHydrator.load_tags(db, post_ids)
+        liked = PostHydrator.load_liked(
+            db, current_user.id if current_user else None, post_ids
+        )
+        unique_viewers = UniqueViewers.counts("posts", post_ids)
+
+        post_dicts = []
+        for post in posts:
+            post_dict = {key: getattr(post, key) for key in POST_COLUMNS}
+            post_dict['author'] = authors.get(post.author_id, {'id': post.author_id})
+            post_dict['tags'] = tags.get(post.id, [])
+            post_dict['is_liked'] = post.id in liked
+            post_dict['unique_viewers'] = unique_viewers[post.id]
+            images = [public_entry(entry) for entry in post.images or [new_entry(post.main_image)]]
+            post_dict['main_image'] = get_file_url(post.main_image)
+            post_dict['images'] = images
+            post_dict['additional_images'] = [entry['original'] for entry in images[1:]]
+            post_dict['display_image'] = choose_variant(images[0], *image_preference)
+            post_dicts.append(post_dict)
+
+        return post_dicts
+
+    @staticmethod
+    def hydrate_one(
+        db: Session,
+        post: Post,
+        current_user: Optional[User] = None,
+        image_preference: Optional[ImagePreference] = None
+    ) -> dict:
+        """Return the response dict for a single post"""
+        return PostHydrator.hydrate(db, [post], current_user, image_preference)[0]
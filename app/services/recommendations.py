@@ -0,0 +1,204 @@
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional, Set, Tuple
+import threading
+
+import numpy as np
+from scipy import sparse
+
+from app.models.user import user_followers
+from app.models.post import Post, PostTag, Like
+
+
+# Added to a post's tag affinity when the viewer follows its author
+FOLLOW_WEIGHT = 0.5
+
+
+class TagAffinityModel:
+    """Snapshot of the matrices behind recommendations, plus like deltas.
+
+    - ``post_tags``: public posts x tags, each row idf-weighted and L2-normalized
+    - ``user_tags``: users x tags, the sum of the rows of the posts each user liked
+    - ``likes``: users x posts, to leave out posts the user already liked
+
+    Likes recorded after the snapshot was built are kept in small per-user
+    deltas and folded in at scoring time.
+    """
+
+    def __init__(self, post_ids, author_ids, post_tags, user_ids, user_tags, likes):
+        self.post_ids: np.ndarray = post_ids  # sorted, so row lookups are a binary search
+        self.author_ids: np.ndarray = author_ids
+        self.post_tags: sparse.csr_matrix = post_tags
+        self.user_index: Dict[int, int] = {user_id: row for row, user_id in enumerate(user_ids)}
+        self.user_tags: sparse.csr_matrix = user_tags
+        self.likes: sparse.csr_matrix = likes
+        self.tag_deltas: Dict[int, sparse.csr_matrix] = {}
+        self.like_deltas: Dict[int, Dict[int, int]] = {}
+        self.lock = threading.Lock()
+
+    def post_row(self, post_id: int) -> Optional[int]:
+        row = int(np.searchsorted(self.post_ids, post_id))
+        if row < len(self.post_ids) and self.post_ids[row] == post_id:
+            return row
+        return None
+
+    def record_like(self, user_id: int, post_id: int, delta: int) -> None:
+        row = self.post_row(post_id)
+        if row is None:
+            return
+        with self.lock:
+            change = self.post_tags[row] * delta
+            current = self.tag_deltas.get(user_id)
+            self.tag_deltas[user_id] = change if current is None else current + change
+            liked = self.like_deltas.setdefault(user_id, {})
+            liked[row] = liked.get(row, 0) + delta
+
+    def affinity(self, user_id: int) -> np.ndarray:
+        """Unit-length tag-affinity vector for one user (zeros if they liked nothing)"""
+        vector = np.zeros(self.post_tags.shape[1])
+        row = self.user_index.get(user_id)
+        if row is not None:
+            vector += self.user_tags[row].toarray().ravel()
+        delta = self.tag_deltas.get(user_id)
+        if delta is not None:
+            vector += delta.toarray().ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def liked_rows(self, user_id: int) -> np.ndarray:
+        liked: Set[int] = set()
+        row = self.user_index.get(user_id)
+        if row is not None:
+            liked.update(self.likes[row].indices.tolist())
+        for post_row, count in self.like_deltas.get(user_id, {}).items():
+            if count > 0:
+                liked.add(post_row)
+            elif count < 0:
+                liked.discard(post_row)
+        return np.fromiter(liked, dtype=np.int64, count=len(liked))
+
+
+class RecommendationEngine:
+    """Tag-affinity recommendations scored with sparse matrix products.
+
+    A post's score for a user is the cosine similarity between the post's
+    tag vector and the user's affinity vector (the tags of everything they
+    liked), plus ``FOLLOW_WEIGHT`` for authors they follow. Every candidate
+    is scored at once with one sparse matrix-vector product, so the cost
+    does not grow with how many likes the user has. The snapshot is rebuilt at startup and
+    every ``RECOMMENDATIONS_REFRESH_SECONDS``; likes are applied in between.
+    """
+
+    _model: Optional[TagAffinityModel] = None
+    _build_lock = threading.Lock()
+
+    @classmethod
+    def build(cls, db: Session) -> None:
+        """(Re)build the matrices from the database and swap them in"""
+        posts = db.query(Post.id, Post.author_id).filter(Post.is_public == True).order_by(Post.id).all()
+        post_ids = np.array([row.id for row in posts], dtype=np.int64)
+        author_ids = np.array([row.author_id for row in posts], dtype=np.int64)
+
+        pairs = db.query(PostTag.post_id, PostTag.tag_id).join(
+            Post, Post.id == PostTag.post_id
+        ).filter(Post.is_public == True).all()
+        tag_ids = np.unique(np.array([pair.tag_id for pair in pairs], dtype=np.int64))
+        rows = np.searchsorted(post_ids, np.array([pair.post_id for pair in pairs], dtype=np.int64))
+        cols = np.searchsorted(tag_ids, np.array([pair.tag_id for pair in pairs], dtype=np.int64))
+        post_tags = sparse.csr_matrix(
+            (np.ones(len(pairs)), (rows, cols)), shape=(len(post_ids), len(tag_ids))
+        )
+        post_tags.sum_duplicates()
+        post_tags.data[:] = 1.0
+
+        # Rare tags say more about taste than ubiquitous ones
+        document_frequency = np.bincount(post_tags.indices, minlength=len(tag_ids))
+        idf = np.log((1 + len(post_ids)) / (1 + document_frequency)) + 1
+        post_tags = sparse.csr_matrix(post_tags @ sparse.diags(idf))
+        norms = np.sqrt(np.asarray(post_tags.multiply(post_tags).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        post_tags = sparse.csr_matrix(sparse.diags(1 / norms) @ post_tags)
+
+        like_pairs = db.query(Like.user_id, Like.post_id).join(
+            Post, Post.id == Like.post_id
+        ).filter(Post.is_public == True).all()
+        like_users = np.array([pair.user_id for pair in like_pairs], dtype=np.int64)
+        user_ids, user_rows = np.unique(like_users, return_inverse=True)
+        likes = sparse.csr_matrix(
+            (
+                np.ones(len(like_pairs)),
+                (user_rows, np.searchsorted(post_ids, np.array([pair.post_id for pair in like_pairs], dtype=np.int64)))
+            ),
+            shape=(len(user_ids), len(post_ids))
+        )
+        likes.sum_duplicates()
+        likes.data[:] = 1.0
+
+        cls._model = TagAffinityModel(
+            post_ids, author_ids, post_tags, user_ids.tolist(), sparse.csr_matrix(likes @ post_tags), likes
+        )
+
+    @classmethod
+    def ensure_built(cls, db: Session) -> TagAffinityModel:
+        if cls._model is None:
+            with cls._build_lock:
+                if cls._model is None:
+                    cls.build(db)
+        return cls._model
+
+    @classmethod
+    def reset(cls) -> None:
+        cls._model = None
+
+    @classmethod
+    def record_like(cls, user_id: int, post_id: int, delta: int = 1) -> None:
+        """Apply a committed like (``delta=1``) or unlike (``delta=-1``); ignored until built"""
+        if cls._model is not None:
+            cls._model.record_like(user_id, post_id, delta)
+
+    @classmethod
+    def scores(cls, db: Session, user_id: int) -> Tuple[TagAffinityModel, np.ndarray]:
+        """Score every candidate post for ``user_id``; excluded posts get ``-inf``"""
+        model = cls.ensure_built(db)
+        scores = model.post_tags @ model.affinity(user_id)
+
+        followed = [row.following_id for row in db.query(user_followers.c.following_id).filter(
+            user_followers.c.follower_id == user_id
+        )]
+        if followed:
+            scores += FOLLOW_WEIGHT * np.isin(model.author_ids, followed)
+
+        scores[model.author_ids == user_id] = -np.inf
+        scores[model.liked_rows(user_id)] = -np.inf
+        return model, scores
+
+    @classmethod
+    def recommend(
+        cls,
+        db: Session,
+        user_id: int,
+        limit: int,
+        offset: int = 0,
+        after: Optional[Tuple[float, int]] = None
+    ) -> List[Tuple[int, float]]:
+        """Top ``(post_id, score)`` pairs ordered by score then post id, both descending.
+
+        ``after`` is the ``(score, post_id)`` of the last item already served,
+        for keyset pagination; ``offset`` skips ranked items for page mode.
+        """
+        model, scores = cls.scores(db, user_id)
+        candidates = np.isfinite(scores)
+        if after is not None:
+            last_score, last_id = after
+            candidates &= (scores < last_score) | ((scores == last_score) & (model.post_ids < last_id))
+
+        rows = np.flatnonzero(candidates)
+        k = offset + limit
+        if k <= 0 or len(rows) == 0:
+            return []
+        if len(rows) > k:
+            # Partition down to the top k, keeping every row tied with the k-th score
+            threshold = np.partition(scores[rows], len(rows) - k)[len(rows) - k]
+            rows = rows[scores[rows] >= threshold]
+        order = np.lexsort((-model.post_ids[rows], -scores[rows]))
+        rows = rows[order][offset:k]
+        return [(int(model.post_ids[row]), float(scores[row])) for row in rows]
@@ -0,0 +1,195 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.orm import Session
+from typing import AsyncIterator, Optional
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import re
+import uuid
+
+from app.core.config import settings
+from app.core.object_storage import get_storage
+from app.services.storage import BlobStore, blob_key
+from app.utils.file_upload import delete_file
+from app.utils.image_headers import ImageHeader, InvalidImage, sniff_image_file, sniff_image_head
+
+
+RESUMABLE_FOLDER = "resumable"
+
+UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class UploadConflict(Exception):
+    """The client's offset is not where the upload stands (or another request is writing it)"""
+
+    def __init__(self, offset: int):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+
+class ResumableUploads:
+    """tus-style resumable uploads: create, append at an offset, finalize.
+
+    Each upload is a partial file ``UPLOAD_DIR/resumable/<id>.part`` plus a
+    small ``<id>.json`` with its owner, announced length and file extension.
+    The offset is simply the partial file's size: chunks are written to disk
+    as they arrive, so a request cut off mid-body keeps what it delivered and
+    the client resumes from there. Appends hold an exclusive ``flock`` on the
+    partial file, so two requests can never interleave writes. Finalizing
+    hashes the file and moves it into storage under its content address,
+    ready to be passed to ``create_post`` like a presigned upload.
+
+    The image header is validated as soon as enough of it has arrived; an
+    upload that is not an acceptable image is discarded right then, instead
+    of after the client has sent the rest.
+    """
+
+    @staticmethod
+    def _path(upload_id: str, suffix: str) -> str:
+        return os.path.join(settings.UPLOAD_DIR, RESUMABLE_FOLDER, f"{upload_id}{suffix}")
+
+    @staticmethod
+    def create(user_id: int, extension: str, length: int) -> dict:
+        upload_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(settings.UPLOAD_DIR, RESUMABLE_FOLDER), exist_ok=True)
+        info = {
+            "id": upload_id,
+            "user_id": user_id,
+            "extension": extension,
+            "length": length,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        open(ResumableUploads._path(upload_id, ".part"), "wb").close()
+        with open(ResumableUploads._path(upload_id, ".json"), "w") as file:
+            json.dump(info, file)
+        return {**info, "offset": 0}
+
+    @staticmethod
+    def get(upload_id: str, user_id: int) -> Optional[dict]:
+        """The upload with its current ``offset``, or ``None`` if there is no such upload of this user"""
+        if not UPLOAD_ID_PATTERN.match(upload_id):
+            return None
+        try:
+            with open(ResumableUploads._path(upload_id, ".json")) as file:
+                info = json.load(file)
+            offset = os.path.getsize(ResumableUploads._path(upload_id, ".part"))
+        except FileNotFoundError:
+            return None
+        if info["user_id"] != user_id:
+            return None
+        return {**info, "offset": offset}
+
+    @staticmethod
+    async def append(upload: dict, offset: int, chunks: AsyncIterator[bytes]) -> int:
+        """Write ``chunks`` at ``offset``; return the new offset.
+
+        Raises ``UploadConflict`` when ``offset`` is not the current one,
+        ``InvalidImage`` (discarding the upload) when its header is not an
+        acceptable image, and ``ValueError`` when the body runs past the
+        announced length (the bytes up to it are kept).
+        """
+        path = ResumableUploads._path(upload["id"], ".part")
+        try:
+            return await ResumableUploads._append(path, upload, offset, chunks)
+        except InvalidImage:
+            ResumableUploads.discard(upload["id"])
+            raise
+
+    @staticmethod
+    async def _append(path: str, upload: dict, offset: int, chunks: AsyncIterator[bytes]) -> int:
+        header = None
+        with open(path, "ab+") as file:
+            try:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise UploadConflict(os.path.getsize(path))
+            current = os.fstat(file.fileno()).st_size
+            if offset != current:
+                raise UploadConflict(current)
+            try:
+                async for chunk in chunks:
+                    room = upload["length"] - current
+                    if len(chunk) > room:
+                        await asyncio.to_thread(file.write, chunk[:room])
+                        current += room
+                        raise ValueError("Upload exceeds its announced length")
+                    await asyncio.to_thread(file.write, chunk)
+                    current += len(chunk)
+                    if header is None:
+                        header = await asyncio.to_thread(ResumableUploads._check_head, file, upload, current)
+            finally:
+                # Whatever arrived is kept, even if the connection dropped mid-chunk
+                await asyncio.to_thread(file.flush)
+                await asyncio.to_thread(os.fsync, file.fileno())
+        return current
+
+    @staticmethod
+    def _check_head(file, upload: dict, current: int) -> Optional[ImageHeader]:
+        file.flush()
+        head = os.pread(file.fileno(), settings.IMAGE_SNIFF_MAX_BYTES, 0)
+        return sniff_image_head(head, complete=current == upload["length"])
+
+    @staticmethod
+    def finalize(db: Session, upload: dict) -> str:
+        """Move a complete upload into storage under its content address; return the storage key.
+
+        The content is registered as an unreferenced blob first, so it is
+        swept if no post ever uses it.
+        """
+        path = ResumableUploads._path(upload["id"], ".part")
+        with open(path, "rb") as file:
+            try:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise UploadConflict(os.path.getsize(path))
+            size = os.fstat(file.fileno()).st_size
+            if size != upload["length"]:
+                raise UploadConflict(size)
+            try:
+                header = sniff_image_file(file)
+            except InvalidImage:
+                ResumableUploads.discard(upload["id"])
+                raise
+            digest = hashlib.sha256()
+            for chunk in iter(lambda: file.read(settings.UPLOAD_CHUNK_SIZE), b""):
+                digest.update(chunk)
+
+            key = blob_key(digest.hexdigest(), header.extension)
+            BlobStore.register(db, digest.hexdigest(), header.extension, size)
+            db.commit()
+            storage = get_storage()
+            if storage.size(key) is None:
+                storage.put_file(key, path)
+        ResumableUploads.discard(upload["id"])
+        return key
+
+    @staticmethod
+    def discard(upload_id: str) -> None:
+        delete_file(ResumableUploads._path(upload_id, ".part"))
+        delete_file(ResumableUploads._path(upload_id, ".json"))
+
+    @staticmethod
+    def expire(db: Optional[Session] = None) -> int:
+        """Remove uploads started more than ``RESUMABLE_UPLOAD_EXPIRE_HOURS`` ago; return how many"""
+        folder = os.path.join(settings.UPLOAD_DIR, RESUMABLE_FOLDER)
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=settings.RESUMABLE_UPLOAD_EXPIRE_HOURS)
+        try:
+            names = os.listdir(folder)
+        except FileNotFoundError:
+            return 0
+        expired = 0
+        for name in names:
+            upload_id, extension = os.path.splitext(name)
+            if extension != ".json":
+                continue
+            try:
+                with open(os.path.join(folder, name)) as file:
+                    created_at = datetime.fromisoformat(json.load(file)["created_at"])
+            except (FileNotFoundError, ValueError, KeyError):
+                continue
+            if created_at < cutoff:
+                ResumableUploads.discard(upload_id)
+                expired += 1
+        return expired
@@ -0,0 +1,104 @@
+from sqlalchemy import Float, cast, column, false, func, literal_column, table, text
+from sqlalchemy.orm import Query, Session
+from typing import Tuple
+import re
+
+from app.models.post import Post
+
+
+# Postgres: title outranks brand/store, which outrank the description
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(brand, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(store_name, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'C')"
+)
+
+# SQLite: bm25 column weights in posts_fts column order (title, description, brand, store_name)
+FTS_WEIGHTS = (10.0, 2.0, 5.0, 5.0)
+
+posts_fts = table("posts_fts", column("rowid"))
+
+FTS_INSERT_SQL = (
+    "INSERT INTO posts_fts (rowid, title, description, brand, store_name) "
+    "SELECT id, title, coalesce(description, ''), coalesce(brand, ''), coalesce(store_name, '') "
+    "FROM posts"
+)
+
+
+class PostSearchIndex:
+    """Full-text index over post title, description, brand and store name.
+
+    Postgres keeps a weighted ``tsvector`` in ``posts.search_vector`` (GIN
+    indexed) and ranks with ``ts_rank``. SQLite mirrors the text into the
+    ``posts_fts`` FTS5 table and ranks with ``bm25``, so tests and local dev
+    match the same words. Callers update the index in the same transaction as
+    the post write.
+    """
+
+    @staticmethod
+    def index_post(db: Session, post_id: int) -> None:
+        """(Re)index a single post after it was created or updated"""
+        db.flush()
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(
+                text(f"UPDATE posts SET search_vector = {SEARCH_VECTOR_SQL} WHERE id = :id"),
+                {"id": post_id}
+            )
+        else:
+            db.execute(text("DELETE FROM posts_fts WHERE rowid = :id"), {"id": post_id})
+            db.execute(text(FTS_INSERT_SQL + " WHERE id = :id"), {"id": post_id})
+
+    @staticmethod
+    def remove_post(db: Session, post_id: int) -> None:
+        """Drop a deleted post from the index"""
+        if db.get_bind().dialect.name != "postgresql":
+            db.execute(text("DELETE FROM posts_fts WHERE rowid = :id"), {"id": post_id})
+
+    @staticmethod
+    def reindex(db: Session, batch_size: int = 1000) -> int:
+        """Rebuild the whole index in id-range batches, committing each batch"""
+        postgres = db.get_bind().dialect.name == "postgresql"
+        if not postgres:
+            db.execute(text("DELETE FROM posts_fts"))
+
+        max_id = db.query(func.max(Post.id)).scalar() or 0
+        for start in range(0, max_id, batch_size):
+            params = {"start": start, "end": start + batch_size}
+            if postgres:
+                db.execute(text(
+                    f"UPDATE posts SET search_vector = {SEARCH_VECTOR_SQL} "
+                    "WHERE id > :start AND id <= :end"
+                ), params)
+            else:
+                db.execute(text(FTS_INSERT_SQL + " WHERE id > :start AND id <= :end"), params)
+            db.commit()
+
+        db.commit()
+        return db.query(func.count(Post.id)).scalar()
+
+    @staticmethod
+    def search(db: Session, query: Query, q: str) -> Tuple[Query, object]:
+        """Restrict ``query`` to posts matching ``q``; return it with a rank expression (higher is better).
+
+        The rank is a double on both dialects, so a rank read into a cursor
+        compares equal to the same row's rank when the next page is fetched.
+        """
+        if db.get_bind().dialect.name == "postgresql":
+            tsquery = func.websearch_to_tsquery("english", q)
+            search_vector = literal_column("posts.search_vector")
+            query = query.filter(search_vector.op("@@")(tsquery))
+            # ts_rank is a real (float4); a cursor's float64 copy of it would not match it on ties
+            return query, cast(func.ts_rank(search_vector, tsquery), Float)
+
+        fts = literal_column("posts_fts")
+        match = PostSearchIndex.fts5_query(q)
+        query = query.join(posts_fts, posts_fts.c.rowid == Post.id).filter(
+            fts.op("MATCH")(match) if match else false()
+        )
+        return query, -func.bm25(fts, *FTS_WEIGHTS)
+
+    @staticmethod
+    def fts5_query(q: str) -> str:
+        """Turn free text into an FTS5 query that ANDs each quoted word"""
+        return " ".join(f'"{word}"' for word in re.findall(r"\w+", q))
@@ -0,0 +1,137 @@
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy.orm import Session
+from typing import Iterator, List, Optional, Tuple
+import os
+
+import numpy as np
+from scipy import sparse
+
+from app.core.config import settings
+from app.models.post import Like, PostNeighbor
+
+
+# Set in each worker process by _init_worker, so the matrices are shipped once per worker
+_post_users: Optional[sparse.csr_matrix] = None
+_user_posts: Optional[sparse.csr_matrix] = None
+
+
+def _init_worker(post_users: sparse.csr_matrix, user_posts: sparse.csr_matrix) -> None:
+    global _post_users, _user_posts
+    _post_users, _user_posts = post_users, user_posts
+
+
+def neighbors_for_rows(start: int, end: int, top_k: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Top-K co-like neighbors of post rows ``[start, end)``.
+
+    Co-like counts for the chunk are one sparse product (posts x users times
+    users x posts); dividing by ``sqrt(likes_a * likes_b)`` turns them into
+    cosine similarities. Returns parallel ``(rows, neighbor_rows, scores)``
+    arrays ordered by row, then score descending.
+    """
+    block = (_post_users[start:end] @ _user_posts).tocsr()
+    like_counts = np.diff(_post_users.indptr).astype(np.float64)
+    rows = np.repeat(np.arange(start, end), np.diff(block.indptr))
+    block.data = block.data / np.sqrt(like_counts[rows] * like_counts[block.indices])
+    block.data[block.indices == rows] = 0  # a post is not its own neighbor
+    block.eliminate_zeros()
+
+    out_rows: List[np.ndarray] = []
+    out_neighbors: List[np.ndarray] = []
+    out_scores: List[np.ndarray] = []
+    for offset in range(end - start):
+        lo, hi = block.indptr[offset], block.indptr[offset + 1]
+        if lo == hi:
+            continue
+        neighbors, scores = block.indices[lo:hi], block.data[lo:hi]
+        if hi - lo > top_k:
+            # Keep everything tied with the k-th score so ties break on post id, not at random
+            threshold = np.partition(scores, hi - lo - top_k)[hi - lo - top_k]
+            keep = scores >= threshold
+            neighbors, scores = neighbors[keep], scores[keep]
+        order = np.lexsort((neighbors, -scores))[:top_k]
+        out_rows.append(np.full(len(order), start + offset))
+        out_neighbors.append(neighbors[order])
+        out_scores.append(scores[order])
+
+    if not out_rows:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, np.array([], dtype=np.float64)
+    return np.concatenate(out_rows), np.concatenate(out_neighbors), np.concatenate(out_scores)
+
+
+class SimilarPostsJob:
+    """Offline "people who liked this also liked" neighbors.
+
+    Builds a binary users x posts matrix from ``likes``, computes each post's
+    top-K cosine neighbors in chunks of rows spread over a process pool, and
+    replaces the contents of ``post_neighbors`` in one transaction so readers
+    never see a half-written table. Run it from cron or a scheduler with
+    ``python -m app.cli compute-similar``.
+    """
+
+    @staticmethod
+    def like_matrix(db: Session) -> Tuple[np.ndarray, sparse.csr_matrix]:
+        """Return ``(post_ids, posts x users)`` for every post with a like"""
+        pairs = np.array(db.query(Like.post_id, Like.user_id).all(), dtype=np.int64).reshape(-1, 2)
+        post_ids, post_rows = np.unique(pairs[:, 0], return_inverse=True)
+        _, user_cols = np.unique(pairs[:, 1], return_inverse=True)
+        matrix = sparse.csr_matrix(
+            (np.ones(len(pairs), dtype=np.float32), (post_rows, user_cols)),
+            shape=(len(post_ids), int(user_cols.max()) + 1 if len(pairs) else 0)
+        )
+        matrix.sum_duplicates()
+        matrix.data[:] = 1
+        return post_ids, matrix
+
+    @staticmethod
+    def compute(
+        post_users: sparse.csr_matrix,
+        top_k: int = 20,
+        chunk_size: int = 2000,
+        workers: int = 1
+    ) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """Yield ``neighbors_for_rows`` results chunk by chunk, in row order"""
+        user_posts = post_users.T.tocsr()
+        total = post_users.shape[0]
+        chunks = [(start, min(start + chunk_size, total)) for start in range(0, total, chunk_size)]
+
+        if workers <= 1:
+            _init_worker(post_users, user_posts)
+            for start, end in chunks:
+                yield neighbors_for_rows(start, end, top_k)
+            return
+
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(post_users, user_posts)) as pool:
+            futures = [pool.submit(neighbors_for_rows, start, end, top_k) for start, end in chunks]
+            for future in futures:
+                yield future.result()
+
+    @staticmethod
+    def run(
+        db: Session,
+        top_k: Optional[int] = None,
+        chunk_size: int = 2000,
+        workers: Optional[int] = None,
+        batch_size: int = 10000
+    ) -> int:
+        """Recompute every post's neighbors; return how many rows were written"""
+        post_ids, post_users = SimilarPostsJob.like_matrix(db)
+        top_k = top_k or settings.SIMILAR_POSTS_TOP_K
+        workers = workers if workers is not None else (os.cpu_count() or 1)
+
+        written = 0
+        db.query(PostNeighbor).delete(synchronize_session=False)
+        for rows, neighbor_rows, scores in SimilarPostsJob.compute(post_users, top_k, chunk_size, workers):
+            # Rank within each post: rows arrive grouped and already score-ordered
+            starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]]) if len(rows) else rows
+            ranks = np.arange(len(rows)) - np.repeat(starts, np.diff(np.r_[starts, len(rows)]))
+            mappings = [
+                {"post_id": int(post_id), "rank": int(rank), "neighbor_id": int(neighbor_id), "score": float(score)}
+                for post_id, rank, neighbor_id, score in zip(post_ids[rows], ranks, post_ids[neighbor_rows], scores)
+            ]
+            for i in range(0, len(mappings), batch_size):
+                db.bulk_insert_mappings(PostNeighbor, mappings[i:i + batch_size])
+            written += len(mappings)
+
+        db.commit()
+        return written
@@ -0,0 +1,214 @@
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import event, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from typing import Iterable, List, Optional
+import logging
+import mimetypes
+import os
+import re
+import uuid
+
+from app.core.config import settings
+from app.core.object_storage import StorageError, get_storage
+from app.models.storage import Blob
+from app.utils.file_upload import StagedUpload, delete_file, get_file_extension
+from app.utils.image_headers import InvalidImage, sniff_image
+
+
+BLOB_FOLDER = "blobs"
+
+BLOB_URL_PATTERN = re.compile(rf"^/uploads/{BLOB_FOLDER}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/([0-9a-f]{{64}})\.[^/]*$")
+
+# Rendered derivatives stored next to a blob (see app.services.images)
+DERIVATIVE_PATTERN = re.compile(r"-\d+w\.\w+$")
+
+# Session.info key holding files moved aside by release() until the transaction ends
+RECLAIM_KEY = "storage_reclaim"
+
+logger = logging.getLogger(__name__)
+
+
+def blob_key(sha256: str, extension: str) -> str:
+    """``blobs/ab/cd/abcd....jpg``: two levels of 256 directories keep each one small"""
+    return f"{BLOB_FOLDER}/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}"
+
+
+def blob_url(sha256: str, extension: str) -> str:
+    return f"/uploads/{blob_key(sha256, extension)}"
+
+
+def blob_digest(url: str) -> Optional[str]:
+    """SHA-256 of the blob behind ``url``, or ``None`` for files stored before content addressing"""
+    match = BLOB_URL_PATTERN.match(url or "")
+    return match.group(1) if match else None
+
+
+def _insert(db: Session):
+    return (postgresql if db.get_bind().dialect.name == "postgresql" else sqlite).insert(Blob)
+
+
+class BlobStore:
+    """Content-addressed upload storage with reference counting.
+
+    Every upload is hashed while it streams to disk and kept once in the
+    storage backend, under its SHA-256 (``blob_key``), however many posts use
+    it (direct uploads are presigned for that key too); rendered derivatives
+    sit next to it and are shared the same way. ``blobs.ref_count`` counts
+    the post images pointing at each blob and changes in the same transaction
+    as the posts themselves:
+
+    - ``store`` bumps the count with an upsert before moving new content into
+      place, so the row lock it holds until commit keeps a concurrent release
+      from deleting the blob underneath it
+    - ``release`` decrements, deletes rows that reach zero and moves their
+      files aside; they are unlinked once the transaction commits, and moved
+      back if it rolls back
+    - ``register`` records content stored before any post uses it
+      (presigned and resumable uploads) with no references; ``sweep``
+      reclaims those still unused after ``UNREFERENCED_BLOB_HOURS``
+
+    URLs that are not blobs (uploads from before this layout) are left alone.
+    Storage calls block, so async endpoints run these, and any commit that
+    follows a ``release``, through ``asyncio.to_thread``.
+    """
+
+    @staticmethod
+    def store(db: Session, staged: List[StagedUpload]) -> List[str]:
+        """Take a reference to each staged upload's blob, storing content seen for the first time; return URLs"""
+        storage = get_storage()
+        urls = []
+        for upload in staged:
+            statement = _insert(db).values(
+                sha256=upload.sha256, extension=upload.extension, size=upload.size, ref_count=1
+            )
+            statement = statement.on_conflict_do_update(
+                index_elements=[Blob.sha256], set_={"ref_count": Blob.ref_count + 1}
+            ).returning(Blob.extension)
+            extension = db.execute(statement).scalar_one()
+
+            key = blob_key(upload.sha256, extension)
+            if upload.temp_path is None:
+                pass  # uploaded straight to storage
+            elif storage.size(key) is not None:
+                delete_file(upload.temp_path)  # already stored: the duplicate costs nothing
+            else:
+                storage.put_file(key, upload.temp_path, mimetypes.guess_type(key)[0])
+            urls.append(f"/uploads/{key}")
+        return urls
+
+    @staticmethod
+    def uploaded(key: str) -> Optional[StagedUpload]:
+        """A file a client uploaded straight to storage under a presigned ``key``, or ``None`` if it isn't there.
+
+        Only the leading bytes are fetched, to check the content is an image
+        of the format its extension names (raises ``InvalidImage`` if not).
+        """
+        digest = blob_digest(f"/uploads/{key}")
+        extension = get_file_extension(key).lower()
+        if digest is None or extension not in settings.ALLOWED_EXTENSIONS:
+            return None
+        storage = get_storage()
+        size = storage.size(key)
+        if size is None:
+            return None
+        header = sniff_image(lambda length: storage.read(key, length) or b"")
+        if header.extension != extension:
+            raise InvalidImage(f"Content is {header.format}, not {extension}")
+        return StagedUpload(None, digest, size, extension)
+
+    @staticmethod
+    def register(db: Session, sha256: str, extension: str, size: int) -> None:
+        """Record content about to be stored for a post not created yet, with no references.
+
+        Registering it again restarts its ``UNREFERENCED_BLOB_HOURS`` while
+        nothing references it. Call before storing the file, so it never
+        exists without a row.
+        """
+        statement = _insert(db).values(sha256=sha256, extension=extension, size=size, ref_count=0)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[Blob.sha256],
+            set_={"created_at": func.now()},
+            where=Blob.ref_count <= 0
+        ))
+
+    @staticmethod
+    def sweep(db: Session) -> int:
+        """Reclaim registered blobs no post took a reference to in time; return how many"""
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=settings.UNREFERENCED_BLOB_HOURS)
+        orphans = db.execute(
+            Blob.__table__.delete().where(
+                Blob.ref_count <= 0,
+                Blob.created_at < cutoff
+            ).returning(Blob.sha256, Blob.extension)
+        ).all()
+        BlobStore._reclaim(db, orphans)
+        db.commit()
+        return len(orphans)
+
+    @staticmethod
+    def retain(db: Session, urls: Iterable[str]) -> None:
+        """Take another reference to each blob in ``urls`` (e.g. an image moved between posts)"""
+        for digest, count in Counter(filter(None, map(blob_digest, urls))).items():
+            db.query(Blob).filter(Blob.sha256 == digest).update(
+                {Blob.ref_count: Blob.ref_count + count}, synchronize_session=False
+            )
+
+    @staticmethod
+    def release(db: Session, urls: Iterable[str]) -> None:
+        """Drop a reference to each blob in ``urls``; blobs nobody references are reclaimed on commit"""
+        counts = Counter(filter(None, map(blob_digest, urls)))
+        if not counts:
+            return
+        for digest, count in counts.items():
+            db.query(Blob).filter(Blob.sha256 == digest).update(
+                {Blob.ref_count: Blob.ref_count - count}, synchronize_session=False
+            )
+        orphans = db.execute(
+            Blob.__table__.delete().where(
+                Blob.sha256.in_(list(counts)),
+                Blob.ref_count <= 0
+            ).returning(Blob.sha256, Blob.extension)
+        ).all()
+        BlobStore._reclaim(db, orphans)
+
+    @staticmethod
+    def _reclaim(db: Session, orphans) -> None:
+        """Move the files of deleted blob rows aside, to be removed on commit"""
+        storage = get_storage()
+        moved = db.info.setdefault(RECLAIM_KEY, [])
+        for orphan in orphans:
+            key = blob_key(orphan.sha256, orphan.extension)
+            directory = os.path.dirname(key)
+            derivatives = [
+                found for found in storage.list(f"{directory}/{orphan.sha256}-")
+                if DERIVATIVE_PATTERN.search(found)
+            ]
+            for original in [key, *derivatives]:
+                aside = f"{directory}/.reclaim-{uuid.uuid4().hex}"
+                try:
+                    storage.rename(original, aside)
+                except (FileNotFoundError, StorageError):
+                    continue
+                moved.append((original, aside))
+
+
+@event.listens_for(Session, "after_commit")
+def _reclaim_released(session: Session) -> None:
+    storage = get_storage()
+    for _, aside in session.info.pop(RECLAIM_KEY, ()):
+        try:
+            storage.delete(aside)
+        except (OSError, StorageError):
+            logger.exception("Could not remove released blob file %s", aside)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _restore_released(session: Session, transaction) -> None:
+    if transaction.parent is not None:
+        return
+    # Still queued: the transaction rolled back (or was closed), so the rows are back
+    storage = get_storage()
+    for original, aside in reversed(session.info.pop(RECLAIM_KEY, ())):
+        storage.rename(aside, original)
@@ -0,0 +1,89 @@
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+from typing import Optional
+import enum
+
+
+class MatchMode(str, enum.Enum):
+    CONTAINS = "contains"
+    PREFIX = "prefix"
+    SIMILAR = "similar"
+
+
+def escape_like(value: str) -> str:
+    """Escape LIKE wildcards so user input matches literally"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def prefix_upper_bound(prefix: str) -> Optional[str]:
+    """Smallest string greater than every string starting with ``prefix``"""
+    for i in range(len(prefix) - 1, -1, -1):
+        if ord(prefix[i]) < 0x10FFFF:
+            return prefix[:i] + chr(ord(prefix[i]) + 1)
+    return None
+
+
+class TextLookup:
+    """Indexed name lookups for usernames, tag names and brands.
+
+    - ``contains``: substring ILIKE. Postgres serves it from a pg_trgm GIN index.
+    - ``prefix``: case-insensitive prefix match on ``lower(column)``, served by
+      an expression index on both Postgres (``text_pattern_ops``) and SQLite.
+    - ``similar``: typo-tolerant trigram similarity (``%`` operator, ranked by
+      ``similarity()``) on Postgres. SQLite has no trigrams, so it falls back
+      to a prefix match that ranks the shortest completion first.
+    """
+
+    @staticmethod
+    def is_postgres(db: Session) -> bool:
+        return db.get_bind().dialect.name == "postgresql"
+
+    @staticmethod
+    def contains(column, q: str):
+        """Case-insensitive substring match"""
+        return column.ilike(f"%{escape_like(q)}%", escape="\\")
+
+    @staticmethod
+    def prefix(db: Session, column, q: str):
+        """Case-insensitive prefix match using the lower(column) index"""
+        normalized = func.lower(column)
+        q = q.lower()
+        if TextLookup.is_postgres(db):
+            return normalized.like(f"{escape_like(q)}%", escape="\\")
+
+        # SQLite only applies the LIKE optimization to plain columns, so express
+        # the prefix as a range over the expression index instead
+        upper = prefix_upper_bound(q)
+        if upper is None:
+            return normalized >= q
+        return and_(normalized >= q, normalized < upper)
+
+    @staticmethod
+    def similar(db: Session, column, q: str):
+        """Filter for values similar to ``q``"""
+        if TextLookup.is_postgres(db):
+            return column.op("%")(q)
+        return TextLookup.prefix(db, column, q)
+
+    @staticmethod
+    def similarity(db: Session, column, q: str):
+        """Ranking expression for ``similar`` matches; higher is closer"""
+        if TextLookup.is_postgres(db):
+            return func.similarity(column, q)
+        return -func.length(column)
+
+    @staticmethod
+    def best_similarity(db: Session, columns, q: str):
+        """Ranking expression across several columns; the closest one wins"""
+        if TextLookup.is_postgres(db):
+            return func.greatest(*[func.similarity(column, q) for column in columns])
+        return TextLookup.similarity(db, columns[0], q)
+
+    @staticmethod
+    def match(db: Session, column, q: str, mode: MatchMode):
+        """Filter ``column`` against ``q`` using ``mode``"""
+        if mode == MatchMode.PREFIX:
+            return TextLookup.prefix(db, column, q)
+        if mode == MatchMode.SIMILAR:
+            return TextLookup.similar(db, column, q)
+        return TextLookup.contains(column, q)
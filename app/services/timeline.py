@@ -0,0 +1,215 @@
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+from typing import Callable, List, Optional, Set
+import heapq
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.redis import get_redis
+from app.models.user import user_followers
+from app.models.post import Post
+
+
+CELEBRITIES_KEY = "timeline:celebrities"
+
+# Member kept at score 0 in every materialized list; its presence means the
+# list was built from the database and is complete up to its cap
+SENTINEL = 0
+
+FANOUT_BATCH_SIZE = 1000
+
+
+def timeline_key(user_id: int) -> str:
+    return f"timeline:{user_id}"
+
+
+def outbox_key(author_id: int) -> str:
+    return f"outbox:{author_id}"
+
+
+class HomeTimeline:
+    """Materialized home timelines: fan-out on write, celebrities merged on read.
+
+    Every user has a capped Redis sorted set of post ids (scored by id, so
+    newest first) holding recent public posts by the authors they follow and
+    their own. Creating a post pushes its id into each follower's set. Authors
+    with at least ``TIMELINE_FANOUT_MAX_FOLLOWERS`` followers are skipped at
+    write time; their posts are read from the author's own capped outbox and
+    merged in when the feed is read. A page therefore costs a few
+    ``ZREVRANGEBYSCORE`` calls, independent of how many accounts the user
+    follows. Lists missing from Redis (new users, a flushed cache) are rebuilt
+    from the database on first read. When an author drops back under the
+    limit, their outbox is pushed to their followers before their posts stop
+    being merged in.
+
+    Fan-out queries every follower, so endpoints hand ``publish``,
+    ``follow`` and ``unfollow`` to ``run`` as background tasks.
+    """
+
+    @staticmethod
+    def run(job: Callable[..., object], *args) -> None:
+        """Run ``job(db, *args)`` in a session of its own, as a background task outlives the request's"""
+        db = SessionLocal()
+        try:
+            job(db, *args)
+        finally:
+            db.close()
+
+    @staticmethod
+    def celebrities() -> Set[int]:
+        return {int(member) for member in get_redis().smembers(CELEBRITIES_KEY)}
+
+    @staticmethod
+    def follower_count(db: Session, author_id: int) -> int:
+        return db.query(func.count()).select_from(user_followers).filter(
+            user_followers.c.following_id == author_id
+        ).scalar()
+
+    @staticmethod
+    def update_celebrity(db: Session, author_id: int) -> bool:
+        """Re-check whether ``author_id`` is past the fan-out limit; return whether they are"""
+        redis = get_redis()
+        if HomeTimeline.follower_count(db, author_id) >= settings.TIMELINE_FANOUT_MAX_FOLLOWERS:
+            redis.sadd(CELEBRITIES_KEY, author_id)
+            return True
+        if author_id in HomeTimeline.celebrities():
+            HomeTimeline._backfill(db, author_id)
+            redis.srem(CELEBRITIES_KEY, author_id)
+        return False
+
+    @staticmethod
+    def refresh_celebrities(db: Session) -> None:
+        """Recompute the celebrity set from follower counts"""
+        rows = db.query(user_followers.c.following_id).group_by(user_followers.c.following_id).having(
+            func.count() >= settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+        ).all()
+        current = {row.following_id for row in rows}
+        redis = get_redis()
+        stale = HomeTimeline.celebrities() - current
+        if stale:
+            for author_id in stale:
+                HomeTimeline._backfill(db, author_id)
+            redis.srem(CELEBRITIES_KEY, *stale)
+        if current:
+            redis.sadd(CELEBRITIES_KEY, *current)
+
+    @staticmethod
+    def _push(pipe, key: str, post_ids: List[int]) -> None:
+        """Queue adding ``post_ids`` to a capped list, keeping the sentinel and the newest entries"""
+        if post_ids:
+            pipe.zadd(key, {post_id: post_id for post_id in post_ids})
+        pipe.zremrangebyrank(key, 1, -(settings.TIMELINE_MAX_LENGTH + 2))
+
+    @staticmethod
+    def _fan_out(db: Session, author_id: int, post_ids: List[int]) -> None:
+        """Push ``post_ids`` into the timeline of every follower of ``author_id``"""
+        followers = db.query(user_followers.c.follower_id).filter(
+            user_followers.c.following_id == author_id
+        ).yield_per(FANOUT_BATCH_SIZE)
+        pipe = get_redis().pipeline(transaction=False)
+        queued = 0
+        for row in followers:
+            HomeTimeline._push(pipe, timeline_key(row.follower_id), post_ids)
+            queued += 1
+            if queued % FANOUT_BATCH_SIZE == 0:
+                pipe.execute()
+        pipe.execute()
+
+    @staticmethod
+    def _backfill(db: Session, author_id: int) -> None:
+        """Push the recent posts of an author leaving the celebrity set, which were merged on read, to followers"""
+        post_ids = HomeTimeline._outbox(db, author_id, "+inf", settings.TIMELINE_MAX_LENGTH)
+        if post_ids:
+            HomeTimeline._fan_out(db, author_id, post_ids)
+
+    @staticmethod
+    def publish(db: Session, post_id: int, author_id: int) -> None:
+        """Push a newly public post to its author's outbox and followers' timelines"""
+        pipe = get_redis().pipeline(transaction=False)
+        HomeTimeline._push(pipe, outbox_key(author_id), [post_id])
+        HomeTimeline._push(pipe, timeline_key(author_id), [post_id])
+        pipe.execute()
+
+        if author_id not in HomeTimeline.celebrities():
+            HomeTimeline._fan_out(db, author_id, [post_id])
+
+    @staticmethod
+    def retract(post_id: int, author_id: int) -> None:
+        """Drop a deleted post from its author's outbox; timelines skip it when read"""
+        get_redis().zrem(outbox_key(author_id), post_id)
+
+    @staticmethod
+    def follow(db: Session, follower_id: int, author_id: int) -> None:
+        """Backfill a newly followed author's recent posts into the follower's timeline"""
+        if HomeTimeline.update_celebrity(db, author_id):
+            return
+        redis = get_redis()
+        if redis.zscore(timeline_key(follower_id), SENTINEL) is None:
+            return  # rebuilt from the database, follow included, on next read
+        post_ids = HomeTimeline._outbox(db, author_id, "+inf", settings.TIMELINE_MAX_LENGTH)
+        pipe = redis.pipeline(transaction=False)
+        HomeTimeline._push(pipe, timeline_key(follower_id), post_ids)
+        pipe.execute()
+
+    @staticmethod
+    def unfollow(db: Session, follower_id: int, author_id: int) -> None:
+        """Remove an unfollowed author's recent posts from the follower's timeline"""
+        HomeTimeline.update_celebrity(db, author_id)
+        post_ids = HomeTimeline._outbox(db, author_id, "+inf", settings.TIMELINE_MAX_LENGTH)
+        if post_ids:
+            get_redis().zrem(timeline_key(follower_id), *post_ids)
+
+    @staticmethod
+    def _rebuild(db: Session, key: str, query) -> None:
+        post_ids = [row.id for row in query.order_by(Post.id.desc()).limit(settings.TIMELINE_MAX_LENGTH)]
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.zadd(key, {SENTINEL: 0})
+        HomeTimeline._push(pipe, key, post_ids)
+        pipe.execute()
+
+    @staticmethod
+    def _outbox(db: Session, author_id: int, before: str, limit: int) -> List[int]:
+        key = outbox_key(author_id)
+        redis = get_redis()
+        if redis.zscore(key, SENTINEL) is None:
+            HomeTimeline._rebuild(db, key, db.query(Post.id).filter(
+                Post.author_id == author_id,
+                Post.is_public == True
+            ))
+        return [int(member) for member in redis.zrevrangebyscore(key, before, 1, start=0, num=limit)]
+
+    @staticmethod
+    def page(db: Session, user_id: int, before_id: Optional[int], limit: int) -> List[int]:
+        """Newest post ids in the user's home feed that are older than ``before_id``"""
+        redis = get_redis()
+        key = timeline_key(user_id)
+        celebrities = HomeTimeline.celebrities()
+        if redis.zscore(key, SENTINEL) is None:
+            followed = db.query(user_followers.c.following_id).filter(
+                user_followers.c.follower_id == user_id
+            )
+            if celebrities:
+                followed = followed.filter(user_followers.c.following_id.notin_(celebrities))
+            HomeTimeline._rebuild(db, key, db.query(Post.id).filter(
+                or_(Post.author_id == user_id, Post.author_id.in_(followed)),
+                Post.is_public == True
+            ))
+
+        before = f"({before_id}" if before_id is not None else "+inf"
+        sources = [[int(member) for member in redis.zrevrangebyscore(key, before, 1, start=0, num=limit)]]
+
+        if celebrities:
+            followed_celebrities = db.query(user_followers.c.following_id).filter(
+                user_followers.c.follower_id == user_id,
+                user_followers.c.following_id.in_(celebrities)
+            ).all()
+            for row in followed_celebrities:
+                sources.append(HomeTimeline._outbox(db, row.following_id, before, limit))
+
+        merged: List[int] = []
+        for post_id in heapq.merge(*sources, reverse=True):
+            if not merged or merged[-1] != post_id:
+                merged.append(post_id)
+            if len(merged) == limit:
+                break
+        return merged
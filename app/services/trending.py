@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.orm import Session
+from typing import List
+import math
+
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.models.post import Post, PostTrendingScore
+
+
+DIRTY_KEY = "trending:dirty"
+
+# Relative worth of each kind of engagement
+VIEW_WEIGHT = 1.0
+LIKE_WEIGHT = 4.0
+COMMENT_WEIGHT = 6.0
+
+
+def as_utc(value: datetime) -> datetime:
+    """SQLite hands back naive datetimes; they are stored in UTC"""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+class TrendingService:
+    """Precomputed, time-decayed trending scores.
+
+    A post's trending weight is ``engagement * 2 ** (-age / half_life)``. That
+    is ranked by its logarithm, ``log2(1 + engagement) + created_at /
+    half_life``, which does not change as time passes: only posts whose
+    engagement changed need rescoring. Write paths mark those posts dirty in
+    Redis and ``refresh`` (run on a schedule) rescores just them into the
+    indexed ``post_trending_scores`` table, so the trending endpoint is a
+    range read over ``(score, post_id)``. Posts older than the trending
+    window, private posts and deleted posts drop out of the table.
+    """
+
+    @staticmethod
+    def mark(*post_ids: int) -> None:
+        """Queue posts for rescoring after their engagement or visibility changed"""
+        if post_ids:
+            get_redis().sadd(DIRTY_KEY, *post_ids)
+
+    @staticmethod
+    def remove(db: Session, post_id: int) -> None:
+        """Drop a post from trending right away, e.g. in the transaction that makes it private"""
+        db.query(PostTrendingScore).filter(
+            PostTrendingScore.post_id == post_id
+        ).delete(synchronize_session=False)
+
+    @staticmethod
+    def score(created_at: datetime, view_count: int, like_count: int, comment_count: int) -> float:
+        engagement = (
+            VIEW_WEIGHT * (view_count or 0)
+            + LIKE_WEIGHT * (like_count or 0)
+            + COMMENT_WEIGHT * (comment_count or 0)
+        )
+        half_life = settings.TRENDING_HALF_LIFE_HOURS * 3600
+        return math.log2(1 + engagement) + as_utc(created_at).timestamp() / half_life
+
+    @staticmethod
+    def cutoff() -> datetime:
+        return datetime.now(timezone.utc) - timedelta(days=settings.TRENDING_WINDOW_DAYS)
+
+    @staticmethod
+    def refresh(db: Session, full: bool = False, batch_size: int = 500) -> int:
+        """Rescore dirty posts (or every post in the window with ``full``); return how many were rescored"""
+        redis = get_redis()
+        if full:
+            ids = [row.id for row in db.query(Post.id).filter(Post.created_at >= TrendingService.cutoff())]
+            batches = (ids[i:i + batch_size] for i in range(0, len(ids), batch_size))
+        else:
+            batches = iter(lambda: [int(member) for member in redis.spop(DIRTY_KEY, batch_size)], [])
+
+        rescored = 0
+        for post_ids in batches:
+            try:
+                TrendingService._rescore(db, post_ids)
+                db.commit()
+            except Exception:
+                db.rollback()
+                if not full:
+                    redis.sadd(DIRTY_KEY, *post_ids)
+                raise
+            rescored += len(post_ids)
+
+        TrendingService.prune(db)
+        return rescored
+
+    @staticmethod
+    def _rescore(db: Session, post_ids: List[int]) -> None:
+        db.query(PostTrendingScore).filter(
+            PostTrendingScore.post_id.in_(post_ids)
+        ).delete(synchronize_session=False)
+
+        cutoff = TrendingService.cutoff()
+        rows = db.query(
+            Post.id, Post.created_at, Post.view_count, Post.like_count, Post.comment_count
+        ).filter(Post.id.in_(post_ids), Post.is_public == True).all()
+        db.bulk_insert_mappings(PostTrendingScore, [
+            {
+                "post_id": row.id,
+                "score": TrendingService.score(row.created_at, row.view_count, row.like_count, row.comment_count),
+                "created_at": row.created_at
+            }
+            for row in rows
+            if row.created_at is not None and as_utc(row.created_at) >= cutoff
+        ])
+
+    @staticmethod
+    def prune(db: Session) -> None:
+        """Drop scores for posts that aged out of the window or no longer exist"""
+        db.query(PostTrendingScore).filter(
+            PostTrendingScore.created_at < TrendingService.cutoff()
+        ).delete(synchronize_session=False)
+        # Postgres cascades post deletes; SQLite does not enforce foreign keys
+        if db.get_bind().dialect.name != "postgresql":
+            db.query(PostTrendingScore).filter(
+                ~PostTrendingScore.post_id.in_(db.query(Post.id))
+            ).delete(synchronize_session=False)
+        db.commit()
@@ -0,0 +1,117 @@
+from collections import defaultdict
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+import time
+import uuid
+
+from app.core.redis import get_redis
+from app.models.outfit import Outfit
+from app.models.post import Post
+from app.services.trending import TrendingService
+
+
+# Tables whose view_count is buffered, by the name their views are recorded under
+COUNTED = {"posts": Post, "outfits": Outfit}
+
+FLUSH_LOCK_KEY = "views:flush-lock"
+FLUSHED_AT_KEY = "views:flushed-at"
+
+# A flusher that dies holding the lock blocks the others for at most this long
+FLUSH_LOCK_SECONDS = 300
+
+
+def buffer_key(kind: str) -> str:
+    """Redis hash of id -> views not yet written to the database"""
+    return f"views:{kind}"
+
+
+def flushing_key(kind: str) -> str:
+    """Where a buffer is moved while it is being written"""
+    return f"views:{kind}:flushing"
+
+
+class ViewCounter:
+    """Buffered view counts for posts and outfits.
+
+    Reads only count a view in Redis (``HINCRBY`` on a per-table hash), so
+    the hottest read path never takes a row lock. ``flush`` runs every
+    ``VIEW_COUNT_FLUSH_SECONDS`` in each worker, but only one worker flushes
+    at a time: it renames the hash aside, so views keep landing in a fresh
+    one, applies it with one ``UPDATE ... SET view_count = view_count + n
+    WHERE id IN (...)`` per distinct ``n``, commits, then drops the renamed
+    hash. Buffered views live in Redis, so restarting workers loses none; a
+    flush that fails or dies leaves its hash in place for the next one to
+    apply, and only a crash between its commit and the drop counts a batch
+    twice. Workers also flush on shutdown, which bounds the loss to one
+    interval when ``REDIS_ENABLED`` is off.
+    """
+
+    @staticmethod
+    def record(kind: str, object_id: int) -> int:
+        """Count one view; return how many views of it are buffered, this one included"""
+        return int(get_redis().hincrby(buffer_key(kind), object_id, 1))
+
+    @staticmethod
+    def flush(db: Session, batch_size: int = 1000) -> int:
+        """Write buffered views to the database; return how many were written"""
+        redis = get_redis()
+        token = uuid.uuid4().hex
+        if not redis.set(FLUSH_LOCK_KEY, token, ex=FLUSH_LOCK_SECONDS, nx=True):
+            return 0  # another worker is flushing
+        try:
+            flushed = 0
+            for kind in COUNTED:
+                pending = flushing_key(kind)
+                # Left behind by a flush that failed: apply it before taking the next one
+                if redis.exists(pending):
+                    flushed += ViewCounter._apply(db, kind, batch_size)
+                if redis.exists(buffer_key(kind)):
+                    redis.rename(buffer_key(kind), pending)
+                    flushed += ViewCounter._apply(db, kind, batch_size)
+            redis.set(FLUSHED_AT_KEY, time.time())
+            return flushed
+        finally:
+            if redis.get(FLUSH_LOCK_KEY) == token.encode():
+                redis.delete(FLUSH_LOCK_KEY)
+
+    @staticmethod
+    def _apply(db: Session, kind: str, batch_size: int) -> int:
+        redis = get_redis()
+        views = {int(object_id): int(count) for object_id, count in redis.hgetall(flushing_key(kind)).items()}
+        by_count = defaultdict(list)
+        for object_id in sorted(views):
+            if views[object_id] > 0:
+                by_count[views[object_id]].append(object_id)
+
+        table = COUNTED[kind].__table__
+        try:
+            for count, ids in by_count.items():
+                for i in range(0, len(ids), batch_size):
+                    db.execute(
+                        table.update().where(table.c.id.in_(ids[i:i + batch_size])).values(
+                            view_count=func.coalesce(table.c.view_count, 0) + count
+                        )
+                    )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        redis.delete(flushing_key(kind))
+        if kind == "posts":
+            TrendingService.mark(*views)
+        return sum(views.values())
+
+    @staticmethod
+    def stats() -> dict:
+        """``pending``: ids with buffered views per table; ``flush_lag_seconds``: since the last completed flush.
+
+        The lag is ``None`` until the first flush. Flushes run (and reset it)
+        every interval even with nothing to write, so a lag well past
+        ``VIEW_COUNT_FLUSH_SECONDS`` means counts are falling behind.
+        """
+        redis = get_redis()
+        flushed_at = redis.get(FLUSHED_AT_KEY)
+        return {
+            "pending": {kind: redis.hlen(buffer_key(kind)) + redis.hlen(flushing_key(kind)) for kind in COUNTED},
+            "flush_lag_seconds": None if flushed_at is None else max(0.0, time.time() - float(flushed_at)),
+        }
@@ -0,0 +1,381 @@
+from concurrent.futures import Executor
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from typing import Iterable, List, Optional, Tuple
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+from scipy import sparse
+
+from app.core.config import settings
+from app.core.object_storage import get_storage
+from app.models.post import Post, PostEmbedding
+from app.services.colors import BINS, color_histogram, srgb_to_lab
+from app.utils.file_upload import storage_key
+
+
+# Features are taken from a square copy this many pixels across
+EMBEDDING_SIZE = 64
+
+# Mean Lab color of each cell of a GRID x GRID layout
+GRID = 4
+
+# Edge orientation histograms (ORIENTATIONS bins over 180 degrees) per quadrant
+ORIENTATIONS = 8
+QUADRANTS = 4
+
+DIMENSIONS = BINS + GRID * GRID * 3 + QUADRANTS * ORIENTATIONS
+
+# Relative weight of each part of the embedding: color histogram, layout, texture
+BLOCK_WEIGHTS = (1.0, 0.6, 0.8)
+
+# Below this many posts every query scans the whole matrix, which is then faster than probing lists
+EXACT_SEARCH_MAX_ROWS = 4096
+
+# Posts sampled to train the IVF centroids
+TRAINING_SAMPLE = 50000
+
+logger = logging.getLogger(__name__)
+
+
+def _unit(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def _opaque(image: Image.Image) -> Image.Image:
+    """``image`` as RGB, transparent areas on white like the JPEG derivatives"""
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def image_embedding(image: Image.Image) -> np.ndarray:
+    """``DIMENSIONS`` unit-length float32s describing how ``image`` looks; closer images have a larger dot product.
+
+    Three pooled descriptors of a ``EMBEDDING_SIZE`` square copy, each
+    normalized and weighted by ``BLOCK_WEIGHTS``: the square root of the
+    color histogram from ``color_histogram``, the mean Lab color of each cell
+    of a ``GRID`` x ``GRID`` layout, and a histogram of edge orientations
+    (weighted by edge strength) per quadrant for texture such as stripes or
+    checks.
+    """
+    small = _opaque(image).resize((EMBEDDING_SIZE, EMBEDDING_SIZE), Image.Resampling.BOX)
+    lab = srgb_to_lab(np.asarray(small))
+
+    colors = np.sqrt(color_histogram(small))
+
+    cell = EMBEDDING_SIZE // GRID
+    layout = lab.reshape(GRID, cell, GRID, cell, 3).mean(axis=(1, 3)).ravel()
+
+    gradient_y, gradient_x = np.gradient(lab[..., 0])
+    magnitude = np.hypot(gradient_x, gradient_y)
+    orientation = np.minimum((np.arctan2(gradient_y, gradient_x) % np.pi) * ORIENTATIONS / np.pi, ORIENTATIONS - 1)
+    half = np.arange(EMBEDDING_SIZE) * 2 // EMBEDDING_SIZE
+    quadrant = half[:, None] * 2 + half[None, :]
+    texture = np.sqrt(np.bincount(
+        (quadrant * ORIENTATIONS + orientation.astype(np.int64)).ravel(),
+        weights=magnitude.ravel(),
+        minlength=QUADRANTS * ORIENTATIONS
+    ))
+
+    blocks = [_unit(block) * weight for block, weight in zip((colors, layout, texture), BLOCK_WEIGHTS)]
+    return _unit(np.concatenate(blocks)).astype(np.float32)
+
+
+def embedding_of(original: str) -> np.ndarray:
+    """``image_embedding`` of a stored ``/uploads/...`` image; runs in a worker process"""
+    with get_storage().local_copy(storage_key(original)) as source, Image.open(source) as image:
+        image.draft("RGB", (EMBEDDING_SIZE * 2, EMBEDDING_SIZE * 2))  # JPEGs decode at a fraction of their size
+        return image_embedding(image)
+
+
+def spherical_kmeans(vectors: np.ndarray, clusters: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """``clusters`` unit-length centroids of unit-length ``vectors``, by cosine k-means"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        members = sparse.csr_matrix(
+            (np.ones(len(vectors), dtype=np.float32), (assignment, np.arange(len(vectors)))),
+            shape=(clusters, len(vectors))
+        )
+        sums = np.asarray(members @ vectors)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # A centroid nobody picked keeps its place
+        centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids).astype(np.float32)
+    return centroids
+
+
+class EmbeddingMatrix:
+    """Growable rows x ``DIMENSIONS`` float32 matrix mapped from a scratch file, with a post id per row.
+
+    The file is created unlinked in ``EMBEDDING_DIR``, so the vectors live in
+    the page cache rather than on the Python heap and nothing is left behind.
+    Rows are only ever appended: a post whose embedding changes gets a new
+    row and the old one is marked dead. Growing extends the file and maps it
+    again; searches still holding the previous mapping keep reading it.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        os.makedirs(settings.EMBEDDING_DIR, exist_ok=True)
+        self._file = tempfile.TemporaryFile(dir=settings.EMBEDDING_DIR, prefix="embeddings-")
+        self.rows = 0
+        self.capacity = 0
+        self.vectors = np.empty((0, DIMENSIONS), dtype=np.float32)
+        self.post_ids = np.empty(0, dtype=np.int64)
+        self.live = np.empty(0, dtype=bool)
+        self._grow(max(capacity, 1))
+
+    def _grow(self, capacity: int) -> None:
+        self._file.truncate(capacity * DIMENSIONS * 4)
+        vectors = np.memmap(self._file, dtype=np.float32, mode="r+", shape=(capacity, DIMENSIONS))
+        post_ids = np.zeros(capacity, dtype=np.int64)
+        live = np.zeros(capacity, dtype=bool)
+        post_ids[:self.rows], live[:self.rows] = self.post_ids[:self.rows], self.live[:self.rows]
+        self.vectors, self.post_ids, self.live, self.capacity = vectors, post_ids, live, capacity
+
+    def append(self, post_ids: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        """Add rows; return their row numbers"""
+        count = len(post_ids)
+        if self.rows + count > self.capacity:
+            self._grow(max(self.capacity * 2, self.rows + count))
+        rows = np.arange(self.rows, self.rows + count)
+        self.vectors[rows] = vectors
+        self.post_ids[rows] = post_ids
+        self.live[rows] = True
+        self.rows += count
+        return rows
+
+
+class IVFIndex:
+    """Approximate nearest neighbors by inverted file (IVF) over an ``EmbeddingMatrix``.
+
+    ``spherical_kmeans`` centroids split the vectors into about sqrt(n)
+    lists, each vector filed under its closest centroid. A query scores the
+    centroids, then only the vectors in its ``probes`` closest lists: a few
+    percent of the matrix, at the risk of missing neighbors filed in a list
+    it did not probe (see ``benchmark``). Inserts go to the list of their
+    closest centroid; centroids are only retrained by building a new index.
+    With fewer than ``EXACT_SEARCH_MAX_ROWS`` vectors every query is exact.
+    """
+
+    def __init__(self, post_ids: Iterable[int], vectors: np.ndarray, lists: Optional[int] = None):
+        post_ids = np.asarray(post_ids, dtype=np.int64)
+        self.matrix = EmbeddingMatrix(len(post_ids) + len(post_ids) // 4 + 1)
+        self.matrix.append(post_ids, vectors)
+        self.rows_of = {int(post_id): row for row, post_id in enumerate(post_ids)}
+        self._lock = threading.Lock()
+
+        if lists is None:
+            lists = 0 if len(post_ids) < EXACT_SEARCH_MAX_ROWS else round(math.sqrt(len(post_ids)))
+        self.centroids: Optional[np.ndarray] = None
+        self.lists: List[np.ndarray] = []
+        self.inserted: List[List[int]] = []
+        if lists:
+            self._train(lists)
+
+    def _train(self, lists: int) -> None:
+        vectors = self.matrix.vectors[:self.matrix.rows]
+        sample = np.random.default_rng(0).choice(len(vectors), min(len(vectors), TRAINING_SAMPLE), replace=False)
+        self.centroids = spherical_kmeans(np.asarray(vectors[np.sort(sample)]), lists)
+        assignment = np.concatenate([
+            np.argmax(vectors[start:start + 10000] @ self.centroids.T, axis=1)
+            for start in range(0, len(vectors), 10000)
+        ])
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.searchsorted(assignment[order], np.arange(lists + 1))
+        self.lists = [order[bounds[i]:bounds[i + 1]] for i in range(lists)]
+        self.inserted = [[] for _ in range(lists)]
+
+    def __len__(self) -> int:
+        return len(self.rows_of)
+
+    def insert(self, post_id: int, vector: np.ndarray) -> None:
+        """Add or replace a post's vector"""
+        with self._lock:
+            row = int(self.matrix.append(np.array([post_id]), vector[None, :])[0])
+            previous = self.rows_of.get(post_id)
+            if previous is not None:
+                self.matrix.live[previous] = False
+            self.rows_of[post_id] = row
+            if self.centroids is not None:
+                self.inserted[int(np.argmax(self.centroids @ vector))].append(row)
+
+    def vector(self, post_id: int) -> Optional[np.ndarray]:
+        row = self.rows_of.get(post_id)
+        return None if row is None else np.array(self.matrix.vectors[row])
+
+    def search(self, query: np.ndarray, k: int, probes: Optional[int] = None) -> List[Tuple[int, float]]:
+        """``(post_id, similarity)`` of the ``k`` closest vectors found, most similar first"""
+        with self._lock:
+            matrix = self.matrix
+            vectors, post_ids, live, total = matrix.vectors, matrix.post_ids, matrix.live, matrix.rows
+            if self.centroids is None:
+                rows = np.arange(total)
+            else:
+                probes = min(probes or settings.VISUAL_INDEX_PROBES, len(self.lists))
+                closest = np.argpartition(-(self.centroids @ query), probes - 1)[:probes]
+                rows = np.concatenate(
+                    [self.lists[i] for i in closest] + [np.array(self.inserted[i], dtype=np.int64) for i in closest]
+                )
+        rows = rows[live[rows]]
+        if not len(rows):
+            return []
+        scores = vectors[rows] @ query
+        if len(rows) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.lexsort((post_ids[rows], -scores))
+        return [(int(post_ids[rows[i]]), float(scores[i])) for i in order]
+
+
+class VisualIndex:
+    """"More like this" by how post main images look.
+
+    The image pipeline stores an ``image_embedding`` of each post's main
+    image in ``post_embeddings`` as it renders the derivatives. Lookups go
+    to an in-process ``IVFIndex`` loaded on first use and rebuilt (and
+    retrained) every ``VISUAL_INDEX_REFRESH_SECONDS``; embeddings stored by
+    this process are inserted in between.
+    """
+
+    _index: Optional[IVFIndex] = None
+    _build_lock = threading.Lock()
+
+    @classmethod
+    def build(cls, db: Session) -> None:
+        """(Re)load every embedding from ``post_embeddings`` and swap a freshly trained index in"""
+        post_ids = []
+        chunks = []
+        for row in db.query(PostEmbedding.post_id, PostEmbedding.vector).order_by(PostEmbedding.post_id).yield_per(10000):
+            post_ids.append(row.post_id)
+            chunks.append(row.vector)
+        vectors = np.frombuffer(b"".join(chunks), dtype=np.float32).reshape(-1, DIMENSIONS)
+        cls._index = IVFIndex(post_ids, vectors)
+
+    @classmethod
+    def ensure_built(cls, db: Session) -> IVFIndex:
+        if cls._index is None:
+            with cls._build_lock:
+                if cls._index is None:
+                    cls.build(db)
+        return cls._index
+
+    @classmethod
+    def reset(cls) -> None:
+        cls._index = None
+
+    @staticmethod
+    def store(db: Session, post_id: int, image: str, vector: np.ndarray) -> None:
+        """Save a post's embedding in the caller's transaction; ``record`` it once committed"""
+        db.merge(PostEmbedding(post_id=post_id, image=image, vector=vector.astype(np.float32).tobytes()))
+
+    @classmethod
+    def record(cls, post_id: int, vector: np.ndarray) -> None:
+        """Insert a committed embedding into the index; ignored until it is built"""
+        index = cls._index
+        if index is not None:
+            index.insert(post_id, vector.astype(np.float32))
+
+    @classmethod
+    def similar(cls, db: Session, post_id: int, k: int) -> List[Tuple[int, float]]:
+        """Up to ``k`` other posts that look most like ``post_id`` as ``(post_id, similarity)``, closest first"""
+        index = cls.ensure_built(db)
+        vector = index.vector(post_id)
+        if vector is None:
+            # Stored by another process since the index was loaded, or not rendered yet
+            stored = db.query(PostEmbedding.vector).filter(PostEmbedding.post_id == post_id).scalar()
+            if stored is None:
+                return []
+            vector = np.frombuffer(stored, dtype=np.float32)
+        return [match for match in index.search(vector, k + 1) if match[0] != post_id][:k]
+
+    @classmethod
+    def backfill(cls, db: Session, executor: Optional[Executor] = None, batch_size: int = 100) -> int:
+        """Compute embeddings for posts without one for their current main image; return how many"""
+        stored = 0
+        last_id = 0
+        while True:
+            posts = db.query(Post.id, Post.main_image).outerjoin(
+                PostEmbedding, PostEmbedding.post_id == Post.id
+            ).filter(
+                Post.id > last_id,
+                or_(PostEmbedding.post_id.is_(None), PostEmbedding.image != Post.main_image)
+            ).order_by(Post.id).limit(batch_size).all()
+            if not posts:
+                return stored
+            last_id = posts[-1].id
+
+            originals = [post.main_image for post in posts]
+            if executor is None:
+                jobs = [(original, None) for original in originals]
+            else:
+                jobs = [(original, executor.submit(embedding_of, original)) for original in originals]
+            vectors = {}
+            for post, (original, future) in zip(posts, jobs):
+                try:
+                    vectors[post.id] = future.result() if future else embedding_of(original)
+                except Exception:
+                    logger.exception("Embedding of %s failed", original)
+                    continue
+                cls.store(db, post.id, original, vectors[post.id])
+            db.commit()
+            for post_id, vector in vectors.items():
+                cls.record(post_id, vector)
+            stored += len(vectors)
+
+
+def synthetic_embeddings(count: int, clusters: Optional[int] = None, spread: float = 1.0, seed: int = 0) -> np.ndarray:
+    """Unit vectors scattered around random centers (one per 50 by default), a stand-in for a catalog of look-alikes"""
+    rng = np.random.default_rng(seed)
+    clusters = clusters or max(1, count // 50)
+    centers = rng.standard_normal((clusters, DIMENSIONS))
+    vectors = centers[rng.integers(0, clusters, count)] + spread * rng.standard_normal((count, DIMENSIONS))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def benchmark(vectors: np.ndarray, queries: int = 200, k: int = 10, probes: Iterable[int] = (1, 4, 8, 16, 32)) -> List[dict]:
+    """Recall@``k`` against exact search and per-query latency of an ``IVFIndex`` over ``vectors``, per probe count.
+
+    Queries are vectors of the index itself, each looking for its ``k``
+    other nearest neighbors, as ``VisualIndex.similar`` does.
+    """
+    started = time.perf_counter()
+    index = IVFIndex(np.arange(len(vectors)), vectors, lists=max(1, round(math.sqrt(len(vectors)))))
+    build_seconds = time.perf_counter() - started
+
+    picks = np.random.default_rng(1).choice(len(vectors), min(queries, len(vectors)), replace=False)
+    exact = []
+    for pick in picks:
+        scores = vectors @ vectors[pick]
+        scores[pick] = -np.inf
+        exact.append(set(np.argpartition(-scores, k - 1)[:k].tolist()))
+
+    results = []
+    for probe_count in probes:
+        latencies = []
+        found = 0
+        for pick, expected in zip(picks, exact):
+            started = time.perf_counter()
+            matches = index.search(vectors[pick], k + 1, probes=probe_count)
+            latencies.append(time.perf_counter() - started)
+            found += len(expected & {post_id for post_id, _ in matches if post_id != pick})
+        latencies = np.array(latencies) * 1000
+        results.append({
+            "probes": probe_count,
+            "recall": found / (len(picks) * k),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "build_seconds": build_seconds,
+        })
+    return results
@@ -0,0 +1,88 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.main import app
+from app.core.database import get_db, Base
+from app.api.v1.endpoints import notifications
+from app.api.v1.endpoints.notifications import create_notification
+from app.models.notification import NotificationType
+from app.core.redis import get_redis
+
+
+# Test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+
+app.dependency_overrides[get_db] = override_get_db
+client = TestClient(app)
+
+# The notifications router is not mounted in the MVP API (app/api/v1/api.py),
+# so it is exercised on an app of its own
+notifications_app = FastAPI()
+notifications_app.include_router(notifications.router, prefix="/api/v1/notifications")
+notifications_app.dependency_overrides[get_db] = override_get_db
+notifications_client = TestClient(notifications_app)
+
+
+@pytest.fixture(autouse=True)
+def setup_database():
+    Base.metadata.create_all(bind=engine)
+    get_redis().flushall()
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+def register(username):
+    """Register and log in a user, returning (user id, auth headers)"""
+    email = f"{username}@example.com"
+    user = client.post("/api/v1/auth/register", json={
+        "email": email, "username": username, "password": "testpassword123"
+    }).json()
+    token = client.post("/api/v1/auth/login", json={
+        "email": email, "password": "testpassword123"
+    }).json()["access_token"]
+    return user["id"], {"Authorization": f"Bearer {token}"}
+
+
+def test_notification_totals_follow_count_strategy():
+    """Test exact and cached notification totals, and that writes invalidate the cached one"""
+    user_id, headers = register("follower")
+    db = TestingSessionLocal()
+    try:
+        ids = [
+            create_notification(db, user_id, NotificationType.SYSTEM, f"Note {i}", "Hello").id
+            for i in range(3)
+        ]
+    finally:
+        db.close()
+
+    def total(strategy, unread_only=False):
+        response = notifications_client.get(
+            f"/api/v1/notifications/?count_strategy={strategy}&unread_only={str(unread_only).lower()}",
+            headers=headers
+        )
+        assert response.status_code == 200
+        assert response.json()["count_strategy"] == strategy
+        return response.json()["total"]
+
+    assert total("exact") == 3
+    assert total("cached", unread_only=True) == 3
+    assert notifications_client.put(f"/api/v1/notifications/{ids[0]}/read", headers=headers).status_code == 200
+    assert total("cached", unread_only=True) == 2
+    assert notifications_client.delete(f"/api/v1/notifications/{ids[1]}", headers=headers).status_code == 200
+    assert total("cached") == 2
+    assert notifications_client.put("/api/v1/notifications/read-all", headers=headers).status_code == 200
+    assert total("cached", unread_only=True) == 0
+    assert notifications_client.get("/api/v1/notifications/unread-count", headers=headers).json() == {"unread_count": 0}
@@ -0,0 +1,116 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.main import app
+from app.core.database import get_db, Base
+from app.api.v1.endpoints import outfits
+from app.models.user import User
+from app.models.outfit import Outfit, OutfitLike
+from app.services.view_counts import ViewCounter
+from app.core.redis import get_redis
+
+
+# Test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+
+app.dependency_overrides[get_db] = override_get_db
+client = TestClient(app)
+
+# The outfits router is not mounted in the MVP API (app/api/v1/api.py),
+# so it is exercised on an app of its own
+outfits_app = FastAPI()
+outfits_app.include_router(outfits.router, prefix="/api/v1/outfits")
+outfits_app.dependency_overrides[get_db] = override_get_db
+outfits_client = TestClient(outfits_app)
+
+
+@pytest.fixture(autouse=True)
+def setup_database():
+    Base.metadata.create_all(bind=engine)
+    get_redis().flushall()
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+def register(username):
+    """Register and log in a user, returning (user id, auth headers)"""
+    email = f"{username}@example.com"
+    user = client.post("/api/v1/auth/register", json={
+        "email": email, "username": username, "password": "testpassword123"
+    }).json()
+    token = client.post("/api/v1/auth/login", json={
+        "email": email, "password": "testpassword123"
+    }).json()["access_token"]
+    return user["id"], {"Authorization": f"Bearer {token}"}
+
+
+def create_outfit(creator_id, name="Weekend"):
+    db = TestingSessionLocal()
+    try:
+        outfit = Outfit(name=name, creator_id=creator_id)
+        db.add(outfit)
+        db.commit()
+        return outfit.id
+    finally:
+        db.close()
+
+
+def test_outfit_likes_are_idempotent():
+    """Test that repeated outfit likes and unlikes change the like and its count once"""
+    user_id, headers = register("stylist")
+    outfit_id = create_outfit(user_id)
+    url = f"/api/v1/outfits/{outfit_id}/like"
+
+    for _ in range(2):
+        response = outfits_client.put(url, headers=headers)
+        assert response.status_code == 200
+        assert (response.json()["liked"], response.json()["like_count"]) == (True, 1)
+    assert outfits_client.post(url, headers=headers).json()["like_count"] == 1
+    db = TestingSessionLocal()
+    assert db.query(OutfitLike).count() == 1
+    db.close()
+
+    for _ in range(2):
+        response = outfits_client.delete(url, headers=headers)
+        assert response.status_code == 200
+        assert (response.json()["liked"], response.json()["like_count"]) == (False, 0)
+
+    assert outfits_client.put(f"/api/v1/outfits/{outfit_id + 1}/like", headers=headers).status_code == 404
+    assert outfits_client.delete(f"/api/v1/outfits/{outfit_id + 1}/like", headers=headers).status_code == 404
+
+
+def test_outfit_views_are_buffered_and_viewers_counted():
+    """Test that outfit views reach the database on flush and repeat viewers count once"""
+    creator_id, creator = register("stylist")
+    _, viewer = register("viewer")
+    outfit_id = create_outfit(creator_id)
+
+    for headers in [creator, viewer, viewer]:
+        response = outfits_client.get(f"/api/v1/outfits/{outfit_id}", headers=headers)
+        assert response.status_code == 200
+    assert (response.json()["view_count"], response.json()["unique_viewers"]) == (3, 2)
+
+    listed = outfits_client.get("/api/v1/outfits/", headers=viewer).json()
+    assert [(outfit["id"], outfit["unique_viewers"]) for outfit in listed] == [(outfit_id, 2)]
+
+    db = TestingSessionLocal()
+    try:
+        assert db.get(Outfit, outfit_id).view_count == 0
+        assert ViewCounter.flush(db) == 3
+        db.expire_all()
+        assert db.get(Outfit, outfit_id).view_count == 3
+    finally:
+        db.close()
@@ -1,12 +1,44 @@
 import pytest
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
+from starlette.requests import ClientDisconnect
 from app.main import app
 from app.core.database import get_db, Base
 from app.models.user import User
-from app.models.post import Post
+from app.models.post import Post, PostColor, PostEmbedding, PostImageHash, Like, Tag, PostTag, PostNeighbor, ClothingCategory
+from app.models.storage import Blob
 from app.core.security import get_password_hash
+from app.core.config import settings
+from app.core import object_storage
+from app.core.object_storage import S3StandIn, S3Storage, StorageError
+from app.core.redis import get_redis
+from app.services.colors import ColorIndex
+from app.services.counting import CountService
+from app.services.duplicates import DuplicateIndex, MultiIndexHashTable
+from app.services import image_resize
+from app.services.image_resize import ImageResizer, ResizeCache, ResizeFormat
+from app.services.images import ImagePipeline
+from app.services.similar_posts import SimilarPostsJob
+from app.services.resumable_uploads import ResumableUploads
+from app.services.storage import BlobStore, blob_url
+from app.services.timeline import HomeTimeline, timeline_key
+from app.services.visual_search import IVFIndex, VisualIndex, benchmark, synthetic_embeddings
+from app.utils.file_upload import _stream_to_disk, stage_upload_stream
+from app.utils.image_headers import InvalidImage, sniff_image_file
+from app.utils.static_files import UploadFiles
+import asyncio
+import hashlib
+import httpx
+import io
+import json
+import os
+import numpy as np
+from PIL import Image
+from scipy import sparse
 
 
 # Test database
@@ -28,8 +60,15 @@ client = TestClient(app)
 
 
 @pytest.fixture(autouse=True)
-def setup_database():
+def setup_database(monkeypatch):
+    # Background rendering and timeline fan-out open their own sessions
+    monkeypatch.setattr("app.services.images.SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr("app.services.timeline.SessionLocal", TestingSessionLocal)
     Base.metadata.create_all(bind=engine)
+    ColorIndex.reset()
+    DuplicateIndex.reset()
+    VisualIndex.reset()
+    get_redis().flushall()
     yield
     Base.metadata.drop_all(bind=engine)
 
@@ -56,6 +95,51 @@ def test_user():
     return {"token": token, "user_data": user_data}
 
 
+def create_posts(count, username="testuser"):
+    """Insert tagged posts directly, liking every other one as the author"""
+    db = TestingSessionLocal()
+    try:
+        author = db.query(User).filter(User.username == username).first()
+        tag = db.query(Tag).filter(Tag.name == "summer").first()
+        if not tag:
+            tag = Tag(name="summer")
+            db.add(tag)
+            db.flush()
+        
+        for i in range(count):
+            post = Post(
+                title=f"Post {i}",
+                category=ClothingCategory.TOPS,
+                main_image=f"/uploads/posts/{i}.jpg",
+                author_id=author.id
+            )
+            db.add(post)
+            db.flush()
+            db.add(PostTag(post_id=post.id, tag_id=tag.id))
+            if i % 2 == 0:
+                db.add(Like(user_id=author.id, post_id=post.id))
+        
+        db.commit()
+    finally:
+        db.close()
+
+
+def count_queries(func):
+    """Run func and return how many SQL statements it issued"""
+    statements = []
+    
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        func()
+    finally:
+        event.remove(Engine, "before_cursor_execute", before_cursor_execute)
+    
+    return len(statements)
+
+
 def test_get_posts_requires_auth():
     """Test that getting posts requires authentication"""
     response = client.get("/api/v1/posts")
@@ -101,3 +185,1045 @@ def test_update_user_profile(test_user):
     assert data["first_name"] == "Updated"
     assert data["bio"] == "Updated bio"
 
+
+
+def png_bytes(size=(8, 8)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (200, 40, 90)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_create_post_saves_images_concurrently(test_user, tmp_path, monkeypatch):
+    """Test that main and additional images are streamed into place under their content hash"""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "UPLOAD_CHUNK_SIZE", 16)
+    monkeypatch.setattr(settings, "IMAGE_WORKERS", 0)
+    images = [png_bytes(), png_bytes((4, 4)), png_bytes((6, 6))]
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+    response = client.post("/api/v1/posts/", headers=headers, data={"title": "Upload", "category": "tops"}, files=[
+        ("main_image", ("main.PNG", images[0], "image/png")),
+        ("additional_images", ("a.png", images[1], "image/png")),
+        ("additional_images", ("b.png", images[2], "image/png")),
+    ])
+    assert response.status_code == 200
+    data = response.json()
+    saved = [data["main_image"], *data["additional_images"]]
+    assert saved == [blob_url(hashlib.sha256(content).hexdigest(), ".png") for content in images]
+    for path, content in zip(saved, images):
+        assert (tmp_path / path[len("/uploads/"):]).read_bytes() == content
+    assert not [name for _, _, names in os.walk(tmp_path / "blobs") for name in names if name.endswith(".part")]
+
+
+def test_identical_uploads_share_one_blob_until_last_post_is_deleted(test_user, tmp_path, monkeypatch):
+    """Test that re-uploaded content is stored once, reference counted, and reclaimed with its derivatives"""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "IMAGE_WORKERS", 0)
+    monkeypatch.setattr(settings, "IMAGE_DERIVATIVE_WIDTHS", [4])
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+    shared, other = png_bytes((8, 8)), png_bytes((5, 5))
+    
+    def upload(*contents):
+        files = [("main_image", ("main.png", contents[0], "image/png"))]
+        files += [("additional_images", ("extra.jpg", content, "image/png")) for content in contents[1:]]
+        response = client.post("/api/v1/posts/", headers=headers, data={"title": "Same", "category": "tops"}, files=files)
+        assert response.status_code == 200
+        return response.json()
+    
+    def blob_files():
+        return sorted(name for _, _, names in os.walk(tmp_path / "blobs") for name in names if name[0] != ".")
+    
+    first, second = upload(shared), upload(shared, other)
+    assert first["main_image"] == second["main_image"]
+    digest = hashlib.sha256(shared).hexdigest()
+    db = TestingSessionLocal()
+    assert db.get(Blob, digest).ref_count == 2
+    assert blob_files() == sorted([
+        f"{digest}.png", f"{digest}-4w.jpg", f"{digest}-4w.webp",
+        *(f"{hashlib.sha256(other).hexdigest()}{suffix}" for suffix in (".png", "-4w.jpg", "-4w.webp"))
+    ])
+    
+    assert client.delete(f"/api/v1/posts/{first['id']}", headers=headers).status_code == 200
+    db.expire_all()
+    assert db.get(Blob, digest).ref_count == 1
+    assert len(blob_files()) == 6
+    
+    # Dropping an image in an update releases it; a rolled back release puts the files back
+    released = client.put(f"/api/v1/posts/{second['id']}", headers=headers, json={"additional_images": []})
+    assert released.status_code == 200
+    assert len(blob_files()) == 3
+    BlobStore.release(db, [second["main_image"]])
+    assert blob_files() == []
+    db.rollback()
+    assert len(blob_files()) == 3
+    
+    assert client.delete(f"/api/v1/posts/{second['id']}", headers=headers).status_code == 200
+    assert blob_files() == []
+    db.expire_all()
+    assert db.query(Blob).count() == 0
+    db.close()
+
+
+def s3_stand_in():
+    stand_in = S3StandIn("test-key", "test-secret")
+    stand_in.create_bucket("media")
+    return stand_in, S3Storage(
+        "http://minio.test:9000", "media", "test-key", "test-secret", transport=httpx.MockTransport(stand_in)
+    )
+
+
+def photo_bytes(seed, size=(240, 320), format="PNG", **params):
+    """A product-shot-like image: a few random blocks of color, different for each ``seed``"""
+    rng = np.random.default_rng(seed)
+    image = Image.fromarray(rng.integers(0, 256, (4, 3, 3), dtype=np.uint8)).resize(size, Image.Resampling.BILINEAR)
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **params)
+    return buffer.getvalue()
+
+
+def test_multi_index_hash_table_matches_brute_force():
+    """Test that lookups find exactly the hashes within the distance, for radii around the chunk boundaries"""
+    rng = np.random.default_rng(7)
+    base = [int(value) for value in rng.integers(0, 2 ** 63, 300, dtype=np.int64) * 2 + 1]
+    hashes = base + [value ^ (1 << int(bit)) ^ (1 << int(bit2)) for value, bit, bit2 in zip(base, rng.integers(0, 64, 300), rng.integers(0, 64, 300))]
+    table = MultiIndexHashTable()
+    for key, value in enumerate(hashes):
+        table.add(value, key)
+    table.add(hashes[0], 1000)
+    for max_distance in (0, 2, 3, 4, 7, 9):
+        for query in hashes[:40]:
+            expected = sorted(
+                ((key, bin(value ^ query).count("1")) for key, value in enumerate(hashes) if bin(value ^ query).count("1") <= max_distance),
+                key=lambda item: (item[1], item[0])
+            )
+            if query == hashes[0]:
+                expected.insert(1, (1000, 0))
+            assert table.search(query, max_distance) == expected
+
+
+def test_near_duplicate_uploads_are_linked(test_user, tmp_path, monkeypatch):
+    """Test that re-posted photos are linked to the earliest post, on upload and by the scan job"""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "IMAGE_WORKERS", 0)
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+    _, reseller = register("reseller")
+    
+    def post(headers, content, name="look.png", **data):
+        files = [("main_image", (name, content, "image/png"))]
+        response = client.post("/api/v1/posts/", headers=headers, data={"title": "Look", "category": "tops", **data}, files=files)
+        assert response.status_code == 200
+        return response.json()
+    
+    hidden = post(headers, photo_bytes(2), is_public="false")
+    original = post(headers, photo_bytes(1))
+    # Rescaled and recompressed as JPEG: different bytes, same photo
+    repost = post(reseller, photo_bytes(1, size=(600, 800), format="JPEG", quality=70), name="copy.jpg")
+    assert repost["main_image"] != original["main_image"]
+    assert repost["duplicate_of"] == original["id"]
+    assert post(reseller, photo_bytes(3))["duplicate_of"] is None
+    assert post(reseller, photo_bytes(2))["duplicate_of"] is None  # the earlier one is private
+    assert post(headers, photo_bytes(2))["duplicate_of"] == hidden["id"]
+    assert original["duplicate_of"] is None
+    
+    # The scan job hashes posts that have no hashes and relinks everything
+    db = TestingSessionLocal()
+    db.query(PostImageHash).delete()
+    db.query(Post).update({Post.duplicate_of: None})
+    db.commit()
+    DuplicateIndex.reset()
+    assert DuplicateIndex.scan(db) == (6, 2)
+    assert db.get(Post, repost["id"]).duplicate_of == original["id"]
+    assert len(DuplicateIndex.near(db, db.get(PostImageHash, (original["id"], original["main_image"])).phash & (2 ** 64 - 1))) == 2
+    db.close()
+
+
+def test_ivf_index_search_and_inserts(tmp_path, monkeypatch):
+    """Test that the IVF index finds most true neighbors, and inserts and replacements are searchable"""
+    monkeypatch.setattr(settings, "EMBEDDING_DIR", str(tmp_path))
+    vectors = synthetic_embeddings(3000, seed=3)
+    assert all(result["recall"] >= 0.9 for result in benchmark(vectors, queries=50, probes=[8, 16]))
+    
+    # Small indexes are searched exactly
+    exact = IVFIndex(np.arange(3000), vectors)
+    scores = vectors @ vectors[0]
+    assert [post_id for post_id, _ in exact.search(vectors[0], 5)] == list(np.argsort(-scores)[:5])
+    
+    index = IVFIndex(np.arange(3000), vectors, lists=30)
+    moved = synthetic_embeddings(1, seed=4)[0]
+    index.insert(7, moved)  # post 7 now looks different
+    for post_id in range(3000, 4000):  # past the initial capacity
+        index.insert(post_id, vectors[post_id - 3000])
+    assert len(index) == 4000
+    assert index.search(moved, 1)[0][0] == 7
+    assert 7 not in [post_id for post_id, _ in index.search(vectors[7], 10, probes=30)]
+    assert {post_id for post_id, _ in index.search(vectors[5], 2)} == {5, 3005}
+
+
+def test_visually_similar_posts(test_user, tmp_path, monkeypatch):
+    """Test that visually similar posts come from the rendered embeddings, closest first and visible only"""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "EMBEDDING_DIR", str(tmp_path / "embeddings"))
+    monkeypatch.setattr(settings, "IMAGE_WORKERS", 0)
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+    _, other = register("other")
+    
+    def post(headers, content, **data):
+        files = [("main_image", ("look.png", content, "image/png"))]
+        response = client.post("/api/v1/posts/", headers=headers, data={"title": "Look", "category": "tops", **data}, files=files)
+        assert response.status_code == 200
+        return response.json()["id"]
+    
+    def similar(post_id, headers=headers):
+        response = client.get(f"/api/v1/posts/{post_id}/visually-similar", headers=headers)
+        return response.status_code, [post["id"] for post in response.json().get("posts", [])]
+    
+    look = post(headers, photo_bytes(1))
+    unrelated = [post(other, photo_bytes(seed)) for seed in (2, 3, 4)]
+    status_code, found = similar(look)
+    assert status_code == 200 and sorted(found) == unrelated
+    # Loaded on first use above; posts rendered since are inserted
+    hidden = post(other, photo_bytes(1, size=(200, 260)), is_public="false")
+    copy = post(other, photo_bytes(1, size=(600, 800), format="JPEG", quality=70))
+    status_code, found = similar(look)
+    assert status_code == 200
+    assert found[0] == copy and hidden not in found and look not in found
+    assert similar(copy)[1][0] == look
+    assert similar(hidden) == (404, [])
+    assert similar(hidden, other)[1][0] in (look, copy)
+    assert similar(999)[0] == 404
+    
+    # Backfilling recomputes embeddings from the originals, to the same neighbors
+    db = TestingSessionLocal()
+    db.query(PostEmbedding).delete()
+    db.commit()
+    VisualIndex.reset()
+    assert similar(look) == (200, [])
+    assert VisualIndex.backfill(db) == 6
+    db.close()
+    VisualIndex.reset()
+    assert similar(look)[1][0] == copy
+
+
+def test_s3_storage_against_stand_in(tmp_path, monkeypatch):
+    """Test the S3 client: signed requests, multipart uploads, copies, listings and presigned URLs"""
+    monkeypatch.setattr(settings, "S3_MULTIPART_THRESHOLD", 10)
+    monkeypatch.setattr(settings, "S3_MULTIPART_CHUNK_SIZE", 8)
+    stand_in, storage = s3_stand_in()
+    objects = stand_in.buckets["media"]
+    
+    for name, content in (("small.jpg", b"tiny"), ("large.jpg", bytes(range(30)))):
+        (tmp_path / name).write_bytes(content)
+        storage.put_file(f"blobs/aa/{name}", str(tmp_path / name), "image/jpeg")
+        assert objects[f"blobs/aa/{name}"][0] == content
+        assert not (tmp_path / name).exists()
+    assert storage.size("blobs/aa/large.jpg") == 30
+    assert storage.size("blobs/aa/missing.jpg") is None
+    assert storage.read("blobs/aa/large.jpg", 4) == bytes(range(4))
+    assert storage.read("blobs/aa/missing.jpg", 4) is None
+    
+    storage.rename("blobs/aa/small.jpg", "blobs/bb/moved.jpg")
+    assert storage.list("blobs/") == ["blobs/aa/large.jpg", "blobs/bb/moved.jpg"]
+    with storage.local_copy("blobs/bb/moved.jpg") as path:
+        assert open(path, "rb").read() == b"tiny"
+    storage.delete("blobs/bb/moved.jpg")
+    assert storage.list("blobs/bb/") == []
+    
+    with pytest.raises(StorageError, match="SignatureDoesNotMatch"):
+        S3Storage("http://minio.test:9000", "media", "test-key", "wrong", transport=httpx.MockTransport(stand_in)).size("x")
+    
+    # Presigned uploads accept exactly the announced bytes, until they expire
+    content = png_bytes()
+    presigned = storage.presign_put("blobs/cc/direct.png", hashlib.sha256(content).hexdigest(), len(content), "image/png")
+    direct = httpx.Client(transport=httpx.MockTransport(stand_in))
+    tampered = bytes(len(content))
+    assert direct.put(presigned["url"], content=tampered, headers=presigned["headers"]).status_code == 400
+    assert direct.put(presigned["url"], content=content + b"!", headers=presigned["headers"]).status_code == 403
+    assert direct.put(presigned["url"], content=content, headers=presigned["headers"]).status_code == 200
+    assert objects["blobs/cc/direct.png"] == (content, "image/png")
+    monkeypatch.setattr(settings, "STORAGE_PRESIGN_EXPIRES", -1)
+    expired = storage.presign_put("blobs/cc/late.png", hashlib.sha256(content).hexdigest(), len(content))
+    assert direct.put(expired["url"], content=content, headers=expired["headers"]).status_code == 403
+
+
+def test_post_images_on_object_storage(test_user, tmp_path, monkeypatch):
+    """Test posts whose images live in a bucket: direct uploads, public URLs, derivatives and reclaiming"""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "IMAGE_WORKERS", 0)
+    monkeypatch.setattr(settings, "IMAGE_DERIVATIVE_WIDTHS", [4])
+    monkeypatch.setattr(settings, "STORAGE_PUBLIC_BASE_URL", "https://cdn.example.com/media")
+    stand_in, storage = s3_stand_in()
+    monkeypatch.setattr(object_storage, "_backend", storage)
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+    content = png_bytes((9, 9))
+    announced = {"filename": "look.png", "size": len(content), "sha256": hashlib.sha256(content).hexdigest()}
+    
+    presigned = client.post("/api/v1/uploads/", headers=headers, json=announced).json()
+    assert presigned["exists"] is False
+    assert presigned["url"].startswith("http://minio.test:9000/media/blobs/")
+    upload = httpx.Client(transport=httpx.MockTransport(stand_in))
+    assert upload.put(presigned["url"], content=content, headers=presigned["headers"]).status_code == 200
+    assert client.post("/api/v1/uploads/", headers=headers, json=announced).json() == {
+        "key": presigned["key"], "exists": True, "url": None, "method": None, "headers": {}, "expires_in": None
+    }
+    
+    response = client.post("/api/v1/posts/", headers=headers, data={
+        "title": "Bucket", "category": "tops", "uploaded_images": presigned["key"]
+    }, files=[("main_image", ("main.png", png_bytes((6, 6)), "image/png"))])
+    assert response.status_code == 200
+    created = response.json()
+    assert created["main_image"].startswith("https://cdn.example.com/media/blobs/")
+    assert created["additional_images"] == [f"https://cdn.example.com/media/{presigned['key']}"]
+    
+    post = client.get(f"/api/v1/posts/{created['id']}", headers=headers).json()
+    assert post["display_image"].startswith("https://cdn.example.com/media/blobs/")
+    assert post["display_image"].endswith("-4w.jpg")
+    assert len(stand_in.buckets["media"]) == 6  # two originals, each with a JPEG and a WebP derivative
+    
+    # Public URLs sent back on update map to the same stored files
+    updated = client.put(f"/api/v1/posts/{created['id']}", headers=headers, json={
+        "additional_images": created["additional_images"]
+    })
+    assert updated.json()["additional_images"] == created["additional_images"]
+    db = TestingSessionLocal()
+    assert [blob.ref_count for blob in db.query(Blob)] == [1, 1]
+    db.close()
+    
+    assert client.delete(f"/api/v1/posts/{created['id']}", headers=headers).status_code == 200
+    assert stand_in.buckets["media"] == {}
+    assert [name for _, _, names in os.walk(tmp_path) for name in names] == []
+
+
+def test_direct_upload_to_local_storage(test_user, tmp_path, monkeypatch):
+    """Test presigned uploads when files are stored on the API server's own disk"""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "IMAGE_WORKERS", 0)
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+    content = png_bytes((7, 7))
+    presigned = client.post("/api/v1/uploads/", headers=headers, json={
+        "filename": "look.png", "size": len(content), "sha256": hashlib.sha256(content).hexdigest()
+    }).json()
+    assert presigned["url"].startswith("/api/v1/uploads/direct/")
+    assert client.post("/api/v1/uploads/", headers=headers, json={
+        "filename": "notes.txt", "size": 5, "sha256": "0" * 64
+    }).status_code == 400
+    
+    assert client.put(presigned["url"], content=bytes(len(content))).status_code == 400
+    assert client.put("/api/v1/uploads/direct/forged", content=content).status_code == 403
+    assert client.put(presigned["url"], content=content).status_code == 200
+    assert (tmp_path / presigned["key"]).read_bytes() == content
+    
+    data = {"title": "Direct", "category": "tops"}
+    missing = client.post("/api/v1/posts/", headers=headers, data={**data, "uploaded_images": f"blobs/00/00/{'0' * 64}.png"})
+    assert missing.status_code == 400
+    assert client.post("/api/v1/posts/", headers=headers, data=data).status_code == 400
+    response = client.post("/api/v1/posts/", headers=headers, data={**data, "uploaded_images": json.dumps([presigned["key"]])})
+    assert response.status_code == 200
+    assert response.json()["main_image"] == f"/uploads/{presigned['key']}"
+
+
+def test_unused_direct_uploads_are_swept(test_user, tmp_path, monkeypatch):
+    """Test that presigned uploads no post uses are reclaimed, and used ones are kept"""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "IMAGE_WORKERS", 0)
+    monkeypatch.setattr(settings, "IMAGE_DERIVATIVE_WIDTHS", [4])
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+    keys = []
+    for size in [(7, 7), (9, 9)]:
+        content = png_bytes(size)
+        presigned = client.post("/api/v1/uploads/", headers=headers, json={
+            "filename": "look.png", "size": len(content), "sha256": hashlib.sha256(content).hexdigest()
+        }).json()
+        assert client.put(presigned["url"], content=content).status_code == 200
+        keys.append(presigned["key"])
+    used, unused = keys
+    response = client.post("/api/v1/posts/", headers=headers, data={
+        "title": "Direct", "category": "tops", "uploaded_images": json.dumps([used])
+    })
+    assert response.status_code == 200
+    
+    db = TestingSessionLocal()
+    try:
+        assert BlobStore.sweep(db) == 0  # still within UNREFERENCED_BLOB_HOURS
+        monkeypatch.setattr(settings, "UNREFERENCED_BLOB_HOURS", -1)
+        assert BlobStore.sweep(db) == 1
+        assert [blob.ref_count for blob in db.query(Blob)] == [1]
+    finally:
+        db.close()
+    assert (tmp_path / used).exists() and not (tmp_path / unused).exists()
+
+
+def test_resumable_upload_resumes_at_offset_and_creates_post(test_user, tmp_path, monkeypatch):
+    """Test tus-style uploads: chunks at offsets, resuming after a cut, finalizing into a post"""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "IMAGE_WORKERS", 0)
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+    content = png_bytes((40, 40))
+    created = client.post("/api/v1/uploads/resumable", headers=headers, json={"filename": "big.png", "size": len(content)})
+    assert created.status_code == 201
+    url = created.headers["location"]
+    
+    def patch(offset, body):
+        return client.patch(url, content=body, headers={
+            **headers, "Upload-Offset": str(offset), "Content-Type": "application/offset+octet-stream"
+        })
+    
+    assert patch(0, content[:50]).headers["upload-offset"] == "50"
+    
+    # A connection dropped mid-body keeps what arrived
+    async def cut_off():
+        yield content[50:80]
+        raise ClientDisconnect()
+    db = TestingSessionLocal()
+    user_id = db.query(User.id).filter(User.username == "testuser").scalar()
+    db.close()
+    upload = ResumableUploads.get(url.rsplit("/", 1)[1], user_id)
+    with pytest.raises(ClientDisconnect):
+        asyncio.run(ResumableUploads.append(upload, 50, cut_off()))
+    assert client.head(url, headers=headers).headers["upload-offset"] == "80"
+    
+    retried = patch(50, content[50:])
+    assert (retried.status_code, retried.headers["upload-offset"]) == (409, "80")
+    assert client.post(f"{url}/complete", headers=headers).status_code == 409
+    assert patch(80, content[80:] + b"extra").status_code == 413
+    assert client.head(url, headers=headers).headers["upload-offset"] == str(len(content))
+    
+    key = client.post(f"{url}/complete", headers=headers).json()["key"]
+    assert f"/uploads/{key}" == blob_url(hashlib.sha256(content).hexdigest(), ".png")
+    assert (tmp_path / key).read_bytes() == content
+    assert client.head(url, headers=headers).status_code == 404
+    assert os.listdir(tmp_path / "resumable") == []
+    db = TestingSessionLocal()
+    assert db.get(Blob, hashlib.sha256(content).hexdigest()).ref_count == 0  # swept unless a post uses it
+    db.close()
+    
+    response = client.post("/api/v1/posts/", headers=headers, data={"title": "Resumed", "category": "tops", "uploaded_images": key})
+    assert response.json()["main_image"] == f"/uploads/{key}"
+    db = TestingSessionLocal()
+    assert db.get(Blob, hashlib.sha256(content).hexdigest()).ref_count == 1
+    db.close()
+
+
+def test_resumable_uploads_are_private_and_expire(test_user, tmp_path, monkeypatch):
+    """Test that other users cannot see an upload, and stale uploads are swept"""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+    url = client.post("/api/v1/uploads/resumable", headers=headers, json={"filename": "a.jpg", "size": 10}).headers["location"]
+    _, other = register("someone-else")
+    assert client.head(url, headers=other).status_code == 404
+    assert client.patch(url, content=b"x", headers={**headers, "Upload-Offset": "0", "Content-Type": "image/jpeg"}).status_code == 415
+    assert client.post("/api/v1/uploads/resumable", headers=headers, json={"filename": "a.txt", "size": 10}).status_code == 400
+    
+    assert ResumableUploads.expire() == 0
+    monkeypatch.setattr(settings, "RESUMABLE_UPLOAD_EXPIRE_HOURS", -1)
+    assert ResumableUploads.expire() == 1
+    assert client.head(url, headers=headers).status_code == 404
+
+
+def test_create_post_renders_derivatives_in_background(test_user, tmp_path, monkeypatch):
+    """Test that uploads get width-bounded JPEG/WebP derivatives and responses pick one"""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "IMAGE_WORKERS", 0)
+    monkeypatch.setattr(settings, "IMAGE_DERIVATIVE_WIDTHS", [100, 200, 400])
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+    response = client.post("/api/v1/posts/", headers=headers, data={"title": "Upload", "category": "tops"}, files=[
+        ("main_image", ("main.png", png_bytes((300, 150)), "image/png")),
+        ("additional_images", ("a.png", png_bytes((50, 50)), "image/png")),
+    ])
+    # The upload responds before rendering: the response still points at the original
+    created = response.json()
+    assert [entry["status"] for entry in created["images"]] == ["pending", "pending"]
+    assert created["display_image"] == created["main_image"]
+    
+    post = client.get(f"/api/v1/posts/{created['id']}", headers=headers).json()
+    main, extra = post["images"]
+    assert (main["status"], main["width"], main["height"]) == ("ready", 300, 150)
+    assert [(v["format"], v["width"], v["height"]) for v in main["variants"]] == [
+        ("jpeg", 100, 50), ("jpeg", 200, 100), ("jpeg", 300, 150),
+        ("webp", 100, 50), ("webp", 200, 100), ("webp", 300, 150),
+    ]
+    assert [(v["format"], v["width"]) for v in extra["variants"]] == [("jpeg", 50), ("webp", 50)]
+    for variant in main["variants"] + extra["variants"]:
+        with Image.open(tmp_path / variant["url"][len("/uploads/"):]) as image:
+            assert image.size == (variant["width"], variant["height"])
+            assert image.format == variant["format"].upper()
+    
+    def display_image(**params):
+        accept = params.pop("accept", "*/*")
+        return client.get(
+            f"/api/v1/posts/{created['id']}", params=params, headers={**headers, "Accept": accept}
+        ).json()["display_image"]
+    
+    assert display_image(image_width=150).endswith("-200w.jpg")
+    assert display_image(image_width=150, accept="image/webp,*/*").endswith("-200w.webp")
+    assert display_image(image_width=1000).endswith("-300w.jpg")
+    assert display_image(image_width=80).endswith("-100w.jpg")
+    
+    # The main image's colors were indexed while rendering; backfilling recomputes the same histogram
+    ColorIndex.reset()
+    found = client.get("/api/v1/search/posts", params={"color": "#c8285a"}, headers=headers).json()["posts"]
+    assert [post["id"] for post in found] == [created["id"]]
+    assert client.get("/api/v1/search/posts", params={"color": "green"}, headers=headers).json()["posts"] == []
+    db = TestingSessionLocal()
+    rendered = db.get(PostColor, created["id"]).histogram
+    db.query(PostColor).delete()
+    db.commit()
+    assert ColorIndex.backfill(db) == 1
+    assert np.allclose(np.frombuffer(db.get(PostColor, created["id"]).histogram, np.float32), np.frombuffer(rendered, np.float32), atol=0.02)
+    db.close()
+    ColorIndex.reset()
+
+
+def test_image_pipeline_renders_in_worker_processes(tmp_path, monkeypatch):
+    """Test that rendering on the process pool matches rendering inline, and bad files fail alone"""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "IMAGE_DERIVATIVE_WIDTHS", [16])
+    os.makedirs(tmp_path / "posts")
+    (tmp_path / "posts" / "ok.png").write_bytes(png_bytes((32, 20)))
+    (tmp_path / "posts" / "broken.png").write_bytes(b"not an image")
+    
+    monkeypatch.setattr(settings, "IMAGE_WORKERS", 1)
+    try:
+        rendered = ImagePipeline.render(["/uploads/posts/ok.png", "/uploads/posts/broken.png"])
+    finally:
+        ImagePipeline.shutdown()
+    assert rendered["/uploads/posts/broken.png"] == {"status": "failed"}
+    assert rendered["/uploads/posts/ok.png"]["status"] == "ready"
+    assert [(v["format"], v["width"], v["height"]) for v in rendered["/uploads/posts/ok.png"]["variants"]] == [
+        ("jpeg", 16, 10), ("webp", 16, 10)
+    ]
+
+
+def test_create_post_rejects_oversized_image_without_leftovers(test_user, tmp_path, monkeypatch):
+    """Test that one oversized upload fails the post and removes every file saved for it"""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "MAX_FILE_SIZE", 200)
+    monkeypatch.setattr(settings, "IMAGE_WORKERS", 0)
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+    response = client.post("/api/v1/posts/", headers=headers, data={"title": "Upload", "category": "tops"}, files=[
+        ("main_image", ("main.png", png_bytes(), "image/png")),
+        ("additional_images", ("big.png", png_bytes((64, 64)) + os.urandom(400), "image/png")),
+    ])
+    assert response.status_code == 400
+    assert response.json()["detail"] == "File too large. Maximum size is 200 bytes."
+    assert os.listdir(tmp_path / "blobs") == []
+    assert TestingSessionLocal().query(Post).count() == 0
+
+
+def test_stream_to_disk_stops_at_size_limit(tmp_path, monkeypatch):
+    """Test that the copy aborts mid-stream once the limit is crossed and leaves no partial file"""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "MAX_FILE_SIZE", 100)
+    monkeypatch.setattr(settings, "UPLOAD_CHUNK_SIZE", 32)
+    source = io.BytesIO(b"x" * 1000)
+    with pytest.raises(HTTPException):
+        _stream_to_disk(source, "blobs")
+    assert source.tell() == 128
+    assert os.listdir(tmp_path / "blobs") == []
+
+
+def test_uploads_are_validated_from_their_header(test_user, tmp_path, monkeypatch):
+    """Test that non-images and oversized images are rejected from their first bytes, before being stored"""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "IMAGE_WORKERS", 0)
+    monkeypatch.setattr(settings, "IMAGE_MAX_PIXELS", 100 * 100)
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+    
+    def encoded(format, size=(30, 20), **params):
+        buffer = io.BytesIO()
+        Image.new("RGB", size).save(buffer, format=format, **params)
+        return buffer.getvalue()
+    
+    for format, params in (("JPEG", {}), ("GIF", {}), ("WEBP", {}), ("WEBP", {"lossless": True})):
+        assert sniff_image_file(io.BytesIO(encoded(format, **params)))[:3] == (format, 30, 20)
+    # A JPEG whose EXIF block runs past the first read still validates from its header
+    exif = Image.Exif()
+    exif[0x010E] = "x" * 60000
+    assert sniff_image_file(io.BytesIO(encoded("JPEG", exif=exif.tobytes())))[:3] == ("JPEG", 30, 20)
+    with pytest.raises(InvalidImage, match="pixels"):
+        sniff_image_file(io.BytesIO(png_bytes((101, 100))))
+    
+    data = {"title": "Fake", "category": "tops"}
+    for name, content in (("notes.jpg", b"plain text, not a photo"), ("huge.png", png_bytes((200, 200)))):
+        response = client.post("/api/v1/posts/", headers=headers, data=data, files=[("main_image", (name, content, "image/jpeg"))])
+        assert response.status_code == 400
+        assert response.json()["detail"].startswith("Invalid image")
+    assert not os.path.exists(tmp_path / "blobs") or os.listdir(tmp_path / "blobs") == []
+    
+    # Request bodies stop being read as soon as the header is refused
+    received = []
+    async def body():
+        for _ in range(100):
+            received.append(1)
+            yield b"%PDF" + bytes(settings.IMAGE_SNIFF_BYTES)
+    with pytest.raises(HTTPException):
+        asyncio.run(stage_upload_stream(body()))
+    assert len(received) == 1
+    assert os.listdir(tmp_path / "blobs") == []
+    
+    # Presigned and resumable uploads too
+    content = png_bytes((7, 7))
+    presigned = client.post("/api/v1/uploads/", headers=headers, json={
+        "filename": "look.jpeg", "size": len(content), "sha256": hashlib.sha256(content).hexdigest()
+    }).json()
+    assert presigned["key"].endswith(".jpg")
+    assert client.put(presigned["url"], content=content).status_code == 400
+    url = client.post("/api/v1/uploads/resumable", headers=headers, json={"filename": "a.jpg", "size": 10 ** 6}).headers["location"]
+    refused = client.patch(url, content=bytes(settings.IMAGE_SNIFF_BYTES), headers={
+        **headers, "Upload-Offset": "0", "Content-Type": "application/offset+octet-stream"
+    })
+    assert refused.status_code == 400
+    assert client.head(url, headers=headers).status_code == 404
+
+
+@pytest.fixture
+def image_dirs(tmp_path, monkeypatch):
+    """Point uploads and the resize cache at temp dirs, rendering in-process"""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(settings, "IMAGE_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(settings, "IMAGE_WORKERS", 0)
+    os.makedirs(tmp_path / "uploads" / "posts")
+    ResizeCache.reset()
+    renders = []
+    
+    def counting_render(*args):
+        renders.append(args)
+        return render_resized(*args)
+    
+    render_resized = image_resize.render_resized
+    monkeypatch.setattr(image_resize, "render_resized", counting_render)
+    yield tmp_path, renders
+    ResizeCache.reset()
+
+
+def write_image(root, name, size, image_format="JPEG"):
+    Image.new("RGB", size, (10, 120, 200)).save(root / "uploads" / "posts" / name, format=image_format)
+
+
+def test_resize_endpoint_fits_box_and_caches(image_dirs):
+    """Test that /img scales down to fit w/h, never upscales, and renders each variant once"""
+    root, renders = image_dirs
+    write_image(root, "photo.jpg", (400, 300))
+    
+    response = client.get("/img/posts/photo.jpg?w=100")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpeg"
+    assert Image.open(io.BytesIO(response.content)).size == (100, 75)
+    assert client.get("/img/posts/photo.jpg?w=100").content == response.content
+    assert len(renders) == 1
+    
+    webp = client.get("/img/posts/photo.jpg?w=200&h=50&fmt=webp")
+    assert webp.headers["content-type"] == "image/webp"
+    assert Image.open(io.BytesIO(webp.content)).size == (67, 50)
+    assert Image.open(io.BytesIO(client.get("/img/posts/photo.jpg?w=2000").content)).size == (400, 300)
+    
+    assert client.get("/img/posts/photo.jpg").status_code == 400
+    assert client.get("/img/posts/missing.jpg?w=10").status_code == 404
+    assert ImageResizer.source_path("../cache") is None
+    (root / "uploads" / "posts" / "notes.jpg").write_bytes(b"not an image")
+    assert client.get("/img/posts/notes.jpg?w=10").status_code == 400
+
+
+def test_resize_cache_evicts_least_recently_used(image_dirs, monkeypatch):
+    """Test that the disk cache stays under budget by dropping the least recently used variant"""
+    root, renders = image_dirs
+    write_image(root, "photo.png", (64, 64), "PNG")
+    first = client.get("/img/posts/photo.png?w=32").content
+    monkeypatch.setattr(settings, "IMAGE_CACHE_MAX_BYTES", len(first) * 2 + 10)
+    
+    client.get("/img/posts/photo.png?w=31")
+    client.get("/img/posts/photo.png?w=32")  # hit: now most recently used
+    client.get("/img/posts/photo.png?w=30")  # evicts w=31
+    assert len(renders) == 3
+    assert sum(len(files) for _, _, files in os.walk(root / "cache")) == 2
+    
+    client.get("/img/posts/photo.png?w=32")
+    client.get("/img/posts/photo.png?w=31")
+    assert len(renders) == 4
+
+
+def test_resize_coalesces_concurrent_requests(image_dirs):
+    """Test that concurrent requests for the same variant share one render"""
+    root, renders = image_dirs
+    write_image(root, "photo.jpg", (200, 200))
+    source = ImageResizer.source_path("posts/photo.jpg")
+    
+    async def burst():
+        return await asyncio.gather(*(ImageResizer.resize(source, 50, None, ResizeFormat.WEBP) for _ in range(8)))
+    
+    results = asyncio.run(burst())
+    assert len(set(results)) == 1
+    assert len(renders) == 1
+    assert ImageResizer._inflight == {}
+
+
+def call_asgi(app, path, headers=(), extensions=None):
+    """Drive an ASGI app directly and return the messages it sent"""
+    scope = {
+        "type": "http", "method": "GET", "path": path, "root_path": "", "query_string": b"",
+        "headers": [(name.encode(), value.encode()) for name, value in headers],
+        "extensions": extensions or {},
+    }
+    sent = []
+    
+    async def receive():
+        return {"type": "http.request", "body": b""}
+    
+    async def send(message):
+        if message["type"] == "http.response.zerocopy":
+            message = {**message, "data": os.pread(message["file"].fileno(), message["count"], message["offset"])}
+        sent.append(message)
+    
+    asyncio.run(app(scope, receive, send))
+    return sent
+
+
+def test_upload_files_caching_and_ranges(tmp_path):
+    """Test immutable caching, ETag revalidation and byte ranges on /uploads"""
+    (tmp_path / "posts").mkdir()
+    content = bytes(range(256)) * 40
+    (tmp_path / "posts" / "clip.jpg").write_bytes(content)
+    files = TestClient(UploadFiles(str(tmp_path), io_threads=2))
+    
+    response = files.get("/posts/clip.jpg")
+    assert response.status_code == 200
+    assert response.content == content
+    assert response.headers["content-type"] == "image/jpeg"
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    etag = response.headers["etag"]
+    assert etag.startswith('"') and len(etag) == 34
+    
+    not_modified = files.get("/posts/clip.jpg", headers={"If-None-Match": f'"other", {etag}'})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["etag"] == etag
+    
+    partial = files.get("/posts/clip.jpg", headers={"Range": "bytes=100-199"})
+    assert partial.status_code == 206
+    assert partial.content == content[100:200]
+    assert partial.headers["content-range"] == f"bytes 100-199/{len(content)}"
+    assert files.get("/posts/clip.jpg", headers={"Range": "bytes=-10"}).content == content[-10:]
+    assert files.get("/posts/clip.jpg", headers={"Range": "bytes=10240-"}).status_code == 416
+    assert files.get("/posts/clip.jpg", headers={"Range": "bytes=0-9", "If-Range": '"stale"'}).status_code == 200
+    
+    head = files.head("/posts/clip.jpg")
+    assert head.headers["content-length"] == str(len(content)) and head.content == b""
+    assert files.get("/posts/missing.jpg").status_code == 404
+    assert files.post("/posts/clip.jpg").status_code == 405
+    assert call_asgi(files.app, "/../test.db")[0]["status"] == 404
+    
+    (tmp_path / "resumable").mkdir()
+    (tmp_path / "resumable" / "abc.part").write_bytes(content)
+    (tmp_path / "posts" / ".reclaim-abc").write_bytes(content)
+    private = TestClient(UploadFiles(str(tmp_path), private=["resumable"]))
+    assert private.get("/posts/clip.jpg").status_code == 200
+    assert private.get("/resumable/abc.part").status_code == 404
+    assert private.get("/posts/.reclaim-abc").status_code == 404
+
+
+def test_upload_files_alternates_and_zero_copy(tmp_path):
+    """Test WebP siblings, precompressed files, and sendfile when the server offers it"""
+    (tmp_path / "posts").mkdir()
+    (tmp_path / "posts" / "photo.jpg").write_bytes(b"jpeg bytes")
+    (tmp_path / "posts" / "photo.webp").write_bytes(b"webp bytes")
+    (tmp_path / "posts" / "style.css").write_bytes(b"body{}")
+    (tmp_path / "posts" / "style.css.br").write_bytes(b"brotli")
+    files = TestClient(UploadFiles(str(tmp_path)))
+    
+    plain = files.get("/posts/photo.jpg", headers={"Accept": "image/avif,*/*"})
+    assert plain.content == b"jpeg bytes"
+    assert plain.headers["vary"] == "Accept-Encoding, Accept"
+    webp = files.get("/posts/photo.jpg", headers={"Accept": "image/webp,*/*"})
+    assert (webp.content, webp.headers["content-type"]) == (b"webp bytes", "image/webp")
+    assert webp.headers["etag"] != plain.headers["etag"]
+    
+    compressed = files.get("/posts/style.css", headers={"Accept-Encoding": "gzip, br"})
+    assert compressed.headers["content-encoding"] == "br"
+    assert "text/css" in compressed.headers["content-type"]
+    assert files.get("/posts/style.css", headers={"Accept-Encoding": "gzip, br;q=0"}).headers.get("content-encoding") is None
+    
+    sent = call_asgi(files.app, "/posts/photo.jpg", [("range", "bytes=5-")], {"http.response.zerocopy": {}})
+    assert sent[0]["status"] == 206
+    assert (sent[1]["type"], sent[1]["data"]) == ("http.response.zerocopy", b"bytes")
+    sent = call_asgi(files.app, "/posts/photo.jpg", extensions={"http.response.pathsend": {}})
+    assert sent[1] == {"type": "http.response.pathsend", "path": str((tmp_path / "posts" / "photo.jpg").resolve())}
+
+
+def test_get_posts_hydrates_author_tags_and_likes(test_user):
+    """Test that listed posts carry author, tags and is_liked"""
+    create_posts(4)
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+    response = client.get("/api/v1/posts", headers=headers)
+    assert response.status_code == 200
+    
+    posts = response.json()["posts"]
+    assert len(posts) == 4
+    for post in posts:
+        assert post["author"]["username"] == "testuser"
+        assert post["tags"] == ["summer"]
+    assert sorted(post["is_liked"] for post in posts) == [False, False, True, True]
+
+
+def test_like_and_unlike_are_idempotent(test_user):
+    """Test that repeated likes and unlikes change the like and its count once"""
+    create_posts(2)
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+    
+    for _ in range(2):
+        response = client.put("/api/v1/posts/2/like", headers=headers)
+        assert response.status_code == 200
+        assert (response.json()["liked"], response.json()["like_count"]) == (True, 1)
+    assert client.post("/api/v1/posts/2/like", headers=headers).json()["like_count"] == 1
+    
+    for _ in range(2):
+        response = client.delete("/api/v1/posts/2/like", headers=headers)
+        assert response.status_code == 200
+        assert (response.json()["liked"], response.json()["like_count"]) == (False, 0)
+    
+    assert client.put("/api/v1/posts/999/like", headers=headers).status_code == 404
+    assert client.delete("/api/v1/posts/999/like", headers=headers).status_code == 404
+
+
+def test_likes_are_unique(test_user):
+    """Test that the database rejects a second like of the same post"""
+    create_posts(1)
+    db = TestingSessionLocal()
+    try:
+        db.add(Like(user_id=1, post_id=1))
+        with pytest.raises(IntegrityError):
+            db.commit()
+    finally:
+        db.close()
+
+
+def test_get_posts_query_count_independent_of_page_size(test_user):
+    """Test that listing posts issues a fixed number of queries"""
+    create_posts(40)
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+    
+    small_page = count_queries(
+        lambda: client.get("/api/v1/posts?size=2", headers=headers)
+    )
+    large_page = count_queries(
+        lambda: client.get("/api/v1/posts?size=40", headers=headers)
+    )
+    
+    assert large_page == small_page
+
+
+def test_get_posts_cursor_pagination_walks_every_post_once(test_user):
+    """Test that following next_cursor returns each post exactly once"""
+    create_posts(7)
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+    
+    seen = []
+    response = client.get("/api/v1/posts?pagination=cursor&size=3", headers=headers)
+    while True:
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] is None
+        seen.extend(post["id"] for post in data["posts"])
+        if not data["has_more"]:
+            assert data["next_cursor"] is None
+            break
+        response = client.get(
+            f"/api/v1/posts?size=3&cursor={data['next_cursor']}", headers=headers
+        )
+    
+    assert len(seen) == 7
+    assert seen == sorted(seen, reverse=True)
+
+
+def test_get_posts_cursor_include_total(test_user):
+    """Test that cursor mode only counts when asked to"""
+    create_posts(3)
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+    response = client.get(
+        "/api/v1/posts?pagination=cursor&include_total=true", headers=headers
+    )
+    assert response.status_code == 200
+    assert response.json()["total"] == 3
+
+
+def test_get_posts_invalid_cursor(test_user):
+    """Test that a malformed cursor is rejected"""
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+    response = client.get("/api/v1/posts?cursor=not-a-cursor", headers=headers)
+    assert response.status_code == 400
+
+
+def test_get_posts_cached_count_until_invalidated(test_user):
+    """Test that cached totals are reused until the namespace is invalidated"""
+    get_redis().flushall()
+    create_posts(2)
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+    url = "/api/v1/posts?count_strategy=cached"
+    
+    data = client.get(url, headers=headers).json()
+    assert data["total"] == 2
+    assert data["count_strategy"] == "cached"
+    
+    # Direct inserts bypass the endpoints, so the cached total is stale
+    create_posts(1)
+    assert client.get(url, headers=headers).json()["total"] == 2
+    
+    CountService.invalidate("posts")
+    assert client.get(url, headers=headers).json()["total"] == 3
+
+
+def test_get_posts_estimated_count_falls_back_to_exact(test_user):
+    """Test that estimated counts report exact where no planner estimate exists"""
+    create_posts(2)
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+    data = client.get("/api/v1/posts?count_strategy=estimated", headers=headers).json()
+    assert data["total"] == 2
+    assert data["count_strategy"] == "exact"
+
+
+def test_similar_posts_from_co_likes(test_user):
+    """Test that the neighbors job ranks posts by co-likes and the endpoint serves them"""
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+    create_posts(4)
+    db = TestingSessionLocal()
+    try:
+        db.query(Like).delete()
+        for user_id, post_ids in {1: [1, 2], 2: [1, 2], 3: [1, 3], 4: [4]}.items():
+            db.add_all(Like(user_id=user_id, post_id=post_id) for post_id in post_ids)
+        db.commit()
+        assert SimilarPostsJob.run(db, workers=1) == 4
+    finally:
+        db.close()
+    
+    response = client.get("/api/v1/posts/1/similar", headers=headers)
+    assert response.status_code == 200
+    assert [post["id"] for post in response.json()["posts"]] == [2, 3]
+    assert [post["id"] for post in client.get("/api/v1/posts/3/similar", headers=headers).json()["posts"]] == [1]
+    assert client.get("/api/v1/posts/4/similar", headers=headers).json()["posts"] == []
+
+
+def test_similar_posts_chunks_match_brute_force():
+    """Test that chunked, multi-process neighbors equal a direct cosine computation"""
+    post_users = sparse.random(60, 40, density=0.15, format="csr", random_state=1)
+    post_users.data[:] = 1
+    
+    dense = post_users.toarray()
+    counts = dense.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cosine = (dense @ dense.T) / np.sqrt(np.outer(counts, counts))
+    np.fill_diagonal(cosine, 0)
+    
+    for workers in (1, 2):
+        chunks = list(SimilarPostsJob.compute(post_users, top_k=5, chunk_size=7, workers=workers))
+        rows = np.concatenate([chunk[0] for chunk in chunks])
+        neighbors = np.concatenate([chunk[1] for chunk in chunks])
+        scores = np.concatenate([chunk[2] for chunk in chunks])
+        for row in range(60):
+            expected = sorted(
+                (-cosine[row, col], col) for col in range(60) if np.nan_to_num(cosine[row, col]) > 0
+            )[:5]
+            mine = rows == row
+            assert neighbors[mine].tolist() == [col for _, col in expected]
+            assert np.allclose(scores[mine], [-score for score, _ in expected])
+
+
+
+def register(username):
+    """Register another user and return their id and auth headers"""
+    user_data = {"email": f"{username}@example.com", "username": username, "password": "testpassword123"}
+    user_id = client.post("/api/v1/auth/register", json=user_data).json()["id"]
+    token = client.post("/api/v1/auth/login", json={
+        "email": user_data["email"],
+        "password": user_data["password"]
+    }).json()["access_token"]
+    return user_id, {"Authorization": f"Bearer {token}"}
+
+
+def publish_posts(username, count, is_public=True):
+    """Insert posts by ``username`` and push them out the way create_post does"""
+    db = TestingSessionLocal()
+    try:
+        author = db.query(User).filter(User.username == username).first()
+        post_ids = []
+        for i in range(count):
+            post = Post(
+                title=f"{username} {i}",
+                category=ClothingCategory.TOPS,
+                main_image=f"/uploads/posts/{i}.jpg",
+                author_id=author.id,
+                is_public=is_public
+            )
+            db.add(post)
+            db.commit()
+            if is_public:
+                HomeTimeline.publish(db, post.id, author.id)
+            post_ids.append(post.id)
+        return post_ids
+    finally:
+        db.close()
+
+
+def home_feed(headers, size=20):
+    """Walk the home feed with cursors and return every post id"""
+    post_ids, cursor = [], None
+    while True:
+        params = {"size": size, **({"cursor": cursor} if cursor else {})}
+        data = client.get("/api/v1/feed/home", params=params, headers=headers).json()
+        post_ids += [post["id"] for post in data["posts"]]
+        cursor = data["next_cursor"]
+        if not data["has_more"]:
+            return post_ids
+
+
+def test_home_feed_fans_out_follows(test_user):
+    """Test that the home feed holds own and followed posts, newest first, across follow changes"""
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+    author_id, author_headers = register("author")
+    register("stranger")
+    
+    own = publish_posts("testuser", 2)
+    early = publish_posts("author", 3)
+    publish_posts("stranger", 2)
+    assert home_feed(headers) == own[::-1]
+    
+    assert client.post(f"/api/v1/users/{author_id}/follow", headers=headers).status_code == 200
+    later = publish_posts("author", 2)
+    publish_posts("author", 1, is_public=False)
+    expected = sorted(own + early + later, reverse=True)
+    assert home_feed(headers, size=2) == expected
+    
+    # The same feed is rebuilt from the database when Redis loses it
+    get_redis().flushall()
+    assert home_feed(headers, size=3) == expected
+    
+    assert client.delete(f"/api/v1/posts/{later[-1]}", headers=author_headers).status_code == 200
+    assert home_feed(headers) == [post_id for post_id in expected if post_id != later[-1]]
+    assert client.delete(f"/api/v1/users/{author_id}/follow", headers=headers).status_code == 200
+    assert home_feed(headers) == own[::-1]
+
+
+def test_home_feed_merges_high_follower_authors_on_read(test_user, monkeypatch):
+    """Test that authors past the fan-out limit are merged at read time instead of pushed"""
+    monkeypatch.setattr(settings, "TIMELINE_FANOUT_MAX_FOLLOWERS", 1)
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+    celebrity_id, _ = register("celebrity")
+    
+    own = publish_posts("testuser", 2)
+    home_feed(headers)
+    client.post(f"/api/v1/users/{celebrity_id}/follow", headers=headers)
+    assert HomeTimeline.celebrities() == {celebrity_id}
+    
+    celebrity_posts = publish_posts("celebrity", 3)
+    user_id = client.get("/api/v1/users/me", headers=headers).json()["id"]
+    stored = {int(member) for member in get_redis().zrevrangebyscore(timeline_key(user_id), "+inf", 1)}
+    assert stored == set(own)
+    assert home_feed(headers, size=2) == sorted(own + celebrity_posts, reverse=True)
+
+    # Dropping under the limit pushes the posts that were merged on read
+    monkeypatch.setattr(settings, "TIMELINE_FANOUT_MAX_FOLLOWERS", 2)
+    HomeTimeline.run(HomeTimeline.refresh_celebrities)
+    assert HomeTimeline.celebrities() == set()
+    stored = {int(member) for member in get_redis().zrevrangebyscore(timeline_key(user_id), "+inf", 1)}
+    assert stored == set(own + celebrity_posts)
+    assert home_feed(headers, size=2) == sorted(own + celebrity_posts, reverse=True)
+
+    client.delete(f"/api/v1/users/{celebrity_id}/follow", headers=headers)
+    assert HomeTimeline.celebrities() == set()
+    assert home_feed(headers) == own[::-1]
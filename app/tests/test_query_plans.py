@@ -0,0 +1,251 @@
+import json
+import os
+import re
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+from app.main import app
+from app.core.database import get_db, Base
+from app.models.user import User, user_followers
+from app.models.post import Post, Comment, Like, Tag, PostTag, PostNeighbor, ClothingCategory
+from app.models.notification import Notification, NotificationType
+from app.core.redis import get_redis
+from app.services.notification_service import NotificationService
+from app.services.duplicates import DuplicateIndex
+
+
+# Test database; point PLAN_TEST_DATABASE_URL at Postgres to check its planner too
+SQLALCHEMY_DATABASE_URL = os.getenv("PLAN_TEST_DATABASE_URL", "sqlite:///./test.db")
+connect_args = {"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args=connect_args)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Tables that grow with usage; a sequential scan on any of them is a regression
+LARGE_TABLES = {
+    "posts", "likes", "comments", "notifications", "post_tags", "user_followers", "users", "tags",
+    "post_neighbors", "post_image_hashes",
+}
+
+SEED_USERS = 50
+SEED_POSTS = 2000
+
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+
+client = TestClient(app)
+
+
+@pytest.fixture(scope="module")
+def seeded():
+    """Create the schema once and seed it with enough rows to matter"""
+    app.dependency_overrides[get_db] = override_get_db
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    client.post("/api/v1/auth/register", json={
+        "email": "planner@example.com",
+        "username": "planner",
+        "password": "testpassword123"
+    })
+    token = client.post("/api/v1/auth/login", json={
+        "email": "planner@example.com",
+        "password": "testpassword123"
+    }).json()["access_token"]
+
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"email": f"user{i}@example.com", "username": f"user{i}", "hashed_password": "x", "is_active": True}
+            for i in range(SEED_USERS)
+        ])
+        conn.execute(Tag.__table__.insert(), [{"name": f"tag{i}"} for i in range(50)])
+        conn.execute(Post.__table__.insert(), [
+            {
+                "title": f"Post {i}",
+                "category": ClothingCategory.TOPS.name,
+                "main_image": f"/uploads/posts/{i}.jpg",
+                "is_public": i % 10 != 0,
+                "author_id": 2 + i % SEED_USERS,
+                "like_count": 0,
+                "view_count": 0,
+                "comment_count": 0
+            }
+            for i in range(SEED_POSTS)
+        ])
+        conn.execute(PostTag.__table__.insert(), [
+            {"post_id": 1 + i, "tag_id": 1 + i % 50} for i in range(SEED_POSTS)
+        ])
+        conn.execute(Like.__table__.insert(), [
+            {"post_id": 1 + i, "user_id": 2 + i % SEED_USERS} for i in range(SEED_POSTS)
+        ])
+        conn.execute(Comment.__table__.insert(), [
+            {"post_id": 1 + i % 100, "author_id": 2 + i % SEED_USERS, "content": "Nice"}
+            for i in range(SEED_POSTS)
+        ])
+        conn.execute(Notification.__table__.insert(), [
+            {
+                "user_id": 1 + i % SEED_USERS,
+                "type": NotificationType.LIKE.name,
+                "title": "New Like",
+                "message": "Someone liked your post",
+                "is_read": i % 3 == 0
+            }
+            for i in range(SEED_POSTS)
+        ])
+        conn.execute(user_followers.insert(), [
+            {"follower_id": 1, "following_id": 2 + i} for i in range(SEED_USERS)
+        ] + [
+            {"follower_id": 2 + i, "following_id": 1} for i in range(SEED_USERS)
+        ])
+        if engine.dialect.name == "postgresql":
+            conn.exec_driver_sql("ANALYZE")
+
+    yield {"Authorization": f"Bearer {token}"}
+
+    Base.metadata.drop_all(bind=engine)
+
+
+def capture_selects(func):
+    """Run func and return the SELECT statements (with parameters) it issued"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        func()
+    finally:
+        event.remove(Engine, "before_cursor_execute", before_cursor_execute)
+
+    return statements
+
+
+def sequential_scans(statement, parameters):
+    """Return the large tables that the plan for ``statement`` reads with a full scan"""
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            # Only pick a seq scan when no index can serve the query
+            conn.exec_driver_sql("SET enable_seqscan = off")
+            plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+
+            scans = set()
+            nodes = [plan[0]["Plan"]]
+            while nodes:
+                node = nodes.pop()
+                if node["Node Type"] == "Seq Scan":
+                    scans.add(node["Relation Name"])
+                nodes.extend(node.get("Plans", []))
+        else:
+            rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+            scans = set()
+            for row in rows:
+                match = re.match(r"SCAN (\w+)", row[-1])
+                if match:
+                    scans.add(match.group(1))
+
+    return scans & LARGE_TABLES
+
+
+def assert_index_only(func):
+    """Fail if any SELECT issued by func plans a full scan of a large table"""
+    statements = capture_selects(func)
+    assert statements, "no queries captured"
+    for statement, parameters in statements:
+        scans = sequential_scans(statement, parameters)
+        assert not scans, f"sequential scan on {sorted(scans)} for:\n{statement}"
+
+
+@pytest.mark.parametrize("method,url", [
+    ("get", "/api/v1/posts"),
+    ("get", "/api/v1/posts?category=TOPS&min_price=10"),
+    ("get", "/api/v1/posts?pagination=cursor"),
+    ("get", "/api/v1/posts/42"),
+    ("get", "/api/v1/posts/42/comments"),
+    ("get", "/api/v1/posts/42/similar"),
+    ("put", "/api/v1/posts/42/like"),
+    ("delete", "/api/v1/posts/42/like"),
+    ("get", "/api/v1/users/1"),
+    ("get", "/api/v1/users/1/followers"),
+    ("get", "/api/v1/users/1/following"),
+    ("get", "/api/v1/search/posts?q=post"),
+    ("get", "/api/v1/search/posts?q=post&pagination=cursor"),
+    ("get", "/api/v1/posts?brand=zar&brand_match=prefix"),
+    ("get", "/api/v1/search/users?q=user1&match=prefix"),
+    ("get", "/api/v1/search/tags?q=tag1&match=prefix"),
+    ("get", "/api/v1/search/trending"),
+    ("get", "/api/v1/search/trending?pagination=cursor"),
+    ("get", "/api/v1/feed/home"),
+])
+def test_endpoint_queries_use_indexes(seeded, method, url):
+    """Test that an endpoint's queries never sequentially scan a large table"""
+    def call():
+        response = getattr(client, method)(url, headers=seeded)
+        assert response.status_code < 500
+
+    assert_index_only(call)
+
+
+def test_cursor_page_queries_use_indexes(seeded):
+    """Test that a follow-up cursor page seeks instead of scanning"""
+    cursor = client.get("/api/v1/posts?pagination=cursor", headers=seeded).json()["next_cursor"]
+    assert_index_only(lambda: client.get(f"/api/v1/posts?cursor={cursor}", headers=seeded))
+
+
+def test_home_feed_rebuild_uses_indexes(seeded):
+    """Test that rebuilding a home timeline missing from Redis seeks instead of scanning"""
+    get_redis().flushall()
+    assert_index_only(lambda: client.get("/api/v1/feed/home", headers=seeded))
+
+
+def test_notification_queries_use_indexes(seeded):
+    """Test that notification listing and unread counts use the composite index"""
+    def call():
+        db = TestingSessionLocal()
+        try:
+            db.query(Notification).filter(
+                Notification.user_id == 1,
+                Notification.is_read == False
+            ).order_by(Notification.created_at.desc()).limit(20).all()
+            NotificationService.get_unread_count(db, 1)
+        finally:
+            db.close()
+
+    assert_index_only(call)
+
+
+def test_post_delete_foreign_key_lookups_use_indexes(seeded):
+    """Test that the rows a post delete cascades to are found by index"""
+    def call():
+        db = TestingSessionLocal()
+        try:
+            db.query(PostNeighbor.post_id).filter(PostNeighbor.neighbor_id == 42).all()
+            db.query(Post.id).filter(Post.duplicate_of == 42).all()
+        finally:
+            db.close()
+
+    assert_index_only(call)
+
+
+def test_duplicate_hash_reuse_uses_index(seeded):
+    """Test that hashes of already stored images are found by index on edit"""
+    def call():
+        db = TestingSessionLocal()
+        try:
+            DuplicateIndex.images_changed(db, 42, ["/uploads/posts/42.jpg", "/uploads/posts/7.jpg"])
+            db.rollback()
+        finally:
+            db.close()
+
+    assert_index_only(call)
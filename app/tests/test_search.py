@@ -0,0 +1,625 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+from app.main import app
+from app.core.database import get_db, Base
+from datetime import datetime, timedelta
+from app.models.user import User
+from app.models.post import Post, Tag, PostTag, Like, ClothingCategory
+from app.models.outfit import Outfit
+from app.models.analytics import DailyUniqueViewers
+from app.services.autocomplete import AutocompleteService, PrefixIndex
+from app.services.colors import ColorIndex, color_histogram, parse_color
+from app.services.search_index import PostSearchIndex
+from app.services.recommendations import RecommendationEngine
+from app.services.trending import TrendingService
+from app.services.unique_viewers import UniqueViewers
+from app.services.view_counts import ViewCounter, buffer_key, flushing_key
+from app.utils.hyperloglog import HyperLogLog
+from app.core.redis import get_redis
+from PIL import Image, ImageDraw
+
+
+# Test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+
+app.dependency_overrides[get_db] = override_get_db
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def setup_database(monkeypatch):
+    # Timeline fan-out opens its own sessions
+    monkeypatch.setattr("app.services.timeline.SessionLocal", TestingSessionLocal)
+    Base.metadata.create_all(bind=engine)
+    AutocompleteService.reset()
+    RecommendationEngine.reset()
+    ColorIndex.reset()
+    get_redis().flushall()
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def auth_headers():
+    """Register and log in a test user, returning auth headers"""
+    user_data = {
+        "email": "search@example.com",
+        "username": "searcher",
+        "password": "testpassword123"
+    }
+    client.post("/api/v1/auth/register", json=user_data)
+    login_response = client.post("/api/v1/auth/login", json={
+        "email": user_data["email"],
+        "password": user_data["password"]
+    })
+    return {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+
+def create_post(title, like_count=0, view_count=0, **fields):
+    """Insert a post authored by the test user"""
+    db = TestingSessionLocal()
+    try:
+        author = db.query(User).filter(User.username == "searcher").first()
+        post = Post(
+            title=title,
+            category=fields.pop("category", ClothingCategory.TOPS),
+            main_image="/uploads/posts/test.jpg",
+            like_count=like_count,
+            view_count=view_count,
+            author_id=fields.pop("author_id", author.id),
+            **fields
+        )
+        db.add(post)
+        db.flush()
+        PostSearchIndex.index_post(db, post.id)
+        db.commit()
+        return post.id
+    finally:
+        db.close()
+
+
+def test_search_posts_page_mode(auth_headers):
+    """Test that page mode keeps returning total and page"""
+    create_post("Red dress")
+    create_post("Blue jeans")
+    response = client.get("/api/v1/search/posts?q=dress", headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 1
+    assert data["page"] == 1
+    assert data["posts"][0]["title"] == "Red dress"
+
+
+def test_search_posts_cursor_walks_ranked_results(auth_headers):
+    """Test cursor pagination over relevance-ordered results"""
+    create_post("Dress", description="A plain dress")
+    for i in range(4):
+        create_post(f"Skirt {i}", description="Goes with any dress")
+    
+    titles = []
+    url = "/api/v1/search/posts?q=dress&pagination=cursor&size=2"
+    while url:
+        data = client.get(url, headers=auth_headers).json()
+        titles.extend(post["title"] for post in data["posts"])
+        url = None
+        if data["has_more"]:
+            url = f"/api/v1/search/posts?q=dress&size=2&cursor={data['next_cursor']}"
+    
+    # Title matches rank first; equal ranks fall back to newest id first
+    assert titles == ["Dress", "Skirt 3", "Skirt 2", "Skirt 1", "Skirt 0"]
+
+
+def test_search_posts_cursor_pages_across_tied_ranks(auth_headers):
+    """Test that a cursor resumes exactly after its row when every rank is tied"""
+    post_ids = [create_post("Linen shirt") for _ in range(7)]
+
+    seen, cursor = [], None
+    while True:
+        url = "/api/v1/search/posts?q=linen&pagination=cursor&size=3"
+        data = client.get(url + (f"&cursor={cursor}" if cursor else ""), headers=auth_headers).json()
+        seen.extend(post["id"] for post in data["posts"])
+        if not data["has_more"]:
+            break
+        cursor = data["next_cursor"]
+
+    # Nothing skipped or repeated at page boundaries
+    assert seen == sorted(post_ids, reverse=True)
+
+
+def test_search_posts_matches_stems_and_all_fields(auth_headers):
+    """Test that search matches word stems in title, description, brand and store"""
+    create_post("Summer dresses")
+    create_post("Linen shirt", description="Pairs well with a dress")
+    create_post("Boots", brand="Dress Co")
+    create_post("Sandals", store_name="The Dress Shop")
+    create_post("Jeans")
+    
+    data = client.get("/api/v1/search/posts?q=dress", headers=auth_headers).json()
+    assert data["total"] == 4
+    assert "Jeans" not in [post["title"] for post in data["posts"]]
+
+
+def test_search_posts_requires_every_word(auth_headers):
+    """Test that multi-word queries match posts containing all words"""
+    create_post("Red dress")
+    create_post("Red shoes")
+    
+    data = client.get("/api/v1/search/posts?q=red dress", headers=auth_headers).json()
+    assert [post["title"] for post in data["posts"]] == ["Red dress"]
+    
+    data = client.get("/api/v1/search/posts?q=%22%3F%21", headers=auth_headers).json()
+    assert data["total"] == 0
+
+
+def test_search_index_follows_post_update_and_delete(auth_headers):
+    """Test that updating or deleting a post updates the search index"""
+    post_id = create_post("Wool coat")
+    
+    response = client.put(
+        f"/api/v1/posts/{post_id}", json={"title": "Denim jacket"}, headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert client.get("/api/v1/search/posts?q=coat", headers=auth_headers).json()["total"] == 0
+    assert client.get("/api/v1/search/posts?q=denim", headers=auth_headers).json()["total"] == 1
+    
+    response = client.delete(f"/api/v1/posts/{post_id}", headers=auth_headers)
+    assert response.status_code == 200
+    assert client.get("/api/v1/search/posts?q=denim", headers=auth_headers).json()["total"] == 0
+
+
+def test_search_reindex_rebuilds_index(auth_headers):
+    """Test that a bulk reindex picks up posts written outside the endpoints"""
+    create_post("Silk scarf")
+    db = TestingSessionLocal()
+    try:
+        author = db.query(User).filter(User.username == "searcher").first()
+        db.add(Post(
+            title="Silk blouse",
+            category=ClothingCategory.TOPS,
+            main_image="/uploads/posts/test.jpg",
+            author_id=author.id
+        ))
+        db.commit()
+        assert client.get("/api/v1/search/posts?q=silk", headers=auth_headers).json()["total"] == 1
+        
+        assert PostSearchIndex.reindex(db, batch_size=1) == 2
+    finally:
+        db.close()
+    
+    assert client.get("/api/v1/search/posts?q=silk", headers=auth_headers).json()["total"] == 2
+
+
+def create_users(*usernames, **fields):
+    """Insert active users with the given usernames"""
+    db = TestingSessionLocal()
+    try:
+        for username in usernames:
+            db.add(User(email=f"{username}@example.com", username=username, hashed_password="x", **fields))
+        db.commit()
+    finally:
+        db.close()
+
+
+def create_tags(*names):
+    """Insert tags with the given names"""
+    db = TestingSessionLocal()
+    try:
+        for name in names:
+            db.add(Tag(name=name))
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_search_users_match_modes(auth_headers):
+    """Test contains, prefix and similar lookups on usernames"""
+    create_users("annabelle", "anna", "joanna", "ann_marie")
+
+    def usernames(url):
+        response = client.get(url, headers=auth_headers)
+        assert response.status_code == 200
+        return [user["username"] for user in response.json()["users"]]
+
+    assert usernames("/api/v1/search/users?q=anna") == ["anna", "annabelle", "joanna"]
+    assert usernames("/api/v1/search/users?q=ANNA&match=prefix") == ["anna", "annabelle"]
+    assert usernames("/api/v1/search/users?q=anna&match=similar")[0] == "anna"
+    # LIKE wildcards in the query match literally
+    assert usernames("/api/v1/search/users?q=ann_&match=prefix") == ["ann_marie"]
+    assert usernames("/api/v1/search/users?q=a%25a") == []
+
+
+def test_search_users_prefix_matches_names(auth_headers):
+    """Test that prefix lookups also cover first and last names"""
+    create_users("u1", first_name="Maria")
+    create_users("u2", last_name="Marino")
+    create_users("u3", first_name="Rosemary")
+
+    response = client.get("/api/v1/search/users?q=mar&match=prefix", headers=auth_headers)
+    assert [user["username"] for user in response.json()["users"]] == ["u1", "u2"]
+
+
+def test_search_tags_match_modes(auth_headers):
+    """Test contains and prefix lookups on tag names"""
+    create_tags("summer", "summerdress", "endofsummer", "sun")
+
+    response = client.get("/api/v1/search/tags?q=summer", headers=auth_headers)
+    assert [tag["name"] for tag in response.json()["tags"]] == ["endofsummer", "summer", "summerdress"]
+
+    response = client.get("/api/v1/search/tags?q=Su&match=prefix", headers=auth_headers)
+    assert [tag["name"] for tag in response.json()["tags"]] == ["summer", "summerdress", "sun"]
+
+
+def test_brand_filter_match_modes(auth_headers):
+    """Test that the brand filter supports prefix lookups"""
+    create_post("Dress one", brand="Zara")
+    create_post("Dress two", brand="Lazaro")
+
+    response = client.get("/api/v1/posts?brand=zar", headers=auth_headers)
+    assert len(response.json()["posts"]) == 2
+
+    response = client.get("/api/v1/posts?brand=zar&brand_match=prefix", headers=auth_headers)
+    assert [post["brand"] for post in response.json()["posts"]] == ["Zara"]
+
+    response = client.get("/api/v1/search/posts?q=dress&brand=zar&brand_match=prefix", headers=auth_headers)
+    assert [post["brand"] for post in response.json()["posts"]] == ["Zara"]
+
+
+def store_colors(post_id, background, garment=None):
+    """Give a post the histogram of a product shot: ``garment`` over ``background``"""
+    image = Image.new("RGB", (120, 160), background)
+    if garment:
+        ImageDraw.Draw(image).rectangle((30, 30, 90, 130), fill=garment)
+    histogram = color_histogram(image)
+    db = TestingSessionLocal()
+    ColorIndex.store(db, post_id, "/uploads/posts/test.jpg", histogram)
+    db.commit()
+    db.close()
+    return histogram
+
+
+def test_search_posts_by_color(auth_headers):
+    """Test that color search ranks by how much of the image matches and combines with filters"""
+    navy_coat = create_post("Navy coat", category=ClothingCategory.OUTERWEAR, price=120)
+    navy_top = create_post("Navy top", price=30)
+    striped = create_post("Striped top", price=25)
+    red_dress = create_post("Red dress", category=ClothingCategory.DRESSES)
+    store_colors(navy_coat, "#1a2a5a")
+    store_colors(navy_top, "white", "#1a2a5a")
+    store_colors(striped, "#1a2a5a", "white")
+    store_colors(red_dress, "white", "#c0202a")
+    
+    def search(**params):
+        response = client.get("/api/v1/search/posts", params=params, headers=auth_headers)
+        assert response.status_code == 200
+        return [post["title"] for post in response.json()["posts"]]
+    
+    # The backdrop counts for less than the garment in the middle of the frame
+    assert search(color="navy") == ["Navy coat", "Navy top", "Striped top"]
+    assert search(color="#c0202a") == ["Red dress"]
+    assert search(color="white")[0] == "Striped top"
+    assert search(color="navy", category="TOPS", max_price=28) == ["Striped top"]
+    assert search(color="navy", q="top") == ["Navy top", "Striped top"]
+    
+    first = client.get("/api/v1/search/posts?color=navy&pagination=cursor&size=2&include_total=true", headers=auth_headers).json()
+    assert (first["total"], first["has_more"]) == (3, True)
+    rest = client.get(f"/api/v1/search/posts?color=navy&cursor={first['next_cursor']}", headers=auth_headers).json()
+    assert [post["title"] for post in rest["posts"]] == ["Striped top"] and not rest["has_more"]
+    
+    # Histograms stored after the matrix was loaded are searchable right away
+    ColorIndex.record(red_dress, store_colors(red_dress, "#1a2a5a"))
+    assert search(color="navy") == ["Red dress", "Navy coat", "Navy top", "Striped top"]
+    
+    assert parse_color("#FFF") == (255, 255, 255) and parse_color("Navy") == parse_color("#1a2a5a")
+    assert client.get("/api/v1/search/posts?color=plaid", headers=auth_headers).status_code == 400
+    assert client.get("/api/v1/search/posts", headers=auth_headers).status_code == 400
+
+
+def test_prefix_index_keeps_top_k_per_prefix():
+    """Test that the trie returns the most popular completions and follows score changes"""
+    index = PrefixIndex.build([("Summer", 5), ("summit", 9), ("sun", 1), ("winter", 7)], top_k=2)
+    assert index.search("su") == [("summit", 9), ("Summer", 5)]
+    assert index.search("SUMME") == [("Summer", 5)]
+    assert index.search("x") == []
+
+    index.adjust("sun", 10)
+    assert index.search("s") == [("sun", 11), ("summit", 9)]
+    index.adjust("sun", -11)
+    index.discard("summit")
+    assert index.search("s") == [("Summer", 5), ("sun", 0)]
+
+
+def test_autocomplete_ranks_by_popularity(auth_headers):
+    """Test typeahead over tags, brands and usernames without hitting the database"""
+    create_users("sunny", "sunflower")
+    create_tags("summer", "sunset")
+    post_id = create_post("Look", brand="Sunstore")
+    client.put(f"/api/v1/posts/{post_id}", json={"tags": ["sunset"]}, headers=auth_headers)
+    client.post("/api/v1/users/3/follow", headers=auth_headers)
+
+    response = client.get("/api/v1/search/autocomplete?q=su", headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["tags"] == [{"value": "sunset", "score": 1}, {"value": "summer", "score": 0}]
+    assert data["brands"] == [{"value": "Sunstore", "score": 1}]
+    assert [user["value"] for user in data["users"]] == ["sunflower", "sunny"]
+
+    # Later lookups are answered from memory
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(Engine, "before_cursor_execute", listener)
+    try:
+        response = client.get("/api/v1/search/autocomplete?q=sun&types=tags", headers=auth_headers)
+    finally:
+        event.remove(Engine, "before_cursor_execute", listener)
+    assert response.json()["tags"][0]["value"] == "sunset"
+    assert statements == []
+
+
+def test_autocomplete_follows_writes(auth_headers):
+    """Test that registrations, follows and post edits update the index incrementally"""
+    post_id = create_post("Look", brand="Acme")
+    assert client.get("/api/v1/search/autocomplete?q=a", headers=auth_headers).json()["brands"] == [
+        {"value": "Acme", "score": 1}
+    ]
+
+    client.post("/api/v1/auth/register", json={
+        "email": "newbie@example.com", "username": "newbie", "password": "testpassword123"
+    })
+    client.put(f"/api/v1/posts/{post_id}", json={"brand": "Bolt", "tags": ["boho"]}, headers=auth_headers)
+    client.post("/api/v1/users/2/follow", headers=auth_headers)
+
+    data = client.get("/api/v1/search/autocomplete?q=b", headers=auth_headers).json()
+    assert data["brands"] == [{"value": "Bolt", "score": 1}]
+    assert data["tags"] == [{"value": "boho", "score": 1}]
+    assert client.get("/api/v1/search/autocomplete?q=a", headers=auth_headers).json()["brands"] == []
+    assert client.get(
+        "/api/v1/search/autocomplete?q=new&types=users", headers=auth_headers
+    ).json()["users"] == [{"value": "newbie", "score": 1}]
+
+    client.delete(f"/api/v1/posts/{post_id}", headers=auth_headers)
+    data = client.get("/api/v1/search/autocomplete?q=b", headers=auth_headers).json()
+    assert data["brands"] == []
+    assert data["tags"] == [{"value": "boho", "score": 0}]
+
+
+def refresh_trending(full=False):
+    db = TestingSessionLocal()
+    try:
+        return TrendingService.refresh(db, full=full)
+    finally:
+        db.close()
+
+
+def test_trending_ranks_by_decayed_engagement(auth_headers):
+    """Test that fresh engagement outranks older, larger engagement within the window"""
+    now = datetime.utcnow()
+    older = create_post("Older hit", like_count=100, created_at=now - timedelta(days=3))
+    newer = create_post("New look", like_count=20, created_at=now)
+    create_post("Private", like_count=500, created_at=now, is_public=False)
+    create_post("Last month", like_count=1000, created_at=now - timedelta(days=30))
+    assert refresh_trending(full=True) == 3
+
+    response = client.get("/api/v1/search/trending", headers=auth_headers)
+    assert response.status_code == 200
+    assert [post["id"] for post in response.json()["posts"]] == [newer, older]
+
+
+def test_trending_rescores_only_changed_posts(auth_headers):
+    """Test that the scheduled refresh picks up views, likes and deletes incrementally"""
+    now = datetime.utcnow()
+    first = create_post("First", like_count=5, created_at=now)
+    second = create_post("Second", like_count=4, created_at=now)
+    refresh_trending(full=True)
+    assert refresh_trending() == 0
+
+    client.post(f"/api/v1/posts/{second}/like", headers=auth_headers)
+    client.post(f"/api/v1/posts/{second}/like", headers=auth_headers)
+    client.get(f"/api/v1/posts/{second}", headers=auth_headers)
+    assert refresh_trending() == 1
+    response = client.get("/api/v1/search/trending", headers=auth_headers)
+    assert [post["id"] for post in response.json()["posts"]] == [second, first]
+
+    client.put(f"/api/v1/posts/{first}", json={"is_public": False}, headers=auth_headers)
+    response = client.get("/api/v1/search/trending", headers=auth_headers)
+    assert [post["id"] for post in response.json()["posts"]] == [second]
+
+    client.put(f"/api/v1/posts/{first}", json={"is_public": True}, headers=auth_headers)
+    client.delete(f"/api/v1/posts/{second}", headers=auth_headers)
+    refresh_trending()
+    response = client.get("/api/v1/search/trending", headers=auth_headers)
+    assert [post["id"] for post in response.json()["posts"]] == [first]
+
+
+def test_views_are_buffered_and_flushed_in_batches(auth_headers):
+    """Test that reads only buffer views, and flushes add them up, retry leftovers and report their lag"""
+    hot = create_post("Hot", view_count=10)
+    cold = create_post("Cold")
+    views = [client.get(f"/api/v1/posts/{hot}", headers=auth_headers).json()["view_count"] for _ in range(3)]
+    client.get(f"/api/v1/posts/{cold}", headers=auth_headers)
+    assert views == [11, 12, 13]  # responses include buffered views
+    db = TestingSessionLocal()
+    assert db.get(Post, hot).view_count == 10  # ...which the read did not write
+    
+    metrics = client.get("/metrics").text
+    assert 'view_counts_pending{table="posts"} 2' in metrics
+    assert "view_counts_flush_lag_seconds" not in metrics  # no flush yet
+    
+    statements = []
+    listen = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listen)
+    try:
+        assert ViewCounter.flush(db) == 4
+    finally:
+        event.remove(engine, "before_cursor_execute", listen)
+    assert len([statement for statement in statements if statement.startswith("UPDATE posts")]) == 2  # one per distinct count
+    db.expire_all()
+    assert (db.get(Post, hot).view_count, db.get(Post, cold).view_count) == (13, 1)
+    assert refresh_trending() == 2  # flushed posts are rescored
+    assert 'view_counts_pending{table="posts"} 0' in client.get("/metrics").text
+    assert ViewCounter.stats()["flush_lag_seconds"] < 5
+    
+    # A flush that died after taking the buffer left it aside; the next flush applies it too
+    ViewCounter.record("posts", hot)
+    get_redis().rename(buffer_key("posts"), flushing_key("posts"))
+    ViewCounter.record("posts", hot)
+    author = db.query(User).filter(User.username == "searcher").first()
+    outfit = Outfit(name="Look", creator_id=author.id)
+    db.add(outfit)
+    db.commit()
+    ViewCounter.record("outfits", outfit.id)
+    assert ViewCounter.flush(db) == 3
+    db.expire_all()
+    assert (db.get(Post, hot).view_count, db.get(Outfit, outfit.id).view_count) == (15, 1)
+    assert ViewCounter.flush(db) == 0
+    db.close()
+
+
+def test_hyperloglog_estimates_within_a_few_percent():
+    """Test the in-process sketch: fixed size, close estimates, unions by merging"""
+    first, second = HyperLogLog(), HyperLogLog()
+    first.add(*range(50000))
+    second.add(*range(25000, 100000))
+    assert first.registers.nbytes == 16384
+    assert abs(first.count() - 50000) < 1500
+    assert abs(first.merge(second).count() - 100000) < 3000
+    assert not first.add(*range(100))  # already seen
+    assert HyperLogLog().count() == 0
+    
+    redis = get_redis()
+    redis.pfadd("a", *range(10))
+    redis.pfadd("b", *range(5, 20))
+    assert (redis.pfcount("a"), redis.pfcount("a", "b", "missing")) == (10, 20)
+    redis.pfmerge("a", "b")
+    assert redis.pfcount("a") == 20
+
+
+def test_unique_viewers_count_each_viewer_once(auth_headers):
+    """Test that repeat views don't add viewers, on the post and in lists, before and after the daily rollup"""
+    post_id = create_post("Look")
+    viewers = [auth_headers]
+    for name in ("ann", "bob"):
+        client.post("/api/v1/auth/register", json={"email": f"{name}@example.com", "username": name, "password": "testpassword123"})
+        token = client.post("/api/v1/auth/login", json={"email": f"{name}@example.com", "password": "testpassword123"}).json()["access_token"]
+        viewers.append({"Authorization": f"Bearer {token}"})
+    
+    for headers in viewers + viewers[:1] * 3:
+        post = client.get(f"/api/v1/posts/{post_id}", headers=headers).json()
+    assert (post["view_count"], post["unique_viewers"]) == (6, 3)
+    assert client.get("/api/v1/posts/", headers=auth_headers).json()["posts"][0]["unique_viewers"] == 3
+    
+    # Tomorrow, today's sketch is rolled up and merged into the post's lifetime sketch
+    today = datetime.utcnow().date()
+    db = TestingSessionLocal()
+    assert UniqueViewers.rollup(db, today=today) == 0
+    assert UniqueViewers.rollup(db, today=today + timedelta(days=1)) == 1
+    row = db.get(DailyUniqueViewers, ("posts", post_id, today))
+    assert row.viewers == 3
+    db.close()
+    assert UniqueViewers.counts("posts", [post_id]) == {post_id: 3}
+    assert client.get(f"/api/v1/posts/{post_id}", headers=viewers[1]).json()["unique_viewers"] == 3
+    UniqueViewers.record("posts", post_id, 999)
+    assert UniqueViewers.counts("posts", [post_id, post_id + 1]) == {post_id: 4, post_id + 1: 0}
+
+
+def test_trending_cursor_walk(auth_headers):
+    """Test that cursor pages over trending scores are complete and disjoint"""
+    now = datetime.utcnow()
+    ids = [create_post(f"Post {i}", like_count=i % 3, created_at=now) for i in range(7)]
+    refresh_trending(full=True)
+
+    seen, cursor = [], None
+    while True:
+        url = "/api/v1/search/trending?pagination=cursor&size=3"
+        response = client.get(url + (f"&cursor={cursor}" if cursor else ""), headers=auth_headers).json()
+        seen.extend(post["id"] for post in response["posts"])
+        cursor = response["next_cursor"]
+        if not response["has_more"]:
+            break
+    assert sorted(seen) == sorted(ids)
+    assert len(seen) == len(set(seen))
+
+
+def create_tagged_post(title, tags, author_id, liked_by=()):
+    """Insert a post with tags and likes"""
+    post_id = create_post(title, author_id=author_id)
+    db = TestingSessionLocal()
+    try:
+        for name in tags:
+            tag = db.query(Tag).filter(Tag.name == name).first() or Tag(name=name)
+            db.add(PostTag(post_id=post_id, tag=tag))
+        for user_id in liked_by:
+            db.add(Like(post_id=post_id, user_id=user_id))
+        db.commit()
+        return post_id
+    finally:
+        db.close()
+
+
+def recommended_ids(headers, url="/api/v1/search/recommendations"):
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    return [post["id"] for post in response.json()["posts"]]
+
+
+def test_recommendations_rank_by_tag_affinity(auth_headers):
+    """Test that posts sharing tags with liked posts rank first, excluding own and liked posts"""
+    create_users("maker")
+    liked = create_tagged_post("Liked", ["boho", "linen"], author_id=2, liked_by=[1])
+    boho = create_tagged_post("Boho", ["boho", "linen"], author_id=2)
+    partial = create_tagged_post("Linen", ["linen", "denim"], author_id=2)
+    other = create_tagged_post("Street", ["street"], author_id=2)
+    create_tagged_post("Mine", ["boho"], author_id=1)
+
+    ids = recommended_ids(auth_headers)
+    assert ids[:2] == [boho, partial]
+    assert set(ids) == {boho, partial, other}
+    assert liked not in ids
+
+
+def test_recommendations_follow_likes_incrementally(auth_headers):
+    """Test that new likes and follows shift the ranking without a rebuild"""
+    create_users("maker", "other")
+    street = create_tagged_post("Street", ["street"], author_id=2)
+    boho = create_tagged_post("Boho", ["boho"], author_id=2)
+    boho_too = create_tagged_post("Boho too", ["boho"], author_id=3)
+    assert recommended_ids(auth_headers) == [boho_too, boho, street]
+
+    client.post(f"/api/v1/posts/{street}/like", headers=auth_headers)
+    client.post("/api/v1/users/3/follow", headers=auth_headers)
+    assert recommended_ids(auth_headers) == [boho_too, boho]
+
+    client.delete(f"/api/v1/posts/{street}/like", headers=auth_headers)
+    assert street in recommended_ids(auth_headers)
+
+
+def test_recommendations_cursor_walk(auth_headers):
+    """Test that cursor pages are complete, disjoint and in ranking order"""
+    create_users("maker")
+    create_tagged_post("Liked", ["boho"], author_id=2, liked_by=[1])
+    ids = [create_tagged_post(f"Post {i}", ["boho"] if i % 2 else ["street"], author_id=2) for i in range(7)]
+
+    seen, cursor = [], None
+    while True:
+        url = "/api/v1/search/recommendations?pagination=cursor&size=3"
+        response = client.get(url + (f"&cursor={cursor}" if cursor else ""), headers=auth_headers).json()
+        seen.extend(post["id"] for post in response["posts"])
+        cursor = response["next_cursor"]
+        if not response["has_more"]:
+            break
+    assert seen == recommended_ids(auth_headers, "/api/v1/search/recommendations?size=10")
+    assert sorted(seen) == sorted(ids)
+
@@ -1,45 +1,187 @@
+import asyncio
+import hashlib
 import os
-import uuid
-from typing import Optional
+import tempfile
+from typing import AsyncIterator, BinaryIO, List, NamedTuple, Optional, Tuple
 from fastapi import UploadFile, HTTPException
 from PIL import Image
 import io
 
 from app.core.config import settings
+from app.core.object_storage import get_storage
+from app.utils.image_headers import InvalidImage, sniff_image_file, sniff_image_head
 
 
-def save_upload_file(upload_file: UploadFile, folder: str = "uploads") -> str:
-    """Save uploaded file and return the file path"""
+class StagedUpload(NamedTuple):
+    """An upload streamed to a temporary file under ``UPLOAD_DIR``, waiting to be stored.
+
+    ``temp_path`` is ``None`` for files the client uploaded straight to storage.
+    """
+    temp_path: Optional[str]
+    sha256: str
+    size: int
+    extension: str
+
+
+async def stage_upload_file(upload_file: UploadFile, folder: str = "blobs") -> StagedUpload:
+    """Stream an uploaded file to a temporary file, hashing it on the way.
+
+    The copy runs in a worker thread so the event loop is never blocked. It
+    streams ``UPLOAD_CHUNK_SIZE`` chunks, feeding each one to SHA-256 as it
+    is written, and stops as soon as ``MAX_FILE_SIZE`` is exceeded. The file
+    is left under a temporary name in ``folder`` (so moving it to its final,
+    content-addressed name is an atomic rename); see ``BlobStore.store``.
+
+    Before anything is copied, the first bytes are checked to be a JPEG, PNG,
+    GIF or WebP header of at most ``IMAGE_MAX_PIXELS``; the file is stored
+    with that format's extension, whatever the client named it.
+    """
     
     # Validate file type
     if not is_valid_image(upload_file):
         raise HTTPException(status_code=400, detail="Invalid file type. Only images are allowed.")
     
-    # Create folder if it doesn't exist
-    upload_folder = os.path.join(settings.UPLOAD_DIR, folder)
-    os.makedirs(upload_folder, exist_ok=True)
+    # Reject early when the multipart parser already knows the size
+    if upload_file.size is not None and upload_file.size > settings.MAX_FILE_SIZE:
+        raise file_too_large()
     
-    # Generate unique filename
-    file_extension = get_file_extension(upload_file.filename)
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = os.path.join(upload_folder, unique_filename)
+    try:
+        header = await asyncio.to_thread(sniff_image_file, upload_file.file)
+    except InvalidImage as e:
+        raise invalid_image(e)
     
-    # Save file and check size
     try:
-        content = upload_file.file.read()
-        # Validate file size after reading
-        if len(content) > settings.MAX_FILE_SIZE:
-            raise HTTPException(status_code=400, detail="File too large. Maximum size is 10MB.")
-        
-        with open(file_path, "wb") as buffer:
-            buffer.write(content)
+        temp_path, digest, size = await asyncio.to_thread(_stream_to_disk, upload_file.file, folder)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error saving file: {str(e)}")
     
-    # Return relative path for database storage (matches StaticFiles mount)
-    return f"/uploads/{folder}/{unique_filename}"
+    return StagedUpload(temp_path, digest, size, header.extension)
+
+
+async def stage_upload_files(upload_files: List[UploadFile], folder: str = "blobs") -> List[StagedUpload]:
+    """Stage several uploads concurrently, in order; if any fails, remove the ones that were staged"""
+    results = await asyncio.gather(
+        *(stage_upload_file(upload_file, folder) for upload_file in upload_files),
+        return_exceptions=True
+    )
+    failures = [result for result in results if isinstance(result, BaseException)]
+    if failures:
+        discard_staged([result for result in results if isinstance(result, StagedUpload)])
+        raise failures[0]
+    return results
+
+
+async def stage_upload_stream(chunks: AsyncIterator[bytes], folder: str = "blobs") -> StagedUpload:
+    """Like ``stage_upload_file``, for a raw request body arriving in ``chunks``.
+
+    The first chunks are held in memory until the image header is validated,
+    so an invalid body is rejected before the rest of it is read.
+    """
+    upload_folder = os.path.join(settings.UPLOAD_DIR, folder)
+    os.makedirs(upload_folder, exist_ok=True)
+    
+    fd, temp_path = tempfile.mkstemp(dir=upload_folder, prefix=".upload-", suffix=".part")
+    digest = hashlib.sha256()
+    written = 0
+    head = b""
+    header = None
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            async for chunk in chunks:
+                written += len(chunk)
+                if written > settings.MAX_FILE_SIZE:
+                    raise file_too_large()
+                digest.update(chunk)
+                if header is None:
+                    head += chunk
+                    header = _sniff_head(head, complete=False)
+                    if header is None:
+                        continue
+                    chunk, head = head, b""
+                await asyncio.to_thread(buffer.write, chunk)
+            if header is None:
+                header = _sniff_head(head, complete=True)
+                await asyncio.to_thread(buffer.write, head)
+            await asyncio.to_thread(os.fsync, buffer.fileno())
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return StagedUpload(temp_path, digest.hexdigest(), written, header.extension)
+
+
+def discard_staged(staged: List[StagedUpload]) -> None:
+    """Remove temporary files that were not stored"""
+    for upload in staged:
+        if upload.temp_path:
+            delete_file(upload.temp_path)
+
+
+def _stream_to_disk(source: BinaryIO, folder: str) -> Tuple[str, str, int]:
+    """Copy ``source`` to a temporary file in ``UPLOAD_DIR/folder``; return its path, SHA-256 and size"""
+    upload_folder = os.path.join(settings.UPLOAD_DIR, folder)
+    os.makedirs(upload_folder, exist_ok=True)
+    
+    fd, temp_path = tempfile.mkstemp(dir=upload_folder, prefix=".upload-", suffix=".part")
+    digest = hashlib.sha256()
+    written = 0
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            while True:
+                chunk = source.read(settings.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > settings.MAX_FILE_SIZE:
+                    raise file_too_large()
+                digest.update(chunk)
+                buffer.write(chunk)
+            buffer.flush()
+            os.fsync(buffer.fileno())
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return temp_path, digest.hexdigest(), written
+
+
+def _sniff_head(head: bytes, complete: bool):
+    try:
+        return sniff_image_head(head, complete)
+    except InvalidImage as e:
+        raise invalid_image(e)
+
+
+def invalid_image(error: InvalidImage) -> HTTPException:
+    return HTTPException(status_code=400, detail=f"Invalid image: {error}")
+
+
+def format_size(size: int) -> str:
+    """``10MB``, ``1.5MB``, ``512KB`` or ``200 bytes``"""
+    if size >= 1024 * 1024:
+        return f"{round(size / (1024 * 1024), 1):g}MB"
+    if size >= 1024:
+        return f"{round(size / 1024, 1):g}KB"
+    return f"{size} bytes"
+
+
+def file_too_large() -> HTTPException:
+    return HTTPException(status_code=400, detail=f"File too large. Maximum size is {format_size(settings.MAX_FILE_SIZE)}.")
+
+
+def storage_key(url_path: str) -> str:
+    """Storage backend key of a stored ``/uploads/...`` path"""
+    return url_path[len("/uploads/"):]
+
+
+def stored_path(url: str) -> str:
+    """Inverse of ``get_file_url``: the ``/uploads/...`` path to store for a public file URL"""
+    base = get_storage().url("")
+    if url.startswith(base) and not url.startswith("/uploads/"):
+        return f"/uploads/{url[len(base):]}"
+    return url
 
 
 def is_valid_image(upload_file: UploadFile) -> bool:
@@ -79,7 +221,7 @@ def delete_file(file_path: str) -> bool:
 
 
 def get_file_url(file_path: str) -> str:
-    """Get full URL for file"""
-    if file_path.startswith('/'):
-        return f"http://localhost:8000{file_path}"
-    return f"http://localhost:8000/{file_path}" 
\ No newline at end of file
+    """Public URL of a stored ``/uploads/...`` path, from the storage backend (see ``STORAGE_PUBLIC_BASE_URL``)"""
+    if file_path and file_path.startswith("/uploads/"):
+        return get_storage().url(storage_key(file_path))
+    return file_path 
\ No newline at end of file
@@ -0,0 +1,143 @@
+import io
+import struct
+import warnings
+from typing import Callable, NamedTuple, Optional
+
+from PIL import Image
+
+from app.core.config import settings
+
+
+# Leading bytes of each accepted format
+MAGIC_BYTES = [
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"GIF87a", "GIF"),
+    (b"GIF89a", "GIF"),
+]
+
+# Extension uploads of each format are stored with, whatever the client called them
+FORMAT_EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "GIF": ".gif", "WEBP": ".webp"}
+
+EXTENSION_FORMATS = {".jpg": "JPEG", ".jpeg": "JPEG", ".png": "PNG", ".gif": "GIF", ".webp": "WEBP"}
+
+
+class InvalidImage(ValueError):
+    """Not an image we accept: unknown format, unreadable header or too many pixels"""
+
+
+class TruncatedHeader(InvalidImage):
+    """The header runs past the bytes read so far"""
+
+
+class ImageHeader(NamedTuple):
+    format: str  # Pillow format name
+    width: int
+    height: int
+
+    @property
+    def extension(self) -> str:
+        return FORMAT_EXTENSIONS[self.format]
+
+
+def _webp_size(head: bytes) -> tuple:
+    """Canvas size from a WebP header (Pillow's WebP plugin needs the whole file)"""
+    chunk = head[12:16]
+    if chunk == b"VP8X" and len(head) >= 30:
+        width, height = int.from_bytes(head[24:27], "little"), int.from_bytes(head[27:30], "little")
+        return width + 1, height + 1
+    if chunk == b"VP8 " and len(head) >= 30:
+        if head[23:26] != b"\x9d\x01\x2a":
+            raise InvalidImage("Corrupt WebP header")
+        width, height = struct.unpack("<HH", head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and len(head) >= 25:
+        if head[20] != 0x2F:
+            raise InvalidImage("Corrupt WebP header")
+        bits = int.from_bytes(head[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk in (b"VP8X", b"VP8 ", b"VP8L"):
+        raise TruncatedHeader("WebP header is truncated")
+    raise InvalidImage("Corrupt WebP header")
+
+
+def inspect_image_header(head: bytes) -> ImageHeader:
+    """Identify an image from its first bytes: magic bytes, then the header parsed by Pillow.
+
+    Nothing is decoded. Raises ``TruncatedHeader`` when ``head`` ends inside
+    the header and ``InvalidImage`` for anything else that is not an
+    accepted image of at most ``IMAGE_MAX_PIXELS`` pixels.
+    """
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        image_format = "WEBP"
+        width, height = _webp_size(head)
+    else:
+        image_format = next((name for magic, name in MAGIC_BYTES if head.startswith(magic)), None)
+        if image_format is None:
+            raise InvalidImage("Not a JPEG, PNG, GIF or WebP image")
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+                with Image.open(io.BytesIO(head), formats=[image_format]) as image:
+                    width, height = image.size
+        except Image.DecompressionBombError:
+            raise InvalidImage("Image has too many pixels")
+        except (OSError, SyntaxError, ValueError, struct.error) as e:
+            if "truncated" in str(e).lower():
+                raise TruncatedHeader(str(e))
+            raise InvalidImage(f"Unreadable {image_format} header")
+
+    if width <= 0 or height <= 0:
+        raise InvalidImage("Image has no pixels")
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise InvalidImage(f"Image is {width}x{height}; at most {settings.IMAGE_MAX_PIXELS} pixels are allowed")
+    return ImageHeader(image_format, width, height)
+
+
+def canonical_extension(extension: str) -> Optional[str]:
+    """The extension files named ``extension`` are stored with (``.jpeg`` -> ``.jpg``), or ``None``"""
+    extension = extension.lower()
+    if extension not in settings.ALLOWED_EXTENSIONS or extension not in EXTENSION_FORMATS:
+        return None
+    return FORMAT_EXTENSIONS[EXTENSION_FORMATS[extension]]
+
+
+def sniff_image_head(head: bytes, complete: bool) -> Optional[ImageHeader]:
+    """Validate the bytes of an upload received so far; ``None`` until there are enough to decide.
+
+    ``complete`` says ``head`` is the whole file. At least
+    ``IMAGE_SNIFF_BYTES`` are looked at, more only while the header runs
+    past them (e.g. JPEGs with large EXIF blocks ahead of the frame header),
+    up to ``IMAGE_SNIFF_MAX_BYTES``.
+    """
+    if not complete and len(head) < settings.IMAGE_SNIFF_BYTES:
+        return None
+    try:
+        return inspect_image_header(head)
+    except TruncatedHeader:
+        if complete or len(head) >= settings.IMAGE_SNIFF_MAX_BYTES:
+            raise InvalidImage("Image header is truncated or too long")
+        return None
+
+
+def sniff_image(read_head: Callable[[int], bytes]) -> ImageHeader:
+    """``sniff_image_head`` for a stored file; ``read_head(n)`` returns its first ``n`` bytes"""
+    length = settings.IMAGE_SNIFF_BYTES
+    while True:
+        head = read_head(length)
+        header = sniff_image_head(head, complete=len(head) < length)
+        if header is not None:
+            return header
+        length = min(length * 4, settings.IMAGE_SNIFF_MAX_BYTES)
+
+
+def sniff_image_file(file) -> ImageHeader:
+    """``sniff_image`` for a seekable file object, left positioned at the start"""
+    def read_head(length: int) -> bytes:
+        file.seek(0)
+        return file.read(length)
+
+    try:
+        return sniff_image(read_head)
+    finally:
+        file.seek(0)
@@ -0,0 +1,88 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, List, Sequence
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, or_, func, select
+
+
+def encode_cursor(*values: Any) -> str:
+    """Encode the sort key of the last row on a page as an opaque cursor"""
+    payload = [
+        value.isoformat() if isinstance(value, datetime) else value
+        for value in values
+    ]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, length: int) -> List[Any]:
+    """Decode a cursor produced by encode_cursor, validating its shape"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError):
+        values = None
+
+    if not isinstance(values, list) or len(values) != length:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    return values
+
+
+def parse_cursor_datetime(value: Any) -> datetime:
+    """Parse a datetime stored in a cursor"""
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def parse_cursor_int(value: Any) -> int:
+    """Validate an integer stored in a cursor"""
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    return value
+
+
+def parse_cursor_number(value: Any) -> float:
+    """Validate a numeric score stored in a cursor"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    return value
+
+
+def anchored_value(column, key_column, key: Any, fallback: Any):
+    """Read ``column`` from the cursor's anchor row, or ``fallback`` if it is gone.
+
+    Comparing against the stored value rather than the round-tripped one keeps
+    ties exact on SQLite, where ``CURRENT_TIMESTAMP`` and bound datetimes are
+    stored in different text forms.
+    """
+    anchor = select(column).where(key_column == key).correlate(None).scalar_subquery()
+    return func.coalesce(anchor, fallback)
+
+
+def keyset_condition(columns: Sequence[Any], values: Sequence[Any]):
+    """Match rows that sort strictly after ``values`` in descending order.
+
+    For columns (a, b) this builds ``a < :a OR (a = :a AND b < :b)``.
+    """
+    conditions = []
+    for i, column in enumerate(columns):
+        equal_prefix = [columns[j] == values[j] for j in range(i)]
+        conditions.append(and_(*equal_prefix, column < values[i]))
+    return or_(*conditions)
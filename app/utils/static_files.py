@@ -0,0 +1,228 @@
+import asyncio
+import email.utils
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.types import Receive, Scope, Send
+
+
+CHUNK_SIZE = 256 * 1024
+ETAG_CACHE_SIZE = 10000
+
+# Stored files are never rewritten in place (new uploads get new names), so
+# clients and CDNs may keep them forever
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# Precompressed siblings, in order of preference
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+# Raster formats that may be swapped for a WebP sibling of the same name
+WEBP_CANDIDATES = {".jpg", ".jpeg", ".png"}
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def accepts(header: str, token: str) -> bool:
+    """Whether an Accept/Accept-Encoding header lists ``token`` with a non-zero quality"""
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip().lower() == token:
+            return not re.search(r"q=0(\.0*)?\s*$", params.strip())
+    return False
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """``(start, end)`` inclusive for a single satisfiable byte range.
+
+    Returns ``None`` for headers we ignore (multiple ranges, other units, garbage),
+    so the full file is sent; raises ``ValueError`` if the range is unsatisfiable.
+    """
+    match = RANGE_PATTERN.match(header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        raise ValueError("range not satisfiable")
+    return start, end
+
+
+class UploadFiles:
+    """ASGI app serving ``UPLOAD_DIR``: cacheable, resumable and cheap for the API.
+
+    - ``Cache-Control: immutable`` and a strong ``ETag`` from a SHA-256 of the
+      content (hashed once per file version, then memoized); ``If-None-Match``
+      is answered with 304
+    - single ``Range`` requests get 206 (416 when unsatisfiable), honoring ``If-Range``
+    - ``file.br`` / ``file.gz`` are served when present and accepted, and a
+      ``photo.webp`` next to ``photo.jpg`` when the client accepts WebP
+    - bodies go out via the server's ``http.response.pathsend`` or
+      ``http.response.zerocopy`` (sendfile) extension when offered; otherwise
+      they are read on a small dedicated thread pool, so image traffic never
+      ties up the threads that run API requests
+    - dotfiles and the top-level folders named in ``private`` (work in
+      progress, such as resumable uploads) are never served
+    """
+
+    def __init__(self, directory: str, io_threads: int = 4, private: Iterable[str] = ()):
+        self.directory = directory
+        self.private = frozenset(private)
+        self._executor = ThreadPoolExecutor(io_threads, thread_name_prefix="uploads")
+        self._etags: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+        self._etags_lock = threading.Lock()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        assert scope["type"] == "http"
+        if scope["method"] not in ("GET", "HEAD"):
+            await self._respond(send, 405, {"allow": "GET, HEAD"}, b"Method Not Allowed")
+            return
+
+        headers = Headers(scope=scope)
+        found = await self._run(self._resolve, scope, headers)
+        if found is None:
+            await self._respond(send, 404, {}, b"Not Found")
+            return
+        path, size, mtime, content_type, response_headers = found
+
+        etag = await self._run(self._etag, path, size, mtime)
+        response_headers.update({
+            "etag": etag,
+            "cache-control": IMMUTABLE,
+            "last-modified": email.utils.formatdate(mtime / 1e9, usegmt=True),
+            "accept-ranges": "bytes",
+        })
+
+        if_none_match = headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in [
+            tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+        ]):
+            await self._respond(send, 304, response_headers, b"")
+            return
+
+        start, end, status = 0, size - 1, 200
+        range_header = headers.get("range")
+        if range_header and headers.get("if-range", etag) == etag:
+            try:
+                requested = parse_range(range_header, size)
+            except ValueError:
+                await self._respond(send, 416, {**response_headers, "content-range": f"bytes */{size}"}, b"")
+                return
+            if requested is not None:
+                (start, end), status = requested, 206
+                response_headers["content-range"] = f"bytes {start}-{end}/{size}"
+
+        length = end - start + 1 if size else 0
+        response_headers.update({"content-type": content_type, "content-length": str(length)})
+        await send({"type": "http.response.start", "status": status, "headers": self._raw(response_headers)})
+        if scope["method"] == "HEAD" or length == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await self._send_file(scope, send, path, start, length, whole=status == 200)
+
+    def _resolve(self, scope: Scope, headers: Headers) -> Optional[Tuple[str, int, int, str, Dict[str, str]]]:
+        """Pick the file to send: ``(path, size, mtime_ns, content type, extra headers)``"""
+        root = os.path.realpath(self.directory)
+        route_path = scope["path"]
+        root_path = scope.get("root_path", "")
+        if root_path and route_path.startswith(root_path + "/"):
+            route_path = route_path[len(root_path):]  # newer Starlette keeps the mount prefix in path
+        path = os.path.realpath(os.path.join(root, route_path.lstrip("/")))
+        if not path.startswith(root + os.sep) or not os.path.isfile(path):
+            return None
+        parts = os.path.relpath(path, root).split(os.sep)
+        if parts[0] in self.private or any(part.startswith(".") for part in parts):
+            return None
+
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        vary: List[str] = ["Accept-Encoding"]
+        extra: Dict[str, str] = {}
+
+        stem, extension = os.path.splitext(path)
+        if extension.lower() in WEBP_CANDIDATES:
+            vary.append("Accept")
+            if accepts(headers.get("accept", ""), "image/webp") and os.path.isfile(stem + ".webp"):
+                path, content_type = stem + ".webp", "image/webp"
+
+        accept_encoding = headers.get("accept-encoding", "")
+        for encoding, suffix in ENCODINGS:
+            if accepts(accept_encoding, encoding) and os.path.isfile(path + suffix):
+                path = path + suffix
+                extra["content-encoding"] = encoding
+                break
+
+        extra["vary"] = ", ".join(vary)
+        stat = os.stat(path)
+        return path, stat.st_size, stat.st_mtime_ns, content_type, extra
+
+    def _etag(self, path: str, size: int, mtime: int) -> str:
+        key = (path, size, mtime)
+        with self._etags_lock:
+            etag = self._etags.get(key)
+            if etag is not None:
+                self._etags.move_to_end(key)
+                return etag
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        etag = f'"{digest.hexdigest()[:32]}"'
+
+        with self._etags_lock:
+            self._etags[key] = etag
+            while len(self._etags) > ETAG_CACHE_SIZE:
+                self._etags.popitem(last=False)
+        return etag
+
+    async def _send_file(self, scope: Scope, send: Send, path: str, start: int, length: int, whole: bool) -> None:
+        extensions = scope.get("extensions") or {}
+        if whole and "http.response.pathsend" in extensions:
+            await send({"type": "http.response.pathsend", "path": path})
+            return
+
+        file = await self._run(open, path, "rb")
+        try:
+            if "http.response.zerocopy" in extensions:
+                await send({"type": "http.response.zerocopy", "file": file, "offset": start, "count": length})
+                return
+            await self._run(file.seek, start)
+            remaining = length
+            while remaining > 0:
+                chunk = await self._run(file.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b""})  # file shrank underneath us
+        finally:
+            await self._run(file.close)
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    @staticmethod
+    def _raw(headers: Dict[str, str]) -> List[Tuple[bytes, bytes]]:
+        return [(name.encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()]
+
+    async def _respond(self, send: Send, status: int, headers: Dict[str, str], body: bytes) -> None:
+        headers = dict(headers)
+        if status != 304:
+            headers["content-length"] = str(len(body))
+        if body:
+            headers["content-type"] = "text/plain; charset=utf-8"
+        await send({"type": "http.response.start", "status": status, "headers": self._raw(headers)})
+        await send({"type": "http.response.body", "body": body})
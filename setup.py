@@ -71,8 +71,8 @@ def create_uploads_directory():
 
 def check_python_version():
     """Check if Python version is compatible"""
-    if sys.version_info < (3, 8):
-        print("❌ Python 3.8 or higher is required")
+    if sys.version_info < (3, 9):
+        print("❌ Python 3.9 or higher is required")
         return False
     print(f"✅ Python {sys.version_info.major}.{sys.version_info.minor} is compatible")
     return True